@@ -23,14 +23,42 @@ import time
 try:
     from ansible.module_utils.ibm_spectrumscale_utils import runCmd, \
             parse_aggregate_cmd_output, parse_unique_records, GPFS_CMD_PATH, \
-            RC_SUCCESS, SpectrumScaleException
+            RC_SUCCESS, SpectrumScaleException, SpectrumScaleSSH, \
+            records_to_dicts
 except:
     from ibm_spectrumscale_utils import runCmd, parse_aggregate_cmd_output, \
-            parse_unique_records, GPFS_CMD_PATH, RC_SUCCESS, SpectrumScaleException
+            parse_unique_records, GPFS_CMD_PATH, RC_SUCCESS, SpectrumScaleException, \
+            SpectrumScaleSSH, records_to_dicts
 
 
 class SpectrumScaleNode:
 
+    # Node roles, as bits of the mask returned by get_roles()
+    ROLE_QUORUM = 1 << 0
+    ROLE_MANAGER = 1 << 1
+    ROLE_TCT = 1 << 2
+    ROLE_GATEWAY = 1 << 3
+    ROLE_CTDB = 1 << 4
+    ROLE_IO = 1 << 5
+    ROLE_SNMP = 1 << 6
+    ROLE_TEAL = 1 << 7
+    ROLE_PERFMON = 1 << 8
+    ROLE_CES = 1 << 9
+    ROLE_CNFS = 1 << 10
+
+    # (role, otherNodeRoles codes, otherNodeRolesAlias names) denoting it
+    ROLE_CODES = [
+        (ROLE_TCT, ("M",), ()),
+        (ROLE_GATEWAY, ("G",), ("gateway",)),
+        (ROLE_CTDB, (), ("ctdb",)),
+        (ROLE_IO, ("I",), ("ionode",)),
+        (ROLE_SNMP, ("s",), ("snmp_collector",)),
+        (ROLE_TEAL, ("t",), ("teal_collector",)),
+        (ROLE_PERFMON, ("Z",), ("perfmon",)),
+        (ROLE_CES, ("X",), ("ces",)),
+        (ROLE_CNFS, ("E", "D"), ("cnfs",)),
+    ]
+
     def __init__(self, node_dict):
         self.node = node_dict
         self.node_number = int(self.node["nodeNumber"])
@@ -41,6 +69,23 @@ class SpectrumScaleNode:
         self.designation = self.node["designation"]
         self.other_roles = self.node["otherNodeRoles"]
         self.role_alias = self.node["otherNodeRolesAlias"]
+        self.roles = self.__decode_roles()
+
+    def __decode_roles(self):
+        roles = 0
+        if "quorum" in self.designation:
+            roles |= SpectrumScaleNode.ROLE_QUORUM
+        if "manager" in (self.designation).lower():
+            roles |= SpectrumScaleNode.ROLE_MANAGER
+
+        role_codes = set([code.strip() for code in self.other_roles.split(",")])
+        role_aliases = set([alias.strip()
+                            for alias in self.role_alias.split(",")])
+        for role, codes, aliases in SpectrumScaleNode.ROLE_CODES:
+            if not (role_codes.isdisjoint(codes) and
+                    role_aliases.isdisjoint(aliases)):
+                roles |= role
+        return roles
 
     def get_node_number(self):
         return self.node_number
@@ -98,74 +143,57 @@ class SpectrumScaleNode:
         #     "cnfs"
         return self.role_alias
 
+    def get_roles(self):
+        # Mask of the SpectrumScaleNode.ROLE_* bits of the node
+        return self.roles
+
+    def has_roles(self, roles, match_all=False):
+        """
+        Return True if the node has any (or, if match_all, all) of the
+        roles, given as a mask of SpectrumScaleNode.ROLE_* bits
+        """
+        if match_all:
+            return self.roles & roles == roles
+        return self.roles & roles != 0
+
     def is_quorum_node(self):
-        if "quorum" in self.designation:
-            return True
-        return False
+        return self.roles & SpectrumScaleNode.ROLE_QUORUM != 0
 
     def is_manager_node(self):
-        if "manager" in (self.designation).lower():
-            return True
-        return False
+        return self.roles & SpectrumScaleNode.ROLE_MANAGER != 0
 
     def is_tct_node(self):
-        if "M" in self.other_roles:
-            return True
-        return False
+        return self.roles & SpectrumScaleNode.ROLE_TCT != 0
 
     def is_gateway_node(self):
-        if ("G" in self.other_roles or
-            "gateway" in self.role_alias):
-            return True
-        return False
+        return self.roles & SpectrumScaleNode.ROLE_GATEWAY != 0
 
     def is_ctdb_node(self):
-        if "ctdb" in self.role_alias:
-            return True
-        return False
+        return self.roles & SpectrumScaleNode.ROLE_CTDB != 0
 
     def is_io_node(self):
-        if ("I" in self.other_roles or
-            "ionode" in self.role_alias):
-            return True
-        return False
+        return self.roles & SpectrumScaleNode.ROLE_IO != 0
 
     def is_snmp_node(self):
-        if ("s" in self.other_roles or
-            "snmp_collector" in self.role_alias):
-            return True
-        return False
+        return self.roles & SpectrumScaleNode.ROLE_SNMP != 0
 
     def is_teal_node(self):
-        if ("t" in self.other_roles or
-            "teal_collector" in self.role_alias):
-            return True
-        return False
+        return self.roles & SpectrumScaleNode.ROLE_TEAL != 0
 
     def is_perfmon_node(self):
-        if ("Z" in self.other_roles or
-            "perfmon" in self.role_alias):
-            return True
-        return False
+        return self.roles & SpectrumScaleNode.ROLE_PERFMON != 0
 
     def is_ces_node(self):
-        if ("X" in self.other_roles or
-            "ces" in self.role_alias):
-            return True
-        return False
+        return self.roles & SpectrumScaleNode.ROLE_CES != 0
 
     def is_cnfs_node(self):
-        if ("E" in self.other_roles or
-            "D" in self.other_roles or
-            "cnfs" in self.role_alias):
-            return True
-        return False
+        return self.roles & SpectrumScaleNode.ROLE_CNFS != 0
 
     def to_json(self):
-        return json.dumps(self.node)
+        return json.dumps(records_to_dicts(self.node))
 
     def get_node_dict(self):
-        return self.node
+        return records_to_dicts(self.node)
 
     def print_node(self):
         print(("Node Number            : {0}".format(self.get_node_number())))
@@ -231,14 +259,14 @@ class SpectrumScaleNode:
 
 
     @staticmethod
-    def get_state(node_names=[], admin_ip=None):
+    def __retrieve_state(node_names=[], admin_ip=None, retry_policy=None):
         stdout = stderr = ""
         rc = RC_SUCCESS
         cmd = []
         mmcmd_idx = 1
 
         if admin_ip:
-            cmd.extend(["ssh", admin_ip])
+            cmd.extend(SpectrumScaleSSH.get_command(admin_ip))
             mmcmd_idx = len(cmd) + 1
 
         cmd.extend([os.path.join(GPFS_CMD_PATH, "mmgetstate")])
@@ -254,7 +282,8 @@ class SpectrumScaleNode:
         cmd.append("-Y")
 
         try:
-            stdout, stderr, rc = runCmd(cmd, sh=False)
+            stdout, stderr, rc = runCmd(cmd, sh=False,
+                                        retry_policy=retry_policy)
         except Exception as e:
             raise SpectrumScaleException(str(e), cmd[0:mmcmd_idx], cmd[mmcmd_idx:],
                                          -1, stdout, stderr)
@@ -265,7 +294,14 @@ class SpectrumScaleNode:
                                          rc, stdout, stderr)
 
         node_state_dict = parse_unique_records(stdout)
-        node_state_list = node_state_dict["mmgetstate"]
+        return node_state_dict.get("mmgetstate", [])
+
+
+    @staticmethod
+    def get_state(node_names=[], admin_ip=None, retry_policy=None):
+        node_state_list = SpectrumScaleNode.__retrieve_state(node_names,
+                                                             admin_ip,
+                                                             retry_policy)
 
         node_state = {}
         for node in node_state_list:
@@ -275,26 +311,102 @@ class SpectrumScaleNode:
 
 
     @staticmethod
-    def shutdown_node(node_name, wait=True, admin_ip=None):
+    def wait_for_state(node_names, state, admin_ip=None, retry_policy=None,
+                       timeout=180, interval=1, max_interval=10):
+        """
+        Poll the state of the nodes until all of them are in the given
+        state, for a maximum of timeout seconds (3 minutes by default).
+        The polling interval starts at interval seconds and doubles, up to
+        max_interval, whenever a poll finds no new node in the state.
+        A node not reported by mmgetstate under its name is looked up by
+        node number; a node that can not be found stays pending.
+        @return: (reached, pending) the time at which each node was first
+                 seen in the state, and the nodes of node_names not in the
+                 state
+        """
+        reached = {}
+        pending = list(node_names)
+        # Identifiers under which each node may be reported by mmgetstate
+        node_keys = dict((node_name, [node_name, node_name.split(".")[0]])
+                         for node_name in node_names)
+        resolved = set()
+        deadline = time.time() + timeout
+        while pending:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            time.sleep(min(interval, remaining))
+            node_state_list = SpectrumScaleNode.__retrieve_state(
+                                  pending, admin_ip, retry_policy)
+            now = time.time()
+
+            # mmgetstate reports the nodes by their short host name
+            node_state = {}
+            for node in node_state_list:
+                node_state[str(node["nodeNumber"])] = node["state"]
+                node_state[node["nodeName"]] = node["state"]
+
+            unmatched = [node_name for node_name in pending
+                         if node_name not in resolved and
+                            not any(key in node_state
+                                    for key in node_keys[node_name])]
+            if unmatched:
+                # Nodes given by another name (e.g. an IP address) are
+                # looked up in the cluster to find their node number. A
+                # node that can not be resolved stays pending
+                cluster = SpectrumScaleCluster(admin_ip, retry_policy)
+                for node_name in unmatched:
+                    resolved.add(node_name)
+                    node = cluster.get_node(node_name)
+                    if node is not None:
+                        node_keys[node_name].extend(
+                            [str(node.get_node_number()),
+                             node.get_daemon_node_name().split(".")[0],
+                             node.get_admin_node_name().split(".")[0]])
+
+            not_ready = []
+            for node_name in pending:
+                current = None
+                for key in node_keys[node_name]:
+                    current = node_state.get(key)
+                    if current is not None:
+                        break
+                if current is None or state not in current:
+                    not_ready.append(node_name)
+
+            if len(not_ready) == len(pending):
+                interval = min(interval * 2, max_interval)
+            not_ready_set = set(not_ready)
+            for node_name in pending:
+                if node_name not in not_ready_set:
+                    reached[node_name] = now
+            pending = not_ready
+
+        return reached, pending
+
+
+    @staticmethod
+    def shutdown_node(node_name, wait=True, admin_ip=None, retry_policy=None):
         stdout = stderr = ""
         rc = RC_SUCCESS
         cmd = []
         mmcmd_idx = 1
 
         if admin_ip:
-            cmd.extend(["ssh", admin_ip])
+            cmd.extend(SpectrumScaleSSH.get_command(admin_ip))
             mmcmd_idx = len(cmd) + 1
 
         if isinstance(node_name, str):
             node_name_str = node_name
             node_name_list = [node_name]
         else:
-            node_name_str = ' '.join(node_name)
+            node_name_str = ','.join(node_name)
             node_name_list = node_name
  
         cmd.extend([os.path.join(GPFS_CMD_PATH, "mmshutdown"), "-N", node_name_str])
         try:
-            stdout, stderr, rc = runCmd(cmd, sh=False)
+            stdout, stderr, rc = runCmd(cmd, sh=False,
+                                        retry_policy=retry_policy)
         except Exception as e:
             raise SpectrumScaleException(str(e), cmd[0:mmcmd_idx], cmd[mmcmd_idx:],
                                          -1, stdout, stderr)
@@ -305,17 +417,10 @@ class SpectrumScaleNode:
                                          rc, stdout, stderr)
 
         if wait:
-            # Wait for a maximum of 36 * 5 = 180 seconds (3 minutes)
-            MAX_RETRY = 36
-            retry = 0
-            done = False
-            while(not done and retry < MAX_RETRY):
-                time.sleep(5)
-                node_state = SpectrumScaleNode.get_state(node_name_list, admin_ip)
-                done = all("down" in state for state in list(node_state.values()))
-                retry = retry + 1
-
-            if not done:
+            # Wait for a maximum of 180 seconds (3 minutes)
+            reached, pending = SpectrumScaleNode.wait_for_state(
+                                   node_name_list, "down", admin_ip, retry_policy)
+            if pending:
                 raise SpectrumScaleException("Shutting down node(s) timed out",
                                              cmd[0:mmcmd_idx], cmd[mmcmd_idx:], -1, "",
                                              "Node state is not \"down\" after retries")
@@ -323,26 +428,27 @@ class SpectrumScaleNode:
 
 
     @staticmethod
-    def start_node(node_name, wait=True, admin_ip=None):
+    def start_node(node_name, wait=True, admin_ip=None, retry_policy=None):
         stdout = stderr = ""
         rc = RC_SUCCESS
         cmd = []
         mmcmd_idx = 1
 
         if admin_ip:
-            cmd.extend(["ssh", admin_ip])
+            cmd.extend(SpectrumScaleSSH.get_command(admin_ip))
             mmcmd_idx = len(cmd) + 1
 
         if isinstance(node_name, str):
             node_name_str = node_name
             node_name_list = [node_name]
         else:
-            node_name_str = ' '.join(node_name)
+            node_name_str = ','.join(node_name)
             node_name_list = node_name
  
         cmd.extend([os.path.join(GPFS_CMD_PATH, "mmstartup"), "-N", node_name_str])
         try:
-            stdout, stderr, rc = runCmd(cmd, sh=False)
+            stdout, stderr, rc = runCmd(cmd, sh=False,
+                                        retry_policy=retry_policy)
         except Exception as e:
             raise SpectrumScaleException(str(e), cmd[0:mmcmd_idx], cmd[mmcmd_idx:],
                                          -1, stdout, stderr)
@@ -353,17 +459,10 @@ class SpectrumScaleNode:
                                          rc, stdout, stderr)
 
         if wait:
-            # Wait for a maximum of 36 * 5 = 180 seconds (3 minutes)
-            MAX_RETRY = 36
-            retry = 0
-            done = False
-            while(not done and retry < MAX_RETRY):
-                time.sleep(5)
-                node_state = SpectrumScaleNode.get_state(node_name_list, admin_ip)
-                done = all("active" in state for state in list(node_state.values()))
-                retry = retry + 1
-
-            if not done:
+            # Wait for a maximum of 180 seconds (3 minutes)
+            reached, pending = SpectrumScaleNode.wait_for_state(
+                                   node_name_list, "active", admin_ip, retry_policy)
+            if pending:
                 raise SpectrumScaleException("Starting node(s) timed out",
                                              cmd[0:mmcmd_idx], cmd[mmcmd_idx:], -1, "",
                                              "Node state is not \"active\" after retries")
@@ -372,18 +471,19 @@ class SpectrumScaleNode:
 
 class SpectrumScaleCluster:
 
-    def __retrieve_cluster_info(self, admin_ip):
+    def __retrieve_cluster_info(self, admin_ip, retry_policy):
         stdout = stderr = ""
         rc = RC_SUCCESS
         cmd = []
         mmcmd_idx = 1
         if admin_ip:
-            cmd.extend(["ssh", admin_ip])
+            cmd.extend(SpectrumScaleSSH.get_command(admin_ip))
             mmcmd_idx = len(cmd) + 1
           
         cmd.extend([os.path.join(GPFS_CMD_PATH, "mmlscluster"), "-Y"])
         try:
-            stdout, stderr, rc = runCmd(cmd, sh=False)
+            stdout, stderr, rc = runCmd(cmd, sh=False,
+                                        retry_policy=retry_policy)
         except Exception as e:
             raise SpectrumScaleException(str(e), cmd[0:mmcmd_idx], cmd[mmcmd_idx:],
                                          -1, stdout, stderr)
@@ -395,10 +495,11 @@ class SpectrumScaleCluster:
         return  parse_aggregate_cmd_output(stdout, 
                                            ["clusterSummary",
                                             "cnfsSummary",
-                                            "cesSummary"])
+                                            "cesSummary"],
+                                           as_records=True)
 
-    def __init__(self, admin_ip=None):
-        self.cluster_dict = self.__retrieve_cluster_info(admin_ip)
+    def __init__(self, admin_ip=None, retry_policy=None):
+        self.cluster_dict = self.__retrieve_cluster_info(admin_ip, retry_policy)
         self.name = self.cluster_dict["clusterSummary"]["clusterName"]
         self.c_id = self.cluster_dict["clusterSummary"]["clusterId"]
         self.uid_domain = self.cluster_dict["clusterSummary"]["uidDomain"]
@@ -409,6 +510,8 @@ class SpectrumScaleCluster:
         self.repository_type = self.cluster_dict["clusterSummary"]["repositoryType"]
         self.primary_server = self.cluster_dict["clusterSummary"]["primaryServer"]
         self.secondary_server = self.cluster_dict["clusterSummary"]["secondaryServer"]
+        self.node_list = None
+        self.node_index = None
         
 
     def get_name(self):
@@ -464,38 +567,110 @@ class SpectrumScaleCluster:
                    self.get_secondary_server()))
 
     def to_json(self):
-        return json.dumps(self.cluster_dict)
+        return json.dumps(records_to_dicts(self.cluster_dict))
 
     def get_cluster_dict(self):
-        return self.cluster_dict
+        return records_to_dicts(self.cluster_dict)
 
     def get_nodes(self):
-        node_list = []
-        for node in self.cluster_dict["clusterNode"]:
-            node_instance = SpectrumScaleNode(node)
-            node_list.append(node_instance)
+        if self.node_list is None:
+            self.node_list = []
+            for node in self.cluster_dict["clusterNode"]:
+                node_instance = SpectrumScaleNode(node)
+                self.node_list.append(node_instance)
+
+        return list(self.node_list)
+
+    def __get_node_index(self):
+        # Index the nodes by daemon node name, admin node name, IP address,
+        # node number and short host name. The full names, addresses and
+        # numbers take precedence; a short host name shared by several
+        # nodes (different domains) is not indexed.
+        if self.node_index is None:
+            node_index = {}
+            short_names = {}
+            for node in self.get_nodes():
+                for identifier in (str(node.get_node_number()),
+                                   node.get_ip_address(),
+                                   node.get_admin_node_name(),
+                                   node.get_daemon_node_name()):
+                    node_index[identifier] = node
+                for name in set([node.get_admin_node_name().split(".")[0],
+                                 node.get_daemon_node_name().split(".")[0]]):
+                    short_names.setdefault(name, []).append(node)
+
+            for name, nodes in list(short_names.items()):
+                if name not in node_index and len(nodes) == 1:
+                    node_index[name] = nodes[0]
+            self.node_index = node_index
+
+        return self.node_index
+
+    def get_node(self, identifier):
+        """
+        Return the node with the given daemon node name, admin node name,
+        IP address, node number or short host name (None if not found)
+        """
+        return self.__get_node_index().get(str(identifier).strip())
+
+    def resolve_nodes(self, identifiers):
+        """
+        Resolve a list of node identifiers (see get_node) in one pass.
+        @return: (resolved, unresolved) the nodes found, without
+                 duplicates and in the order of identifiers, and the
+                 identifiers that did not match any node
+        """
+        node_index = self.__get_node_index()
+        resolved = []
+        unresolved = []
+        seen = set()
+        for identifier in identifiers:
+            node = node_index.get(str(identifier).strip())
+            if node is None:
+                unresolved.append(identifier)
+            elif node.get_node_number() not in seen:
+                seen.add(node.get_node_number())
+                resolved.append(node)
+
+        return resolved, unresolved
+
+    def get_nodes_with_roles(self, roles, match_all=False):
+        """
+        Return the nodes of the cluster having any (or, if match_all, all)
+        of the roles, given as a mask of SpectrumScaleNode.ROLE_* bits
+        """
+        return SpectrumScaleCluster.filter_nodes_by_roles(self.get_nodes(),
+                                                          roles, match_all)
 
-        return node_list
+    @staticmethod
+    def filter_nodes_by_roles(node_list, roles, match_all=False):
+        """
+        Return the nodes of node_list having any (or, if match_all, all)
+        of the roles, given as a mask of SpectrumScaleNode.ROLE_* bits
+        """
+        return [node for node in node_list
+                if node.has_roles(roles, match_all)]
 
     @staticmethod
-    def delete_node(node_name, admin_ip=None):
+    def delete_node(node_name, admin_ip=None, retry_policy=None):
         stdout = stderr = ""
         rc = RC_SUCCESS
 
         if isinstance(node_name, str):
             node_name_str = node_name
         else:
-            node_name_str = ' '.join(node_name)
+            node_name_str = ','.join(node_name)
 
         cmd = []
         mmcmd_idx = 1
         if admin_ip:
-            cmd.extend(["ssh", admin_ip])
+            cmd.extend(SpectrumScaleSSH.get_command(admin_ip))
             mmcmd_idx = len(cmd) + 1
 
         cmd.extend([os.path.join(GPFS_CMD_PATH, "mmdelnode"), "-N", node_name_str])
         try:
-            stdout, stderr, rc = runCmd(cmd, sh=False)
+            stdout, stderr, rc = runCmd(cmd, sh=False,
+                                        retry_policy=retry_policy)
         except Exception as e:
             raise SpectrumScaleException(str(e), cmd[0:mmcmd_idx], cmd[mmcmd_idx:],
                                          -1, stdout, stderr)
@@ -509,25 +684,26 @@ class SpectrumScaleCluster:
 
 
     @staticmethod
-    def add_node(node_name, stanza_path, admin_ip=None):
+    def add_node(node_name, stanza_path, admin_ip=None, retry_policy=None):
         stdout = stderr = ""
         rc = RC_SUCCESS
 
         if isinstance(node_name, str):
             node_name_str = node_name
         else:
-            node_name_str = ' '.join(node_name)
+            node_name_str = ','.join(node_name)
 
         cmd = []
         mmcmd_idx = 1
         if admin_ip:
-            cmd.extend(["ssh", admin_ip])
+            cmd.extend(SpectrumScaleSSH.get_command(admin_ip))
             mmcmd_idx = len(cmd) + 1
 
         cmd.extend([os.path.join(GPFS_CMD_PATH, "mmaddnode"),
                     "-N", stanza_path, "--accept"])
         try:
-            stdout, stderr, rc = runCmd(cmd, sh=False)
+            stdout, stderr, rc = runCmd(cmd, sh=False,
+                                        retry_policy=retry_policy)
         except Exception as e:
             raise SpectrumScaleException(str(e), cmd[0:mmcmd_idx], cmd[mmcmd_idx:], 
                                          -1, stdout, stderr)
@@ -541,26 +717,27 @@ class SpectrumScaleCluster:
 
 
     @staticmethod
-    def apply_license(node_name, license, admin_ip=None):
+    def apply_license(node_name, license, admin_ip=None, retry_policy=None):
         stdout = stderr = ""
         rc = RC_SUCCESS
 
         if isinstance(node_name, str):
             node_name_str = node_name
         else:
-            node_name_str = ' '.join(node_name)
+            node_name_str = ','.join(node_name)
 
         cmd = []
         mmcmd_idx = 1
         if admin_ip:
-            cmd.extend(["ssh", admin_ip])
+            cmd.extend(SpectrumScaleSSH.get_command(admin_ip))
             mmcmd_idx = len(cmd) + 1
 
         cmd.extend([os.path.join(GPFS_CMD_PATH, "mmchlicense"), license, 
                     "--accept", "-N", node_name_str])
 
         try:
-            stdout, stderr, rc = runCmd(cmd, sh=False)
+            stdout, stderr, rc = runCmd(cmd, sh=False,
+                                        retry_policy=retry_policy)
         except Exception as e:
             raise SpectrumScaleException(str(e), cmd[0:mmcmd_idx], cmd[mmcmd_idx:], 
                                          -1, stdout, stderr)
@@ -575,20 +752,21 @@ class SpectrumScaleCluster:
 
 
     @staticmethod
-    def create_cluster(name, stanza_path, admin_ip=None):
+    def create_cluster(name, stanza_path, admin_ip=None, retry_policy=None):
         stdout = stderr = ""
         rc = RC_SUCCESS
 
         cmd = []
         mmcmd_idx = 1
         if admin_ip:
-            cmd.extend(["ssh", admin_ip])
+            cmd.extend(SpectrumScaleSSH.get_command(admin_ip))
             mmcmd_idx = len(cmd) + 1
 
         cmd.extend([os.path.join(GPFS_CMD_PATH, "mmcrcluster"), "-N", stanza_path, 
                     "-C", name])
         try:
-            stdout, stderr, rc = runCmd(cmd, sh=False)
+            stdout, stderr, rc = runCmd(cmd, sh=False,
+                                        retry_policy=retry_policy)
         except Exception as e:
             raise SpectrumScaleException(str(e), cmd[0:mmcmd_idx], cmd[mmcmd_idx:],
                                          -1, stdout, stderr)
@@ -603,20 +781,21 @@ class SpectrumScaleCluster:
 
 
     @staticmethod
-    def delete_cluster(name, admin_ip=None):
+    def delete_cluster(name, admin_ip=None, retry_policy=None):
         stdout = stderr = ""
         rc = RC_SUCCESS
 
         cmd = []
         mmcmd_idx = 1
         if admin_ip:
-            cmd.extend(["ssh", admin_ip])
+            cmd.extend(SpectrumScaleSSH.get_command(admin_ip))
             mmcmd_idx = len(cmd) + 1
 
         cmd.extend([os.path.join(GPFS_CMD_PATH, "mmdelnode"), "-a"])
 
         try:
-            stdout, stderr, rc = runCmd(cmd, sh=False)
+            stdout, stderr, rc = runCmd(cmd, sh=False,
+                                        retry_policy=retry_policy)
         except Exception as e:
             raise SpectrumScaleException(str(e), cmd[0:mmcmd_idx], cmd[mmcmd_idx:],
                                          -1, stdout, stderr)
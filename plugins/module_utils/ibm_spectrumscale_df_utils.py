@@ -23,10 +23,12 @@ import json
 try:
     from ansible.module_utils.ibm_spectrumscale_utils import runCmd, \
             parse_aggregate_cmd_output, parse_unique_records, GPFS_CMD_PATH, \
-            RC_SUCCESS, SpectrumScaleException
+            RC_SUCCESS, SpectrumScaleException, SpectrumScaleSSH, decode, \
+            decode_record, parse_columnar
 except:
     from ibm_spectrumscale_utils import runCmd, parse_aggregate_cmd_output, \
-            parse_unique_records, GPFS_CMD_PATH, RC_SUCCESS, SpectrumScaleException
+            parse_unique_records, GPFS_CMD_PATH, RC_SUCCESS, SpectrumScaleException, \
+            SpectrumScaleSSH, decode, decode_record, parse_columnar
 
 
 class SpectrumScaleDf:
@@ -36,64 +38,64 @@ class SpectrumScaleDf:
         self.node = nsd_df_dict
 
     def get_nsd_name(self):
-        nsd_name = self.node["nsdName"]
+        nsd_name = decode(self.node["nsdName"])
         return nsd_name
 
     def get_storage_pool(self):
-        pool = self.node["storagePool"]
+        pool = decode(self.node["storagePool"])
         return pool
 
     def get_disk_size(self):
-        disk_size = self.node["diskSize"]
+        disk_size = decode(self.node["diskSize"])
         if disk_size:
             return int(disk_size)
         return 0
 
     def get_failure_group(self):
-        fg = self.node["failureGroup"]
+        fg = decode(self.node["failureGroup"])
         return fg
 
     def stores_meta_data(self):
-        meta = self.node["metadata"]
+        meta = decode(self.node["metadata"])
         return meta
 
     def stores_data(self):
-        data = self.node["data"]
+        data = decode(self.node["data"])
         return data
 
     def get_free_blocks(self):
-        free_blocks = self.node["freeBlocks"]
+        free_blocks = decode(self.node["freeBlocks"])
         if free_blocks:
             return int(free_blocks)
         return 0
 
     def get_free_blocks_pct(self):
-        free_blocks_pct = self.node["freeBlocksPct"]
+        free_blocks_pct = decode(self.node["freeBlocksPct"])
         if free_blocks_pct:
             return int(free_blocks_pct)
         return 0
 
     def get_free_fragments(self):
-        free_fragments = self.node["freeFragments"]
+        free_fragments = decode(self.node["freeFragments"])
         if free_fragments:
             return int(free_fragments)
         return 0
 
     def get_free_fragments_pct(self):
-        free_fragments_pct = self.node["freeFragmentsPct"]
+        free_fragments_pct = decode(self.node["freeFragmentsPct"])
         if free_fragments_pct:
             return int(free_fragments_pct)
         return 0
 
     def get_disk_available_for_alloc(self):
-        disk_available_for_alloc  = self.node["diskAvailableForAlloc"]
+        disk_available_for_alloc  = decode(self.node["diskAvailableForAlloc"])
         return disk_available_for_alloc
 
     def to_json(self):
-        return json.dumps(self.nsd_df_dict)
+        return json.dumps(decode_record(self.node))
 
     def get_nsd_df_dict(self):
-        return self.nsd_df_dict
+        return decode_record(self.node)
 
     def print_nsd_df(self):
         print(("NSD Name                : {0}".format(self.get_nsd_name())))
@@ -110,16 +112,14 @@ class SpectrumScaleDf:
 
 
     @staticmethod
-    def get_df_info(filesystem_name, admin_ip=None):
-        nsd_df_info_list = []
-
+    def __retrieve_df_output(filesystem_name, admin_ip=None):
         stdout = stderr = ""
         rc = RC_SUCCESS
 
         cmd = []
         mmcmd_idx = 1
         if admin_ip:
-            cmd.extend(["ssh", admin_ip])
+            cmd.extend(SpectrumScaleSSH.get_command(admin_ip))
             mmcmd_idx = len(cmd) + 1
 
         # TODO
@@ -140,9 +140,21 @@ class SpectrumScaleDf:
                                          cmd[0:mmcmd_idx], cmd[mmcmd_idx:], rc,
                                          stdout, stderr)
 
+        return stdout
+
+
+    @staticmethod
+    def get_df_info(filesystem_name, admin_ip=None):
+        nsd_df_info_list = []
+
+        stdout = SpectrumScaleDf.__retrieve_df_output(filesystem_name,
+                                                      admin_ip)
+
+        # Fields are decoded by the getters, as they are accessed
         df_dict = parse_aggregate_cmd_output(stdout, ["poolTotal", "data", 
                                                       "metadata", "fsTotal", 
-                                                      "inode"])
+                                                      "inode"], raw=True,
+                                             as_records=True)
 
         nsd_df_list = df_dict["nsd"]
 
@@ -153,6 +165,22 @@ class SpectrumScaleDf:
         return nsd_df_info_list
 
 
+    @staticmethod
+    def get_df_columns(filesystem_name, admin_ip=None):
+        """
+        Return the per NSD usage of a filesystem in columnar form.
+        @return: (SpectrumScaleColumns) with the str columns nsdName,
+                 storagePool, failureGroup and the int columns diskSize,
+                 freeBlocks, freeFragments (in KB)
+        """
+        stdout = SpectrumScaleDf.__retrieve_df_output(filesystem_name,
+                                                      admin_ip)
+
+        return parse_columnar(stdout, "nsd",
+                              ["nsdName", "storagePool", "failureGroup"],
+                              ["diskSize", "freeBlocks", "freeFragments"])
+
+
 def main():
     # TODO: Dynamically fetch the Filesystem Names
     nsd_df_list = get_nsd_df_info("FS1")
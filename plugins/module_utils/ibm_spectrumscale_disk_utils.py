@@ -23,10 +23,11 @@ import json
 try:
     from ansible.module_utils.ibm_spectrumscale_utils import runCmd, \
             parse_unique_records, GPFS_CMD_PATH, RC_SUCCESS, \
-            SpectrumScaleException
+            SpectrumScaleException, SpectrumScaleSSH, decode, decode_record
 except:
     from ibm_spectrumscale_utils import runCmd, parse_unique_records, \
-            GPFS_CMD_PATH, RC_SUCCESS, SpectrumScaleException
+            GPFS_CMD_PATH, RC_SUCCESS, SpectrumScaleException, \
+            SpectrumScaleSSH, decode, decode_record
 
 
 class SpectrumScaleDisk:
@@ -38,83 +39,83 @@ class SpectrumScaleDisk:
         self.filesystem = fs_name
 
     def get_nsd_name(self):
-        nsd_name = self.disk["nsdName"]
+        nsd_name = decode(self.disk["nsdName"])
         return nsd_name
 
     def get_driver_type(self):
-        driver_type = self.disk["driverType"]
+        driver_type = decode(self.disk["driverType"])
         return driver_type
 
     def get_sector_size(self):
-        sector_size = self.disk["sectorSize"]
+        sector_size = decode(self.disk["sectorSize"])
         return sector_size
 
     def get_failure_group(self):
-        failure_group = self.disk["failureGroup"]
+        failure_group = decode(self.disk["failureGroup"])
         return failure_group
 
     def contains_metadata(self):
-        metadata = self.disk["metadata"]
+        metadata = decode(self.disk["metadata"])
         if "yes" in metadata:
             return True
         return False
 
     def contains_data(self):
-        data = self.disk["data"]
+        data = decode(self.disk["data"])
         if "yes" in data:
             return True
         return False
 
     def get_status(self):
-        status = self.disk["status"]
+        status = decode(self.disk["status"])
         return status
 
     def get_availability(self):
-        availability = self.disk["availability"]
+        availability = decode(self.disk["availability"])
         return availability
 
     def get_disk_id(self):
-        disk_id = self.disk["diskID"]
+        disk_id = decode(self.disk["diskID"])
         return disk_id
 
     def get_storage_pool(self):
-        pool_name = self.disk["storagePool"]
+        pool_name = decode(self.disk["storagePool"])
         return pool_name
 
     def get_remarks(self):
-        remarks = self.disk["remarks"]
+        remarks = decode(self.disk["remarks"])
         return remarks
 
     def get_num_quorum_disks(self):
-        num_qd_str = self.disk["numQuorumDisks"]
+        num_qd_str = decode(self.disk["numQuorumDisks"])
         num_quorum_disks = int(num_qd_str)
         return num_quorum_disks
 
     def get_read_quorum_value(self):
-        read_qv_str = self.disk["readQuorumValue"]
+        read_qv_str = decode(self.disk["readQuorumValue"])
         read_quorum_value = int(read_qv_str)
         return read_quorum_value
 
     def get_write_quorum_value(self):
-        write_qv_str = self.disk["writeQuorumValue"]
+        write_qv_str = decode(self.disk["writeQuorumValue"])
         write_quorum_value = int(write_qv_str)
         return write_quorum_value
 
     def get_disk_size_KB(self):
-        disk_sz_str = self.disk["diskSizeKB"]
+        disk_sz_str = decode(self.disk["diskSizeKB"])
         disk_size_KB = int(disk_sz_str)
         return disk_size_KB
 
     def get_disk_UID(self):
-        disk_uid = self.disk["diskUID"]
+        disk_uid = decode(self.disk["diskUID"])
         return disk_uid
 
     def get_thin_disk_type(self):
-        thin_disk_type = self.disk["thinDiskType"]
+        thin_disk_type = decode(self.disk["thinDiskType"])
         return thin_disk_type
 
     def to_json(self):
-        return json.dumps(self.disk)
+        return json.dumps(decode_record(self.disk))
 
     def print_disk(self):
         print(("NSD Name           : {0}".format(self.get_nsd_name())))
@@ -136,21 +137,21 @@ class SpectrumScaleDisk:
         print(("Thin Disk Type     : {0}".format(self.get_thin_disk_type())))
 
     @staticmethod
-    def get_all_disk_info(fs_name, admin_ip=None):
-        disk_info_list = []
+    def __retrieve_disk_output(fs_name, admin_ip=None, retry_policy=None):
         stdout = stderr = ""
         rc = RC_SUCCESS
 
         cmd = []
         mmcmd_idx = 1
         if admin_ip:
-            cmd.extend(["ssh", admin_ip])
+            cmd.extend(SpectrumScaleSSH.get_command(admin_ip))
             mmcmd_idx = len(cmd) + 1
 
         cmd.extend([os.path.join(GPFS_CMD_PATH, "mmlsdisk"), fs_name, "-Y"])
         
         try:
-            stdout, stderr, rc = runCmd(cmd, sh=False)
+            stdout, stderr, rc = runCmd(cmd, sh=False,
+                                        retry_policy=retry_policy)
         except Exception as e:
             raise SpectrumScaleException(str(e), cmd[0:mmcmd_idx], cmd[mmcmd_idx:],
                                          -1, stdout, stderr)
@@ -158,13 +159,26 @@ class SpectrumScaleDisk:
         if rc == RC_SUCCESS:
             # TODO: Check the return codes and examine other possibility and verify below
             if "No disks were found" in stderr:
-                return nsd_info_list
+                return ""
         else:
             raise SpectrumScaleException("Retrieving disk information failed",
                                          cmd[0:mmcmd_idx], cmd[mmcmd_idx:], rc,
                                          stdout, stderr) 
 
-        disk_dict = parse_unique_records(stdout)
+        return stdout
+
+
+    @staticmethod
+    def get_all_disk_info(fs_name, admin_ip=None, retry_policy=None):
+        disk_info_list = []
+
+        stdout = SpectrumScaleDisk.__retrieve_disk_output(fs_name, admin_ip,
+                                                          retry_policy)
+        if not stdout:
+            return disk_info_list
+
+        # Fields are decoded by the getters, as they are accessed
+        disk_dict = parse_unique_records(stdout, raw=True, as_records=True)
         disk_list = disk_dict["mmlsdisk"]
 
         for disk in disk_list:
@@ -175,14 +189,19 @@ class SpectrumScaleDisk:
 
 
     @staticmethod
-    def delete_disk(node_name, filesystem_name, disk_names, admin_ip=None):
+    def delete_disk(node_name, filesystem_name, disk_names, admin_ip=None,
+                    retry_policy=None):
         """
             This function performs "mmdeldisk".
             Args:
-                node_name (str): Node for which disk needs to be deleted.
+                node_name (str|list): Node(s) for which disks need to be
+                                  deleted. They restripe the data.
                 filesystems_name (str): Filesystem name associated with the disks.
                 disk_names (list): Disk name to be deleted.
                                   Ex: ['gpfs1nsd', 'gpfs2nsd', 'gpfs3nsd']
+                admin_ip (str): Node on which the command is to be executed.
+                retry_policy (SpectrumScaleRetryPolicy): Retry policy for
+                                  transient failures.
         """
         stdout = stderr = ""
         rc = RC_SUCCESS
@@ -190,16 +209,22 @@ class SpectrumScaleDisk:
         cmd = []
         mmcmd_idx = 1
         if admin_ip:
-            cmd.extend(["ssh", admin_ip])
+            cmd.extend(SpectrumScaleSSH.get_command(admin_ip))
             mmcmd_idx = len(cmd) + 1
 
         disk_name_str = ";".join(disk_names)
 
+        if isinstance(node_name, str):
+            node_name_str = node_name
+        else:
+            node_name_str = ','.join(node_name)
+
         cmd.extend([os.path.join(GPFS_CMD_PATH, "mmdeldisk"), filesystem_name,
-                    disk_name_str, '-N', node_name])
+                    disk_name_str, '-N', node_name_str])
 
         try:
-            stdout, stderr, rc = runCmd(cmd, sh=False)
+            stdout, stderr, rc = runCmd(cmd, sh=False,
+                                        retry_policy=retry_policy)
         except Exception as e:
             raise SpectrumScaleException(str(e), cmd[0:mmcmd_idx], cmd[mmcmd_idx:],
                                          -1, stdout, stderr)
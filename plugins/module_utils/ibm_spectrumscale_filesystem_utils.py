@@ -22,10 +22,11 @@ import json
 try:
     from ansible.module_utils.ibm_spectrumscale_utils import runCmd, \
             parse_simple_cmd_output, GPFS_CMD_PATH, RC_SUCCESS, \
-            SpectrumScaleException
+            SpectrumScaleException, SpectrumScaleSSH
 except:
     from ibm_spectrumscale_utils import runCmd, parse_simple_cmd_output, \
-            GPFS_CMD_PATH, RC_SUCCESS, SpectrumScaleException
+            GPFS_CMD_PATH, RC_SUCCESS, SpectrumScaleException, \
+            SpectrumScaleSSH
 
 
 class SpectrumScaleFS:
@@ -34,47 +35,82 @@ class SpectrumScaleFS:
         self.device_name = device_name
         self.properties_list = filesystem_properties
 
+        # Index the properties by exact fieldName. A field may be listed
+        # more than once (e.g. blockSize for the system pool and the other
+        # pools), so each entry is the list of its properties in order.
+        self.properties = {}
+        for fs_property in self.properties_list:
+            self.properties.setdefault(fs_property["fieldName"],
+                                       []).append(fs_property)
+
+        # Typed values, converted on first access
+        self.typed_properties = {}
+
     def __get_property_as_str(self, prop_name):
         str_prop_value = ""
-        for fs_property in self.properties_list:
-            if prop_name in fs_property["fieldName"]:
-                str_prop_value = fs_property["data"]
+        fs_properties = self.properties.get(prop_name)
+        if fs_properties:
+            str_prop_value = fs_properties[-1]["data"]
         return str_prop_value
 
     def __get_property_as_int(self, prop_name):
-        int_prop_value = 0
-        for fs_property in self.properties_list:
-            if prop_name in fs_property["fieldName"]:
-                int_prop_value = int(fs_property["data"])
-        return int_prop_value
+        key = (prop_name, int)
+        if key not in self.typed_properties:
+            int_prop_value = 0
+            fs_properties = self.properties.get(prop_name)
+            if fs_properties:
+                int_prop_value = int(fs_properties[-1]["data"])
+            self.typed_properties[key] = int_prop_value
+        return self.typed_properties[key]
 
     def __get_property_as_bool(self, prop_name):
-        bool_prop_value = False
-        for fs_property in self.properties_list:
-            if prop_name in fs_property["fieldName"]:
-                if ("Yes" in fs_property["data"] or
-                    "yes" in fs_property["data"]):
+        key = (prop_name, bool)
+        if key not in self.typed_properties:
+            bool_prop_value = False
+            fs_properties = self.properties.get(prop_name)
+            if fs_properties:
+                data = fs_properties[-1]["data"]
+                if "Yes" in data or "yes" in data:
                     bool_prop_value = True
-        return bool_prop_value
+            self.typed_properties[key] = bool_prop_value
+        return self.typed_properties[key]
+
+    def __get_pool_property_as_int(self, prop_name, pool_remarks):
+        key = (prop_name, pool_remarks)
+        if key not in self.typed_properties:
+            int_prop_value = 0
+            for fs_property in self.properties.get(prop_name, []):
+                if pool_remarks in fs_property["remarks"]:
+                    int_prop_value = int(fs_property["data"])
+            self.typed_properties[key] = int_prop_value
+        return self.typed_properties[key]
+
+    def __get_property_as_list(self, prop_name):
+        key = (prop_name, list)
+        if key not in self.typed_properties:
+            prop_value_list = []
+            prop_value_str = self.__get_property_as_str(prop_name)
+            if prop_value_str:
+                prop_value_list = prop_value_str.split(";")
+            self.typed_properties[key] = prop_value_list
+        return list(self.typed_properties[key])
+
+    def get_properties(self, names):
+        """
+        Return the values (str, "" if not set) of the properties with the
+        given fieldNames, as a dict keyed by fieldName
+        """
+        return dict([(name, self.__get_property_as_str(name))
+                     for name in names])
 
     def get_device_name(self):
         return self.device_name
 
     def get_syspool_min_fragment_size(self):
-        syspool_min_fragment_size = 0
-        for fs_property in self.properties_list:
-            if ("minFragmentSize" in fs_property["fieldName"] and
-                "system pool" in fs_property["remarks"]):
-                syspool_min_fragment_size = int(fs_property["data"])
-        return syspool_min_fragment_size
+        return self.__get_pool_property_as_int("minFragmentSize", "system pool")
 
     def get_other_pool_min_fragment_size(self):
-        other_pool_min_fragment_size = 0
-        for fs_property in self.properties_list:
-            if ("minFragmentSize" in fs_property["fieldName"] and
-                "other pools" in fs_property["remarks"]):
-                other_pool_min_fragment_size = int(fs_property["data"])
-        return other_pool_min_fragment_size
+        return self.__get_pool_property_as_int("minFragmentSize", "other pools")
 
     def get_inode_size(self):
         return self.__get_property_as_int("inodeSize")
@@ -107,20 +143,10 @@ class SpectrumScaleFS:
         return self.__get_property_as_int("numNodes")
 
     def get_syspool_block_size(self):
-        syspool_block_size = 0
-        for fs_property in self.properties_list:
-            if ("blockSize" in fs_property["fieldName"] and
-                "system pool" in fs_property["remarks"]):
-                syspool_block_size = int(fs_property["data"])
-        return syspool_block_size
+        return self.__get_pool_property_as_int("blockSize", "system pool")
 
     def get_other_pool_block_size(self):
-        other_pool_block_size = 0
-        for fs_property in self.properties_list:
-            if ("blockSize" in fs_property["fieldName"] and
-                "other pools" in fs_property["remarks"]):
-                other_pool_block_size = int(fs_property["data"])
-        return other_pool_block_size
+        return self.__get_pool_property_as_int("blockSize", "other pools")
 
     def get_quotas_accounting_enabled(self):
         return self.__get_property_as_str("quotasAccountingEnabled")
@@ -201,11 +227,7 @@ class SpectrumScaleFS:
         return self.__get_property_as_int("subblocksPerFullBlock")
 
     def get_storage_pools(self):
-        storage_pool_list = []
-        storage_pool_str = self.__get_property_as_str("storagePools")
-        if storage_pool_str:
-            storage_pool_list = storage_pool_str.split(";")
-        return storage_pool_list
+        return self.__get_property_as_list("storagePools")
 
     def is_file_audit_log_enabled(self):
         return self.__get_property_as_bool("file-audit-log")
@@ -214,11 +236,7 @@ class SpectrumScaleFS:
         return self.__get_property_as_bool("maintenance-mode")
 
     def get_disks(self):
-        disk_list = []
-        disk_str = self.__get_property_as_str("disks")
-        if disk_str:
-            disk_list = disk_str.split(";")
-        return disk_list
+        return self.__get_property_as_list("disks")
 
     def is_automatic_mount_option_enabled(self):
         return self.__get_property_as_bool("automaticMountOption")
@@ -301,7 +319,7 @@ class SpectrumScaleFS:
         cmd = []
         mmcmd_idx = 1
         if admin_ip:
-            cmd.extend(["ssh", admin_ip])
+            cmd.extend(SpectrumScaleSSH.get_command(admin_ip))
             mmcmd_idx = len(cmd) + 1
 
         cmd.extend([os.path.join(GPFS_CMD_PATH, "mmlsfs"), "all", "-Y"])
@@ -342,10 +360,15 @@ class SpectrumScaleFS:
         cmd = []
         mmcmd_idx = 1
         if admin_ip:
-            cmd.extend(["ssh", admin_ip])
+            cmd.extend(SpectrumScaleSSH.get_command(admin_ip))
             mmcmd_idx = len(cmd) + 1
 
-        cmd.extend([os.path.join(GPFS_CMD_PATH, "mmumount"), "all", "-N", node_name])
+        if isinstance(node_name, str):
+            node_name_str = node_name
+        else:
+            node_name_str = ','.join(node_name)
+
+        cmd.extend([os.path.join(GPFS_CMD_PATH, "mmumount"), "all", "-N", node_name_str])
         try:
             stdout, stderr, rc = runCmd(cmd, sh=False)
         except Exception as e:
@@ -375,7 +398,7 @@ class SpectrumScaleFS:
         cmd = []
         mmcmd_idx = 1
         if admin_ip:
-            cmd.extend(["ssh", admin_ip])
+            cmd.extend(SpectrumScaleSSH.get_command(admin_ip))
             mmcmd_idx = len(cmd) + 1
 
         cmd.extend([os.path.join(GPFS_CMD_PATH, "mmcrfs"), name,
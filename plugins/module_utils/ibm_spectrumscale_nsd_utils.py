@@ -19,14 +19,17 @@
 
 import os
 import json
+import time
 
 try:
     from ansible.module_utils.ibm_spectrumscale_utils import runCmd, \
             parse_unique_records, GPFS_CMD_PATH, RC_SUCCESS, \
-            SpectrumScaleException
+            SpectrumScaleException, SpectrumScaleSSH, decode, decode_record, \
+            parse_records_iter
 except:
     from ibm_spectrumscale_utils import runCmd, parse_unique_records, \
-            GPFS_CMD_PATH, RC_SUCCESS, SpectrumScaleException
+            GPFS_CMD_PATH, RC_SUCCESS, SpectrumScaleException, \
+            SpectrumScaleSSH, decode, decode_record, parse_records_iter
 
 
 class SpectrumScaleNSD:
@@ -34,34 +37,34 @@ class SpectrumScaleNSD:
         self.nsd = nsd_dict
 
     def get_name(self):
-        name = self.nsd["diskName"]
+        name = decode(self.nsd["diskName"])
         return name
 
     def get_volume_id(self):
-        volumeId = self.nsd["volumeId"]
+        volumeId = decode(self.nsd["volumeId"])
         return volumeId
 
     def get_server_list(self):
         server_list = []
-        server_list_str = self.nsd["serverList"]
+        server_list_str = decode(self.nsd["serverList"])
         if server_list_str:
             server_list = server_list_str.split(",")
         return server_list
 
     def get_device_type(self):
-        device_type = self.nsd["deviceType"]
+        device_type = decode(self.nsd["deviceType"])
         return device_type
 
     def get_disk_name(self):
-        disk_name = self.nsd["localDiskName"]
+        disk_name = decode(self.nsd["localDiskName"])
         return disk_name
 
     def get_remarks(self):
-        remarks = self.nsd["remarks"]
+        remarks = decode(self.nsd["remarks"])
         return remarks
 
     def to_json(self):
-        return json.dumps(self.nsd)
+        return json.dumps(decode_record(self.nsd))
 
     def print_nsd(self):
         print(("NSD Name   : {0}".format(self.get_name())))
@@ -73,35 +76,52 @@ class SpectrumScaleNSD:
 
     
     @staticmethod
-    def get_all_nsd_info(admin_ip=None):
-        nsd_info_list = []
-
+    def __retrieve_nsd_output(admin_ip=None, retry_policy=None, nsd_names=None):
         stdout = stderr = ""
         rc = RC_SUCCESS
 
         cmd = []
         mmcmd_idx = 1
         if admin_ip:
-            cmd.extend(["ssh", admin_ip])
+            cmd.extend(SpectrumScaleSSH.get_command(admin_ip))
             mmcmd_idx = len(cmd) + 1
 
-        cmd.extend([os.path.join(GPFS_CMD_PATH, "mmlsnsd"),"-a", "-X", "-Y"])
+        if nsd_names:
+            # List only the given NSDs. The server list is reported without
+            # -X, which probes the devices on every server
+            cmd.extend([os.path.join(GPFS_CMD_PATH, "mmlsnsd"),
+                        "-d", ";".join(nsd_names), "-Y"])
+        else:
+            cmd.extend([os.path.join(GPFS_CMD_PATH, "mmlsnsd"),"-a", "-X", "-Y"])
 
         try:
-            stdout, stderr, rc = runCmd(cmd, sh=False)
+            stdout, stderr, rc = runCmd(cmd, sh=False,
+                                        retry_policy=retry_policy)
         except Exception as e:
             raise SpectrumScaleException(str(e), cmd[0:mmcmd_idx], cmd[mmcmd_idx:],
                                          -1, stdout, stderr)
 
         if rc == RC_SUCCESS:
             if "No disks were found" in stderr:
-                return nsd_info_list
+                return ""
         else:
             raise SpectrumScaleException("Retrieving NSD information Failed",
                                          cmd[0:mmcmd_idx], cmd[mmcmd_idx:], rc,
                                          stdout, stderr)
 
-        nsd_dict = parse_unique_records(stdout)
+        return stdout
+
+
+    @staticmethod
+    def get_all_nsd_info(admin_ip=None, retry_policy=None):
+        nsd_info_list = []
+
+        stdout = SpectrumScaleNSD.__retrieve_nsd_output(admin_ip, retry_policy)
+        if not stdout:
+            return nsd_info_list
+
+        # Fields are decoded by the getters, as they are accessed
+        nsd_dict = parse_unique_records(stdout, raw=True, as_records=True)
         nsd_list = nsd_dict["nsd"]
 
         for nsd in nsd_list:
@@ -112,7 +132,112 @@ class SpectrumScaleNSD:
 
 
     @staticmethod
-    def delete_nsd(nsd_list, admin_ip=None):
+    def get_server_nsd_info(server, admin_ip=None, retry_policy=None):
+        """
+        Return the NSDs served by server (remarks "server node" and server
+        in the server list). The other lines of the output are skipped
+        without being materialized.
+        """
+        nsd_info_list = []
+
+        stdout = SpectrumScaleNSD.__retrieve_nsd_output(admin_ip, retry_policy)
+        if not stdout:
+            return nsd_info_list
+
+        filters = {"remarks": "server node",
+                   "serverList": lambda servers: server in servers.split(",")}
+        for datatype, nsd in parse_records_iter(stdout, raw=True,
+                                                as_records=True,
+                                                filters=filters):
+            nsd_info_list.append(SpectrumScaleNSD(nsd))
+
+        return nsd_info_list
+
+
+    @staticmethod
+    def get_nsd_servers(nsd_names, admin_ip=None, retry_policy=None):
+        """
+        Return the server list of each of the NSDs, keyed by NSD name.
+        Only these NSDs are listed ("mmlsnsd -d", without -X).
+        """
+        nsd_servers = {}
+
+        stdout = SpectrumScaleNSD.__retrieve_nsd_output(admin_ip, retry_policy,
+                                                        nsd_names)
+        if not stdout:
+            return nsd_servers
+
+        for datatype, nsd in parse_records_iter(stdout, raw=True,
+                                                as_records=True):
+            nsd_instance = SpectrumScaleNSD(nsd)
+            nsd_servers[nsd_instance.get_name()] = \
+                nsd_instance.get_server_list()
+
+        return nsd_servers
+
+
+    @staticmethod
+    def wait_for_server_removal(removed_servers, admin_ip=None,
+                                retry_policy=None, timeout=300, interval=0.5,
+                                max_interval=10):
+        """
+        Wait for asynchronous mmchnsd changes to be committed: list the
+        changed NSDs until none of them is served by a server removed from
+        it anymore, doubling the interval between the listings (up to
+        max_interval) for a maximum of timeout seconds.
+        An NSD is only considered committed once it is listed without the
+        removed servers: NSDs missing from the listing, or a failed listing,
+        leave the NSDs pending. If the last listing failed, its exception is
+        raised at the deadline.
+        @param removed_servers (dict): servers removed, keyed by NSD name
+        @return: (elapsed, pending) the seconds taken, and the NSDs still
+                 served by a removed server at the deadline
+        """
+        def names(servers):
+            # mmlsnsd may report a server by another name (daemon or
+            # short host name) than the one given to mmchnsd
+            name_set = set(servers)
+            for server in servers:
+                short_name = server.split(".")[0]
+                if not short_name.isdigit():
+                    name_set.add(short_name)
+            return name_set
+
+        removed_names = dict((nsd, names(servers))
+                             for nsd, servers in list(removed_servers.items()))
+
+        start = time.time()
+        deadline = start + timeout
+        pending = list(removed_servers)
+        while True:
+            poll_error = None
+            try:
+                nsd_servers = SpectrumScaleNSD.get_nsd_servers(pending,
+                                                               admin_ip,
+                                                               retry_policy)
+            except SpectrumScaleException as e:
+                # Transient listing failure, keep waiting
+                poll_error = e
+                nsd_servers = {}
+
+            pending = [nsd for nsd in pending
+                       if nsd not in nsd_servers or
+                          names(nsd_servers[nsd]) & removed_names[nsd]]
+
+            now = time.time()
+            if not pending:
+                return now - start, pending
+            if now >= deadline:
+                if poll_error is not None:
+                    raise poll_error
+                return now - start, pending
+
+            time.sleep(min(interval, deadline - now))
+            interval = min(interval * 2, max_interval)
+
+
+    @staticmethod
+    def delete_nsd(nsd_list, admin_ip=None, retry_policy=None):
         nsd_names = ";".join(nsd_list)
 
         stdout = stderr = ""
@@ -121,13 +246,14 @@ class SpectrumScaleNSD:
         cmd = []
         mmcmd_idx = 1
         if admin_ip:
-            cmd.extend(["ssh", admin_ip])
+            cmd.extend(SpectrumScaleSSH.get_command(admin_ip))
             mmcmd_idx = len(cmd) + 1
 
         cmd.extend([os.path.join(GPFS_CMD_PATH, "mmdelnsd"), nsd_names])
 
         try:
-            stdout, stderr, rc = runCmd(cmd, sh=False) 
+            stdout, stderr, rc = runCmd(cmd, sh=False,
+                                        retry_policy=retry_policy)
         except Exception as e:
             raise SpectrumScaleException(str(e), cmd[0:mmcmd_idx], cmd[mmcmd_idx:],
                                          -1, stdout, stderr)
@@ -140,7 +266,8 @@ class SpectrumScaleNSD:
 
     @staticmethod
     def remove_server_access_to_nsd(nsd_to_delete, node_to_delete,
-                                    nsd_attached_to_nodes, admin_ip=None):
+                                    nsd_attached_to_nodes, admin_ip=None,
+                                    retry_policy=None):
         stdout = stderr = ""
         rc = RC_SUCCESS
 
@@ -151,13 +278,14 @@ class SpectrumScaleNSD:
         cmd = []
         mmcmd_idx = 1
         if admin_ip:
-            cmd.extend(["ssh", admin_ip])
+            cmd.extend(SpectrumScaleSSH.get_command(admin_ip))
             mmcmd_idx = len(cmd) + 1
 
         cmd.extend([os.path.join(GPFS_CMD_PATH, "mmchnsd"), server_access_list])
 
         try:
-            stdout, stderr, rc = runCmd(cmd, sh=False)
+            stdout, stderr, rc = runCmd(cmd, sh=False,
+                                        retry_policy=retry_policy)
         except Exception as e:
             e_msg = ("Exception encountered during execution of modifying NSD "
                      "server access list for NSD={0} on Node={1}. Exception "
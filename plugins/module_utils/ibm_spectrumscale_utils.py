@@ -19,18 +19,45 @@
 
 import os
 import sys
+import atexit
+import asyncio
 import json
+import hashlib
+import re
+import random
 import time
 import subprocess
 import threading
 import logging
 import signal
+import heapq
+import shutil
+import tempfile
+import shlex
+import uuid
+import concurrent.futures
 import urllib.request, urllib.parse, urllib.error
 import urllib.parse
+from urllib.parse import unquote
 import types
 from collections import OrderedDict
-
-GPFS_CMD_PATH = "/usr/lpp/mmfs/bin"
+from operator import itemgetter
+from sys import intern
+from array import array
+
+try:
+    import numpy
+    HAS_NUMPY = True
+except ImportError:
+    HAS_NUMPY = False
+
+# Can be pointed at a different set of "mm" commands, e.g. the simulator
+# in plugins/test/simulator
+GPFS_CMD_PATH = os.environ.get("SPECTRUMSCALE_GPFS_CMD_PATH",
+                               "/usr/lpp/mmfs/bin")
+MMSDRFS_PATH  = os.environ.get("SPECTRUMSCALE_MMSDRFS_PATH",
+                               "/var/mmfs/gen/mmsdrfs")
+SNAPSHOT_DIR  = os.environ.get("SPECTRUMSCALE_SNAPSHOT_DIR", "/var/mmfs/tmp")
 RC_SUCCESS    = 0
 CMD_TIMEDOUT  = "CMD_TIMEDOUT"
 
@@ -53,6 +80,15 @@ class SpectrumScaleException(Exception):
     def get_message(self):
         return self._expmsg
 
+    def get_rc(self):
+        return self._rc
+
+    def get_stdout(self):
+        return self._stdout
+
+    def get_stderr(self):
+        return self._stderr
+
     def __str__(self):
         error_str = ("{0}. "
                      "Command: \"{1}\". "
@@ -104,40 +140,1093 @@ class SpectrumScaleLogger:
             logging.shutdown()
 
 
+######################################
+##                                  ##
+##       Transport Functions        ##
+##                                  ##
+######################################
+class SpectrumScaleSSH:
+    """
+    Pool of persistent (multiplexed) SSH channels, one per admin_ip.
+
+    The first command issued against an admin_ip starts an OpenSSH
+    ControlMaster in the background. Every subsequent "ssh <admin_ip> ..."
+    invocation made through get_command() is multiplexed over that master
+    and therefore skips the connection and authentication handshake. All
+    masters are torn down by shutdown(), which the modules call alongside
+    SpectrumScaleLogger.shutdown().
+    """
+    control_dir = None
+    masters = OrderedDict()
+
+    @staticmethod
+    def __get_control_path(admin_ip):
+        if SpectrumScaleSSH.control_dir is None:
+            # Keep the directory name short, UNIX socket paths are limited
+            # to ~100 characters
+            SpectrumScaleSSH.control_dir = tempfile.mkdtemp(prefix="scale-ssh-")
+            # Do not leave masters behind if the module bails out through
+            # fail_json() before reaching the regular shutdown path
+            atexit.register(SpectrumScaleSSH.shutdown)
+        return os.path.join(SpectrumScaleSSH.control_dir, "%C")
+
+    @staticmethod
+    def __start_master(admin_ip, control_path):
+        logger = SpectrumScaleLogger.get_logger()
+        # Start the master explicitly with all of its standard streams
+        # detached, otherwise the backgrounded master would hold on to the
+        # pipes of the first command and block communicate()
+        cmd = ["ssh", "-o", "ControlMaster=yes",
+               "-o", "ControlPersist=yes",
+               "-o", "ControlPath={0}".format(control_path),
+               "-N", "-f", admin_ip]
+        try:
+            rc = subprocess.call(cmd, stdin=subprocess.DEVNULL,
+                                 stdout=subprocess.DEVNULL,
+                                 stderr=subprocess.DEVNULL)
+        except OSError as e:
+            logger.warning("SpectrumScaleSSH: Unable to start master for "
+                           "{0}: {1}".format(admin_ip, e))
+            rc = 255
+
+        if rc != RC_SUCCESS:
+            logger.warning("SpectrumScaleSSH: Master for {0} could not be "
+                           "started (rc={1}). Falling back to one connection "
+                           "per command".format(admin_ip, rc))
+        return rc == RC_SUCCESS
+
+    @staticmethod
+    def get_command(admin_ip):
+        """
+        Return the command prefix used to run a command on admin_ip.
+        @param admin_ip (str): node on which the command is to be executed
+        @return: (list of str) e.g. ["ssh", "-o", ..., admin_ip]
+        """
+        control_path = SpectrumScaleSSH.__get_control_path(admin_ip)
+
+        # Nothing is executed when replaying recorded commands
+        if admin_ip not in SpectrumScaleSSH.masters and \
+           SpectrumScaleReplay.get_mode() != SpectrumScaleReplay.MODE_REPLAY:
+            SpectrumScaleSSH.masters[admin_ip] = \
+                SpectrumScaleSSH.__start_master(admin_ip, control_path)
+
+        # ControlMaster=auto lets the command establish its own connection
+        # if the master went away (or never came up)
+        return ["ssh", "-o", "ControlMaster=auto",
+                "-o", "ControlPath={0}".format(control_path), admin_ip]
+
+    @staticmethod
+    def shutdown():
+        logger = SpectrumScaleLogger.get_logger()
+        for admin_ip, started in list(SpectrumScaleSSH.masters.items()):
+            if not started:
+                continue
+            cmd = ["ssh", "-O", "exit",
+                   "-o", "ControlPath={0}".format(
+                       SpectrumScaleSSH.__get_control_path(admin_ip)),
+                   admin_ip]
+            try:
+                subprocess.call(cmd, stdin=subprocess.DEVNULL,
+                                stdout=subprocess.DEVNULL,
+                                stderr=subprocess.DEVNULL)
+            except OSError as e:
+                logger.warning("SpectrumScaleSSH: Unable to stop master for "
+                               "{0}: {1}".format(admin_ip, e))
+        SpectrumScaleSSH.masters.clear()
+
+        if SpectrumScaleSSH.control_dir:
+            shutil.rmtree(SpectrumScaleSSH.control_dir, ignore_errors=True)
+            SpectrumScaleSSH.control_dir = None
+
+
+######################################
+##                                  ##
+##        Metrics Functions         ##
+##                                  ##
+######################################
+class SpectrumScaleMetrics:
+    """
+    Collects the latency of every command executed through runCmd(),
+    arun_cmd() and SpectrumScaleCmdStream, and the commands served from
+    the cluster snapshot instead. The modules return the aggregated view
+    (get_summary()) as the "perf" section of their result.
+    """
+    # Upper bounds (in sec) of the latency histogram buckets
+    HISTOGRAM_BUCKETS = [0.1, 0.5, 1, 5, 10, 30, 60, 300]
+
+    records = []
+    lock = threading.Lock()
+
+    @staticmethod
+    def get_command_name(cmd):
+        """
+        Return the name of the executable being run, skipping any ssh
+        prefix (see SpectrumScaleSSH.get_command), e.g. "mmlsdisk" for
+        "ssh -o ... node1 /usr/lpp/mmfs/bin/mmlsdisk fs1 -Y"
+        """
+        if isinstance(cmd, str):
+            args = cmd.split()
+        else:
+            args = cmd
+
+        idx = 0
+        if args and os.path.basename(args[0]) == "ssh":
+            idx = 1
+            while idx < len(args) and args[idx] == "-o":
+                idx += 2
+            # Skip the host
+            idx += 1
+
+        if idx >= len(args):
+            return ""
+        # ssh may be given the remote command as a single string
+        argv = args[idx].split()
+        if not argv:
+            return ""
+        return os.path.basename(argv[0])
+
+    @staticmethod
+    def record(cmd, t_run, rc, stdout, retry):
+        """
+        Record a single command execution.
+        @param cmd (str|list of str): command that was executed
+        @param t_run (float): wall time in sec
+        @param rc (int): return code of the command
+        @param stdout (str|int): output of the command (or its size in bytes)
+        @param retry (int): 0 for the first attempt, n for the n-th retry
+        """
+        if isinstance(cmd, str):
+            argv = cmd
+        else:
+            argv = ' '.join(cmd)
+
+        if isinstance(stdout, int):
+            stdout_bytes = stdout
+        else:
+            stdout_bytes = len(stdout or "")
+
+        metric = OrderedDict()
+        metric["command"] = SpectrumScaleMetrics.get_command_name(cmd)
+        metric["argv"] = argv
+        metric["time"] = t_run
+        metric["rc"] = rc
+        metric["stdout_bytes"] = stdout_bytes
+        metric["retry"] = retry
+        metric["snapshot"] = False
+
+        with SpectrumScaleMetrics.lock:
+            SpectrumScaleMetrics.records.append(metric)
+
+    @staticmethod
+    def record_snapshot_hit(cmd, stdout):
+        """
+        Record a command served from the cluster snapshot (not executed).
+        @param cmd (str|list of str): command that was requested
+        @param stdout (str): output served
+        """
+        SpectrumScaleMetrics.record(cmd, 0.0, RC_SUCCESS, stdout, 0)
+        with SpectrumScaleMetrics.lock:
+            SpectrumScaleMetrics.records[-1]["snapshot"] = True
+
+    @staticmethod
+    def get_records():
+        with SpectrumScaleMetrics.lock:
+            return list(SpectrumScaleMetrics.records)
+
+    @staticmethod
+    def reset():
+        with SpectrumScaleMetrics.lock:
+            SpectrumScaleMetrics.records = []
+
+    @staticmethod
+    def get_summary():
+        """
+        Aggregate the recorded executions per command.
+        @return: (OrderedDict) e.g.
+                 {
+                   "mmlsdisk": {
+                     "count": 2, "failed": 0, "retries": 0,
+                     "total_time": 1.62, "min_time": 0.71,
+                     "max_time": 0.91, "mean_time": 0.81,
+                     "stdout_bytes": 5120,
+                     "histogram": {"<=0.1s": 0, "<=0.5s": 0, "<=1s": 2, ...},
+                     "snapshot_hits": 3
+                   }
+                 }
+                 count and the timings cover the executions only,
+                 snapshot_hits counts the requests served from the cluster
+                 snapshot
+        """
+        summary = OrderedDict()
+        for metric in SpectrumScaleMetrics.get_records():
+            name = metric["command"]
+            if name not in summary:
+                histogram = OrderedDict()
+                for bound in SpectrumScaleMetrics.HISTOGRAM_BUCKETS:
+                    histogram["<={0}s".format(bound)] = 0
+                histogram[">{0}s".format(SpectrumScaleMetrics.HISTOGRAM_BUCKETS[-1])] = 0
+
+                summary[name] = OrderedDict([("count", 0),
+                                             ("failed", 0),
+                                             ("retries", 0),
+                                             ("total_time", 0.0),
+                                             ("min_time", 0.0),
+                                             ("max_time", 0.0),
+                                             ("mean_time", 0.0),
+                                             ("stdout_bytes", 0),
+                                             ("histogram", histogram),
+                                             ("snapshot_hits", 0)])
+
+            entry = summary[name]
+            if metric["snapshot"]:
+                entry["snapshot_hits"] += 1
+                continue
+
+            entry["count"] += 1
+            if entry["count"] == 1:
+                entry["min_time"] = entry["max_time"] = metric["time"]
+            if metric["rc"] != RC_SUCCESS:
+                entry["failed"] += 1
+            if metric["retry"]:
+                entry["retries"] += 1
+            entry["total_time"] += metric["time"]
+            entry["min_time"] = min(entry["min_time"], metric["time"])
+            entry["max_time"] = max(entry["max_time"], metric["time"])
+            entry["mean_time"] = entry["total_time"] / entry["count"]
+            entry["stdout_bytes"] += metric["stdout_bytes"]
+
+            bucket = ">{0}s".format(SpectrumScaleMetrics.HISTOGRAM_BUCKETS[-1])
+            for bound in SpectrumScaleMetrics.HISTOGRAM_BUCKETS:
+                if metric["time"] <= bound:
+                    bucket = "<={0}s".format(bound)
+                    break
+            entry["histogram"][bucket] += 1
+
+        return summary
+
+
+######################################
+##                                  ##
+##     Record/Replay Functions      ##
+##                                  ##
+######################################
+class SpectrumScaleReplay:
+    """
+    Records the commands executed through runCmd() to a fixture directory,
+    or serves them back from it without running anything.
+
+    The mode is taken from the environment so that it also applies to the
+    modules run by Ansible:
+        SPECTRUMSCALE_RECORD_DIR=<dir>   record every command to <dir>
+        SPECTRUMSCALE_REPLAY_DIR=<dir>   replay the commands from <dir>
+        SPECTRUMSCALE_REPLAY_LATENCY=1   sleep for the recorded duration
+                                         when replaying
+    or set explicitly through SpectrumScaleReplay.configure().
+
+    Fixtures are content addressed: each distinct command line is stored in
+    <dir>/<sha256 of the command>.json. The ssh options added by
+    SpectrumScaleSSH (e.g. the ControlPath) are not part of the key. If the
+    same command is executed several times (e.g. mmgetstate while waiting
+    for a node), every execution is recorded and replayed in order; the
+    last one is repeated once they are exhausted.
+    """
+    MODE_OFF = "off"
+    MODE_RECORD = "record"
+    MODE_REPLAY = "replay"
+
+    mode = None
+    fixture_dir = None
+    replay_latency = False
+    replay_index = {}
+    lock = threading.Lock()
+
+    @staticmethod
+    def configure(mode, fixture_dir=None, replay_latency=False):
+        with SpectrumScaleReplay.lock:
+            SpectrumScaleReplay.mode = mode
+            SpectrumScaleReplay.fixture_dir = fixture_dir
+            SpectrumScaleReplay.replay_latency = replay_latency
+            SpectrumScaleReplay.replay_index = {}
+            if mode == SpectrumScaleReplay.MODE_RECORD and fixture_dir and \
+               not os.path.isdir(fixture_dir):
+                os.makedirs(fixture_dir)
+
+    @staticmethod
+    def get_mode():
+        if SpectrumScaleReplay.mode is None:
+            if os.environ.get("SPECTRUMSCALE_REPLAY_DIR"):
+                SpectrumScaleReplay.configure(
+                    SpectrumScaleReplay.MODE_REPLAY,
+                    os.environ["SPECTRUMSCALE_REPLAY_DIR"],
+                    os.environ.get("SPECTRUMSCALE_REPLAY_LATENCY", "") not in ("", "0"))
+            elif os.environ.get("SPECTRUMSCALE_RECORD_DIR"):
+                SpectrumScaleReplay.configure(
+                    SpectrumScaleReplay.MODE_RECORD,
+                    os.environ["SPECTRUMSCALE_RECORD_DIR"])
+            else:
+                SpectrumScaleReplay.configure(SpectrumScaleReplay.MODE_OFF)
+        return SpectrumScaleReplay.mode
+
+    @staticmethod
+    def get_key(cmd):
+        """
+        Return the fixture key of a command: the sha256 of its arguments,
+        ignoring the "-o <option>" arguments of a leading ssh.
+        """
+        if isinstance(cmd, str):
+            args = [cmd]
+        else:
+            args = list(cmd)
+
+        if args and args[0] == "ssh":
+            normalized = ["ssh"]
+            idx = 1
+            while idx < len(args) and args[idx] == "-o":
+                idx += 2
+            normalized.extend(args[idx:])
+            args = normalized
+
+        digest = hashlib.sha256(json.dumps(args).encode("utf-8"))
+        return args, digest.hexdigest()
+
+    @staticmethod
+    def __get_fixture_path(key):
+        return os.path.join(SpectrumScaleReplay.fixture_dir,
+                            "{0}.json".format(key))
+
+    @staticmethod
+    def record(cmd, stdout, stderr, rc, duration):
+        args, key = SpectrumScaleReplay.get_key(cmd)
+        fixture_path = SpectrumScaleReplay.__get_fixture_path(key)
+
+        with SpectrumScaleReplay.lock:
+            fixture = {"argv": args, "recordings": []}
+            if os.path.exists(fixture_path):
+                with open(fixture_path) as fixture_file:
+                    fixture = json.load(fixture_file)
+
+            fixture["recordings"].append({"stdout": stdout,
+                                          "stderr": stderr,
+                                          "rc": rc,
+                                          "duration": duration})
+
+            tmp_path = "{0}.{1}.tmp".format(fixture_path, os.getpid())
+            with open(tmp_path, "w") as fixture_file:
+                json.dump(fixture, fixture_file, indent=2)
+            os.rename(tmp_path, fixture_path)
+
+    @staticmethod
+    def replay(cmd):
+        """
+        Return the recorded output of a command.
+        @return: (stdout, stderr, rc, duration) (str, str, int, float)
+        """
+        logger = SpectrumScaleLogger.get_logger()
+        args, key = SpectrumScaleReplay.get_key(cmd)
+        fixture_path = SpectrumScaleReplay.__get_fixture_path(key)
+
+        if not os.path.exists(fixture_path):
+            logger.warning("SpectrumScaleReplay: No recording for command "
+                           "{0} ({1})".format(' '.join(args), fixture_path))
+            return ("", "No recording for command {0}".format(' '.join(args)),
+                    127, 0.0)
+
+        with SpectrumScaleReplay.lock:
+            with open(fixture_path) as fixture_file:
+                recordings = json.load(fixture_file)["recordings"]
+            index = SpectrumScaleReplay.replay_index.get(key, 0)
+            SpectrumScaleReplay.replay_index[key] = index + 1
+
+        recording = recordings[min(index, len(recordings) - 1)]
+        if SpectrumScaleReplay.replay_latency:
+            time.sleep(recording["duration"])
+
+        return (recording["stdout"], recording["stderr"], recording["rc"],
+                recording["duration"])
+
+
+######################################
+##                                  ##
+##        Snapshot Functions        ##
+##                                  ##
+######################################
+class SpectrumScaleClusterSnapshot:
+    """
+    Point in time copy of the output of the read-only commands describing
+    the cluster configuration: mmlscluster, mmlsnsd -X and mmlsfs all. The
+    commands reporting usage or state (mmdf, mmlsdisk, mmgetstate) are
+    never served from it, as these change without a new configuration
+    generation.
+
+    Once enabled, the first of these commands run through runCmd() collects
+    all of them in parallel, and runCmd() serves them from the snapshot
+    from then on instead of running them. The snapshot is saved atomically
+    under SNAPSHOT_DIR, so the following tasks and modules of a play reuse
+    it as long as it is younger than its TTL and the configuration
+    generation of the cluster (the version line of mmsdrfs) did not change.
+    Any mm command that is not known to be read-only (run through runCmd(),
+    arun_cmd(), run_cmd_batch() or SpectrumScaleCmdStream) invalidates it:
+    the saved snapshots are removed, even if this module does not use them,
+    and the commands are run again from then on (the next module collects
+    a new snapshot).
+
+        SPECTRUMSCALE_SNAPSHOT_TTL=<sec>   lifetime of the saved snapshot
+                                           (default 60, 0: not saved)
+        SPECTRUMSCALE_SNAPSHOT_DIR=<dir>   directory of the saved snapshot
+    """
+    SNAPSHOT_COMMANDS = ("mmlscluster", "mmlsnsd", "mmlsfs")
+    # Commands that do not change the configuration, besides the mmls*
+    # ones
+    READ_ONLY_COMMANDS = ("mmgetstate", "mmdf", "mmdiag", "mmhealth")
+    SNAPSHOT_VERSION = 2
+    MAX_WORKERS = 8
+
+    enabled = False
+    invalidated = False
+    ttl = 60
+    cache_dir = SNAPSHOT_DIR
+    retry_policy = None
+    snapshots = {}
+    collecting = set()
+    lock = threading.Lock()
+
+    @staticmethod
+    def enable(ttl=None, cache_dir=None, retry_policy=None):
+        """
+        Serve the snapshot commands from a snapshot of the cluster.
+        @param ttl (int): lifetime in sec of the saved snapshot, 0 to only
+                          keep it in memory (default: SPECTRUMSCALE_SNAPSHOT_TTL
+                          or 60)
+        @param cache_dir (str): directory of the saved snapshot
+        @param retry_policy (SpectrumScaleRetryPolicy): retry policy of the
+                          commands run to collect the snapshot
+        """
+        if ttl is None:
+            ttl = int(os.environ.get("SPECTRUMSCALE_SNAPSHOT_TTL", 60))
+        with SpectrumScaleClusterSnapshot.lock:
+            SpectrumScaleClusterSnapshot.enabled = True
+            SpectrumScaleClusterSnapshot.invalidated = False
+            SpectrumScaleClusterSnapshot.ttl = ttl
+            SpectrumScaleClusterSnapshot.cache_dir = cache_dir or SNAPSHOT_DIR
+            SpectrumScaleClusterSnapshot.retry_policy = retry_policy
+            SpectrumScaleClusterSnapshot.snapshots = {}
+
+    @staticmethod
+    def disable():
+        with SpectrumScaleClusterSnapshot.lock:
+            SpectrumScaleClusterSnapshot.enabled = False
+            SpectrumScaleClusterSnapshot.snapshots = {}
+
+    @staticmethod
+    def __get_cache_path(admin_ip):
+        name = re.sub(r"[^A-Za-z0-9_.-]", "_", admin_ip or "local")
+        return os.path.join(SpectrumScaleClusterSnapshot.cache_dir,
+                            "ansible-cluster-snapshot-{0}.json".format(name))
+
+    @staticmethod
+    def __get_saved_paths():
+        try:
+            names = os.listdir(SpectrumScaleClusterSnapshot.cache_dir)
+        except OSError:
+            return []
+        return [os.path.join(SpectrumScaleClusterSnapshot.cache_dir, name)
+                for name in names
+                if name.startswith("ansible-cluster-snapshot-") and
+                   name.endswith(".json")]
+
+    @staticmethod
+    def __get_prefix(admin_ip):
+        if admin_ip:
+            return SpectrumScaleSSH.get_command(admin_ip)
+        return []
+
+    @staticmethod
+    def __run(cmd):
+        return runCmd(cmd, sh=False,
+                      retry_policy=SpectrumScaleClusterSnapshot.retry_policy)
+
+    @staticmethod
+    def get_generation(admin_ip=None):
+        """
+        Return the configuration generation of the cluster (None if it
+        cannot be read)
+        """
+        cmd = SpectrumScaleClusterSnapshot.__get_prefix(admin_ip)
+        cmd.extend(["head", "-n", "1", MMSDRFS_PATH])
+        stdout, stderr, rc = SpectrumScaleClusterSnapshot.__run(cmd)
+
+        values = stdout.split(":")
+        if rc != RC_SUCCESS or len(values) < 4 or \
+           values[1] != "00_VERSION_LINE" or not values[3]:
+            return None
+        return values[3]
+
+    @staticmethod
+    def collect(admin_ip=None):
+        """
+        Run the snapshot commands in parallel.
+        @return: (dict) the stdout and stderr of every command that
+                 succeeded, keyed by SpectrumScaleReplay.get_key()
+        """
+        prefix = SpectrumScaleClusterSnapshot.__get_prefix(admin_ip)
+        cmds = [prefix + [os.path.join(GPFS_CMD_PATH, "mmlscluster"), "-Y"],
+                prefix + [os.path.join(GPFS_CMD_PATH, "mmlsnsd"),
+                          "-a", "-X", "-Y"],
+                prefix + [os.path.join(GPFS_CMD_PATH, "mmlsfs"), "all", "-Y"]]
+
+        outputs = {}
+        with concurrent.futures.ThreadPoolExecutor(
+                SpectrumScaleClusterSnapshot.MAX_WORKERS) as executor:
+            futures = [(cmd, executor.submit(SpectrumScaleClusterSnapshot.__run,
+                                             cmd)) for cmd in cmds]
+            for cmd, future in futures:
+                stdout, stderr, rc = future.result()
+                outputs[SpectrumScaleReplay.get_key(cmd)[1]] = \
+                    {"stdout": stdout, "stderr": stderr, "rc": rc}
+
+        # Failed commands are run again (and their failure handled) by
+        # the caller
+        return dict([(key, output) for key, output in outputs.items()
+                     if output.pop("rc") == RC_SUCCESS])
+
+    @staticmethod
+    def __load(admin_ip, generation):
+        cache_path = SpectrumScaleClusterSnapshot.__get_cache_path(admin_ip)
+        try:
+            with open(cache_path) as cache_file:
+                snapshot = json.load(cache_file)
+        except (IOError, OSError, ValueError):
+            return None
+
+        age = time.time() - snapshot.get("time", 0)
+        if snapshot.get("version") != SpectrumScaleClusterSnapshot.SNAPSHOT_VERSION or \
+           snapshot.get("generation") != generation or \
+           age < 0 or age > SpectrumScaleClusterSnapshot.ttl:
+            return None
+        return snapshot["outputs"]
+
+    @staticmethod
+    def __save(admin_ip, generation, outputs):
+        logger = SpectrumScaleLogger.get_logger()
+        cache_path = SpectrumScaleClusterSnapshot.__get_cache_path(admin_ip)
+        snapshot = {"version": SpectrumScaleClusterSnapshot.SNAPSHOT_VERSION,
+                    "generation": generation,
+                    "time": time.time(),
+                    "outputs": outputs}
+        try:
+            fd, tmp_path = tempfile.mkstemp(
+                               dir=SpectrumScaleClusterSnapshot.cache_dir,
+                               prefix=".ansible-cluster-snapshot-")
+            with os.fdopen(fd, "w") as cache_file:
+                json.dump(snapshot, cache_file)
+            os.rename(tmp_path, cache_path)
+        except (IOError, OSError) as e:
+            logger.warning("SpectrumScaleClusterSnapshot: Cannot save the "
+                           "snapshot to {0}: {1}".format(cache_path, e))
+
+    @staticmethod
+    def __get_snapshot(admin_ip):
+        logger = SpectrumScaleLogger.get_logger()
+        t_start = time.time()
+
+        generation = SpectrumScaleClusterSnapshot.get_generation(admin_ip)
+        if generation is not None and SpectrumScaleClusterSnapshot.ttl > 0:
+            outputs = SpectrumScaleClusterSnapshot.__load(admin_ip, generation)
+            if outputs is not None:
+                logger.debug("SpectrumScaleClusterSnapshot: Reusing the "
+                             "snapshot of generation {0}".format(generation))
+                return outputs
+
+        outputs = SpectrumScaleClusterSnapshot.collect(admin_ip)
+        logger.debug("SpectrumScaleClusterSnapshot: Collected {0} outputs in "
+                     "{1:.2f} sec".format(len(outputs), time.time() - t_start))
+
+        # Only a snapshot that did not straddle a configuration change can
+        # be reused by the next modules
+        if generation is not None and SpectrumScaleClusterSnapshot.ttl > 0 and \
+           SpectrumScaleClusterSnapshot.get_generation(admin_ip) == generation:
+            SpectrumScaleClusterSnapshot.__save(admin_ip, generation, outputs)
+        return outputs
+
+    @staticmethod
+    def lookup(cmd):
+        """
+        Return the snapshot output of a command as (stdout, stderr), or
+        None if the command is not to be served from the snapshot. The
+        snapshot is collected (or loaded) on the first lookup.
+        """
+        if not SpectrumScaleClusterSnapshot.enabled or \
+           SpectrumScaleClusterSnapshot.invalidated or \
+           SpectrumScaleMetrics.get_command_name(cmd) not in \
+           SpectrumScaleClusterSnapshot.SNAPSHOT_COMMANDS:
+            return None
+
+        args, key = SpectrumScaleReplay.get_key(cmd)
+        admin_ip = args[1] if args[0] == "ssh" else None
+
+        with SpectrumScaleClusterSnapshot.lock:
+            # The commands run to collect the snapshot are not served
+            if admin_ip in SpectrumScaleClusterSnapshot.collecting:
+                return None
+            outputs = SpectrumScaleClusterSnapshot.snapshots.get(admin_ip)
+            if outputs is None:
+                SpectrumScaleClusterSnapshot.collecting.add(admin_ip)
+
+        if outputs is None:
+            try:
+                outputs = SpectrumScaleClusterSnapshot.__get_snapshot(admin_ip)
+            except Exception as e:
+                # The commands are run as if there were no snapshot
+                SpectrumScaleLogger.get_logger().warning(
+                    "SpectrumScaleClusterSnapshot: Cannot collect the "
+                    "snapshot: {0}".format(e))
+                outputs = {}
+            finally:
+                with SpectrumScaleClusterSnapshot.lock:
+                    SpectrumScaleClusterSnapshot.collecting.discard(admin_ip)
+                    if outputs is not None:
+                        SpectrumScaleClusterSnapshot.snapshots[admin_ip] = outputs
+
+        output = outputs.get(key)
+        if output is None:
+            return None
+        return (output["stdout"], output["stderr"])
+
+    @staticmethod
+    def invalidate():
+        """
+        Drop the snapshots, in memory and saved (including the ones saved
+        by other modules)
+        """
+        with SpectrumScaleClusterSnapshot.lock:
+            SpectrumScaleClusterSnapshot.snapshots = {}
+            SpectrumScaleClusterSnapshot.invalidated = True
+
+        for cache_path in SpectrumScaleClusterSnapshot.__get_saved_paths():
+            try:
+                os.remove(cache_path)
+            except OSError:
+                pass
+
+    @staticmethod
+    def notify(cmd):
+        """
+        Invalidate the snapshots if cmd may have changed the configuration.
+        The saved snapshots are removed even if the snapshot is not enabled
+        in this module.
+        """
+        command = SpectrumScaleMetrics.get_command_name(cmd)
+        if command.startswith("mm") and not command.startswith("mmls") and \
+           command not in SpectrumScaleClusterSnapshot.READ_ONLY_COMMANDS:
+            SpectrumScaleClusterSnapshot.invalidate()
+
+
 ######################################
 ##                                  ##
 ##       Utility Functions          ##
 ##                                  ##
 ######################################
 def decode(input_string):
+    if "%" not in input_string:
+        return input_string
     return urllib.parse.unquote(input_string)
 
 
-def _stop_process(proc, logger, log_cmd, timeout):
+def decode_record(record):
+    """
+    Return a copy of a record parsed with raw=True with all its fields
+    decoded (as an OrderedDict)
+    """
+    return OrderedDict([(key, decode(value))
+                        for key, value in record.items()])
+
+
+def _signal_process_group(proc, sig):
+    # Commands are started in their own session (start_new_session=True),
+    # so the process group id is the pid of the command. Signal the whole
+    # group to also reach ssh and the children of the mm wrapper scripts.
+    # Once the command has been reaped, its pid (and so the group id) may
+    # be reused by an unrelated process: never signal it anymore
+    if proc.returncode is not None:
+        return
     try:
-        if proc.poll() is None:
-            logger.info("Command %s timed out after %s sec. Sending SIGTERM", log_cmd, timeout)
-            print(("Command %s timed out after %s sec. Sending SIGTERM", log_cmd, timeout))
-            os.kill(proc.pid, signal.SIGTERM)  # SIGKILL or SIGTERM
+        os.killpg(proc.pid, sig)
+    except ProcessLookupError:
+        pass
+    except OSError:
+        os.kill(proc.pid, sig)
+
+
+class SpectrumScaleWatchdog:
+    """
+    Single thread enforcing the timeout of every command in flight.
+
+    Commands register their process and timeout with watch() and call
+    unwatch() once they completed. When a deadline expires, the process
+    group of the command receives SIGTERM and, if it is still alive 0.5 sec
+    later, SIGKILL. This replaces one threading.Timer per command.
+    """
+    KILL_GRACE_PERIOD = 0.5
+
+    # The heap is compacted once it holds more than COMPACT_THRESHOLD
+    # cancelled entries, making up more than half of it
+    COMPACT_THRESHOLD = 64
+
+    lock = threading.Condition()
+    deadlines = []
+    cancelled = 0
+    thread = None
+    seq = 0
+
+    class Entry:
+        def __init__(self, proc, log_cmd, timeout, deadline):
+            self.proc = proc
+            self.log_cmd = log_cmd
+            self.timeout = timeout
+            self.deadline = deadline
+            self.cancelled = False
+            self.queued = False
+            self.timed_out = False
+
+    @staticmethod
+    def watch(proc, log_cmd, timeout):
+        """
+        Start tracking the deadline of a command.
+        @param proc (subprocess.Popen): process of the command
+        @param log_cmd (str): command line used for logging
+        @param timeout (int): timeout in sec, after which the command is forcefully terminated
+        @return: (SpectrumScaleWatchdog.Entry): handle to be passed to unwatch()
+        """
+        entry = SpectrumScaleWatchdog.Entry(proc, log_cmd, timeout,
+                                            time.time() + timeout)
+        with SpectrumScaleWatchdog.lock:
+            SpectrumScaleWatchdog.__push(entry)
+            if SpectrumScaleWatchdog.thread is None:
+                SpectrumScaleWatchdog.thread = threading.Thread(
+                                         target=SpectrumScaleWatchdog.__run,
+                                         name="SpectrumScaleWatchdog")
+                SpectrumScaleWatchdog.thread.daemon = True
+                SpectrumScaleWatchdog.thread.start()
+            SpectrumScaleWatchdog.lock.notify()
+        return entry
+
+    @staticmethod
+    def unwatch(entry):
+        with SpectrumScaleWatchdog.lock:
+            if entry.cancelled:
+                return
+            entry.cancelled = True
+            if not entry.queued:
+                return
+
+            # Commands usually complete long before their deadline. Drop
+            # their entries instead of keeping them until they expire
+            SpectrumScaleWatchdog.cancelled += 1
+            deadlines = SpectrumScaleWatchdog.deadlines
+            if SpectrumScaleWatchdog.cancelled > \
+                    SpectrumScaleWatchdog.COMPACT_THRESHOLD and \
+               SpectrumScaleWatchdog.cancelled * 2 > len(deadlines):
+                deadlines[:] = [item for item in deadlines
+                                if not item[2].cancelled]
+                heapq.heapify(deadlines)
+                SpectrumScaleWatchdog.cancelled = 0
+
+    @staticmethod
+    def __push(entry):
+        # The sequence number keeps the heap from ever comparing entries
+        SpectrumScaleWatchdog.seq += 1
+        entry.queued = True
+        heapq.heappush(SpectrumScaleWatchdog.deadlines,
+                       (entry.deadline, SpectrumScaleWatchdog.seq, entry))
+
+    @staticmethod
+    def __pop():
+        entry = heapq.heappop(SpectrumScaleWatchdog.deadlines)[2]
+        entry.queued = False
+        if entry.cancelled:
+            SpectrumScaleWatchdog.cancelled -= 1
+        return entry
+
+    @staticmethod
+    def __expire(entry):
+        logger = SpectrumScaleLogger.get_logger()
+        # Even if the command itself already exited, members of its process
+        # group may still hold on to the output pipes. Therefore the group
+        # is signalled as long as the command has not been reaped
+        try:
+            if not entry.timed_out:
+                logger.info("Command %s timed out after %s sec. Sending SIGTERM",
+                            entry.log_cmd, entry.timeout)
+                entry.timed_out = True
+                _signal_process_group(entry.proc, signal.SIGTERM)
+                entry.deadline = time.time() + \
+                                 SpectrumScaleWatchdog.KILL_GRACE_PERIOD
+                SpectrumScaleWatchdog.__push(entry)
+            else:
+                logger.info("Command %s timed out after %s sec. Sending SIGKILL",
+                            entry.log_cmd, entry.timeout)
+                _signal_process_group(entry.proc, signal.SIGKILL)
+        except Exception as e:
+            logger.warning(str(e))
+
+    @staticmethod
+    def __run():
+        deadlines = SpectrumScaleWatchdog.deadlines
+        with SpectrumScaleWatchdog.lock:
+            while True:
+                while deadlines and deadlines[0][2].cancelled:
+                    SpectrumScaleWatchdog.__pop()
+
+                if not deadlines:
+                    SpectrumScaleWatchdog.lock.wait()
+                    continue
+
+                wait_time = deadlines[0][0] - time.time()
+                if wait_time > 0:
+                    SpectrumScaleWatchdog.lock.wait(wait_time)
+                    continue
+
+                entry = SpectrumScaleWatchdog.__pop()
+                SpectrumScaleWatchdog.__expire(entry)
+
+
+class SpectrumScaleRetryPolicy:
+    """
+    Describes which command failures are transient and how they are retried.
+
+    A failed command is considered transient if its return code is listed in
+    transient_rcs or if its stderr (or stdout) matches one of the
+    transient_patterns (regular expressions). Transient failures are retried
+    up to max_retries times with an exponential backoff:
+
+        delay = min(max_delay, base_delay * backoff_factor ** attempt)
+
+    randomized by +/- jitter (fraction of the delay). No retry is started if
+    it would end after deadline sec from the first attempt of the operation.
+
+        policy = SpectrumScaleRetryPolicy(max_retries=5, deadline=120)
+        SpectrumScaleCluster.delete_node(node, retry_policy=policy)
+    """
+    # Messages reported by the mm commands while the cluster configuration
+    # (CCR/mmsdrfs) is locked or being updated by another command. The
+    # command is rejected before it changes anything, so it is safe to
+    # retry even commands that are not idempotent
+    LOCK_TRANSIENT_PATTERNS = [
+        r"configuration is being changed",
+        r"[Uu]nable to obtain the GPFS configuration file lock",
+        r"[Ww]aiting for the GPFS configuration file lock",
+        r"[Ll]ock .* is (currently )?held",
+        r"[Aa]nother .* command is (currently )?running",
+        r"CCR .*(busy|not available|unavailable)",
+    ]
+
+    # Generic messages that may also be reported by a command that failed
+    # part way through. Only retry them for read-only commands
+    DEFAULT_TRANSIENT_PATTERNS = LOCK_TRANSIENT_PATTERNS + [
+        r"[Tt]ry again later",
+        r"[Rr]esource temporarily unavailable",
+    ]
+
+    def __init__(self, max_retries=5, base_delay=2, max_delay=60,
+                 backoff_factor=2, jitter=0.25, deadline=300,
+                 transient_rcs=None, transient_patterns=None):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.backoff_factor = backoff_factor
+        self.jitter = jitter
+        self.deadline = deadline
+        self.transient_rcs = set(transient_rcs or [])
+        if transient_patterns is None:
+            transient_patterns = SpectrumScaleRetryPolicy.DEFAULT_TRANSIENT_PATTERNS
+        self.transient_patterns = [re.compile(pattern)
+                                   for pattern in transient_patterns]
+
+    def is_transient(self, rc, stdout, stderr):
+        if rc == RC_SUCCESS:
+            return False
+        if rc in self.transient_rcs:
+            return True
+        for pattern in self.transient_patterns:
+            if pattern.search(stderr or "") or pattern.search(stdout or ""):
+                return True
+        return False
+
+    def get_delay(self, attempt):
+        delay = min(self.max_delay,
+                    self.base_delay * (self.backoff_factor ** attempt))
+        if self.jitter:
+            delay *= random.uniform(1 - self.jitter, 1 + self.jitter)
+        return max(0, delay)
+
+    def get_retry_delay(self, attempt, elapsed, rc, stdout, stderr):
+        """
+        Decide whether a failed attempt is to be retried.
+        @param attempt (int): number of retries done so far
+        @param elapsed (float): time in sec since the first attempt started
+        @param rc (int): return code of the failed attempt
+        @param stdout (str): standard output of the failed attempt
+        @param stderr (str): standard error of the failed attempt
+        @return: (float|None): sec to wait before the next attempt, None if
+                 the failure is not to be retried
+        """
+        if attempt >= self.max_retries:
+            return None
+        if not self.is_transient(rc, stdout, stderr):
+            return None
+
+        delay = self.get_delay(attempt)
+        if self.deadline is not None and elapsed + delay > self.deadline:
+            return None
+        return delay
+
+
+def _execute_cmd(cmd, timeout, sh, env, logger, log_cmd, attempt):
+    replay_mode = SpectrumScaleReplay.get_mode()
+    if replay_mode == SpectrumScaleReplay.MODE_REPLAY:
+        (sout, serr, ret, t_run) = SpectrumScaleReplay.replay(cmd)
+        logger.debug("runCmd: Command replayed: {0}".format(log_cmd))
+        SpectrumScaleMetrics.record(cmd, t_run, ret, sout, attempt)
+        return (sout, serr, ret)
+
+    t_start = time.time()
+    proc = None
+    try:
+        # create the subprocess, ensuring a new process group is spawned
+        # so we can later kill the process and all its child processes
+        proc = subprocess.Popen(cmd, shell=sh,
+                                stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                close_fds=False, env=env, universal_newlines=True,
+                                start_new_session=True)
+
+        watch = SpectrumScaleWatchdog.watch(proc, log_cmd, timeout)
+
+        (sout, serr) = proc.communicate()
+        SpectrumScaleWatchdog.unwatch(watch)  # stop watching when we got data from process
+
+        ret = proc.poll()
+    except OSError as e:
+        logger.debug(str(e))
+        sout = ""
+        serr = str(e)
+        ret = 127 if "No such file" in serr else 255
+    finally:
+        try:
+            proc.stdout.close()
+            proc.stderr.close()
+        except:  #pylint: disable=bare-except
+            pass
+
+    t_run = time.time() - t_start
+    logger.debug("runCmd: Command executed: {0} Start time: {1} End time: {2} "
+                 "Total time: {3}".format(log_cmd, t_start, 
+                                          time.time(), t_run))
+    SpectrumScaleMetrics.record(cmd, t_run, ret, sout, attempt)
+    if replay_mode == SpectrumScaleReplay.MODE_RECORD:
+        SpectrumScaleReplay.record(cmd, sout, serr, ret, t_run)
+
+    return (sout, serr, ret)
+
+
+def runCmd(cmd, timeout=300, sh=False, env=None, retry=0, retry_policy=None):
+    """
+    Execute an external command, read the output and return it.
+    @param cmd (str|list of str): command to be executed
+    @param timeout (int): timeout in sec, after which the command is forcefully terminated
+    @param sh (bool): True if the command is to be run in a shell and False if directly
+    @param env (dict): environment variables for the new process (instead of inheriting from the current process)
+    @param retry (int): number of retries on command timeout
+    @param retry_policy (SpectrumScaleRetryPolicy): retry policy for transient failures (None: no retries)
+    @return: (stdout, stderr, rc) (str, str, int): the output of the command
+    """
 
-            time.sleep(0.5)
-            if proc.poll() is None:
+    logger = SpectrumScaleLogger.get_logger()
+
+    if isinstance(cmd, str):
+        log_cmd = cmd
+    else:
+        log_cmd = ' '.join(cmd)
+
+    snapshot_out = SpectrumScaleClusterSnapshot.lookup(cmd)
+    if snapshot_out is not None:
+        logger.debug("runCmd: Command served from the cluster snapshot: "
+                     "{0}".format(log_cmd))
+        SpectrumScaleMetrics.record_snapshot_hit(cmd, snapshot_out[0])
+        return (snapshot_out[0], snapshot_out[1], RC_SUCCESS)
+
+    if env is not None:
+        fullenv = dict(os.environ)
+        fullenv.update(env)
+        env = fullenv
+
+    t_op_start = time.time()
+    attempt = 0
+    abrt_retried = False
+    while True:
+        (sout, serr, ret) = _execute_cmd(cmd, timeout, sh, env, logger,
+                                         log_cmd, attempt)
+
+        cmd_timeout = ret in (-signal.SIGTERM, -signal.SIGKILL)  # 143,137
+        delay = None
+        if retry_policy is not None and not cmd_timeout:
+            delay = retry_policy.get_retry_delay(attempt,
+                                                 time.time() - t_op_start,
+                                                 ret, sout, serr)
+
+        if ret == -signal.SIGABRT and not abrt_retried:  # special handling for sigAbrt
+            abrt_retried = True
+            logger.warning("runCmd: retry abrt %s", log_cmd)
+        elif cmd_timeout and retry > 0:
+            retry -= 1
+            logger.warning("runCmd: Retry command %s counter: %s", log_cmd, retry)
+        elif delay is not None:
+            logger.warning("runCmd: %s failed with transient error (ret:%s). "
+                           "Retry %s in %.1f sec", log_cmd, ret, attempt + 1,
+                           delay)
+            time.sleep(delay)
+        else:
+            break
+        attempt += 1
+
+    SpectrumScaleClusterSnapshot.notify(cmd)
+
+    if cmd_timeout:
+        serr = CMD_TIMEDOUT
+        logger.warning("runCmd: %s Timeout:%d ret:%s", cmd, timeout, ret)
+    else:
+        logger.debug("runCmd: %s :(%d) ret:%s \n%s \n%s", cmd, timeout, ret, serr, sout)
+
+    return (sout, serr, ret)
+
+
+async def _astop_process(proc, logger, log_cmd, timeout):
+    try:
+        if proc.returncode is None:
+            logger.info("Command %s timed out after %s sec. Sending SIGTERM", log_cmd, timeout)
+            _signal_process_group(proc, signal.SIGTERM)
+            try:
+                await asyncio.wait_for(proc.wait(),
+                                       SpectrumScaleWatchdog.KILL_GRACE_PERIOD)
+            except asyncio.TimeoutError:
+                pass
+            if proc.returncode is None:
                 logger.info("Command %s timed out after %s sec. Sending SIGKILL", log_cmd, timeout)
-                print(("Command %s timed out after %s sec. Sending SIGKILL", log_cmd, timeout))
-                os.kill(proc.pid, signal.SIGKILL)
+                _signal_process_group(proc, signal.SIGKILL)
+        await proc.wait()
     except Exception as e:
         logger.warning(str(e))
-        print((str(e)))
 
 
-def runCmd(cmd, timeout=300, sh=False, env=None, retry=0):
+async def arun_cmd(cmd, timeout=300, sh=False, env=None, retry=0, _attempt=0):
     """
-    Execute an external command, read the output and return it.
+    Asynchronous counterpart of runCmd(). Execute an external command from
+    within an asyncio event loop, read the output and return it.
     @param cmd (str|list of str): command to be executed
     @param timeout (int): timeout in sec, after which the command is forcefully terminated
     @param sh (bool): True if the command is to be run in a shell and False if directly
     @param env (dict): environment variables for the new process (instead of inheriting from the current process)
     @param retry (int): number of retries on command timeout
+    @param _attempt (int): internal, number of retries done so far (for SpectrumScaleMetrics)
     @return: (stdout, stderr, rc) (str, str, int): the output of the command
     """
 
@@ -149,59 +1238,321 @@ def runCmd(cmd, timeout=300, sh=False, env=None, retry=0):
         log_cmd = ' '.join(cmd)
 
     t_start = time.time()
+    proc = None
     try:
         if env is not None:
             fullenv = dict(os.environ)
             fullenv.update(env)
             env = fullenv
-        # create the subprocess, ensuring a new process group is spawned
-        # so we can later kill the process and all its child processes
-        proc = subprocess.Popen(cmd, shell=sh,
-                                stdout=subprocess.PIPE, stderr=subprocess.PIPE,
-                                close_fds=False, env=env, universal_newlines=True)
-
-        timer = threading.Timer(timeout, _stop_process, [proc, logger, log_cmd, timeout])
-        timer.start()
 
-        (sout, serr) = proc.communicate()
-        timer.cancel()  # stop the timer when we got data from process
+        if sh:
+            proc = await asyncio.create_subprocess_shell(
+                                        log_cmd, env=env,
+                                        start_new_session=True,
+                                        stdout=asyncio.subprocess.PIPE,
+                                        stderr=asyncio.subprocess.PIPE)
+        else:
+            proc = await asyncio.create_subprocess_exec(
+                                        *cmd, env=env,
+                                        start_new_session=True,
+                                        stdout=asyncio.subprocess.PIPE,
+                                        stderr=asyncio.subprocess.PIPE)
 
-        ret = proc.poll()
+        try:
+            (bout, berr) = await asyncio.wait_for(proc.communicate(), timeout)
+        except asyncio.TimeoutError:
+            await _astop_process(proc, logger, log_cmd, timeout)
+            # Drain what is left in the pipes so that the transport is
+            # closed while the event loop is still running
+            try:
+                (bout, berr) = await asyncio.wait_for(proc.communicate(), 1)
+            except asyncio.TimeoutError:
+                (bout, berr) = (b"", b"")
+
+        sout = bout.decode(errors="replace")
+        serr = berr.decode(errors="replace")
+        ret = proc.returncode
     except OSError as e:
         logger.debug(str(e))
         sout = ""
         serr = str(e)
         ret = 127 if "No such file" in serr else 255
-    finally:
-        try:
-            proc.stdout.close()
-            proc.stderr.close()
-        except:  #pylint: disable=bare-except
-            pass
 
     t_run = time.time() - t_start
-    logger.debug("runCmd: Command executed: {0} Start time: {1} End time: {2} "
-                 "Total time: {3}".format(log_cmd, t_start, 
+    logger.debug("arun_cmd: Command executed: {0} Start time: {1} End time: {2} "
+                 "Total time: {3}".format(log_cmd, t_start,
                                           time.time(), t_run))
+    SpectrumScaleMetrics.record(cmd, t_run, ret, sout, _attempt)
+    SpectrumScaleClusterSnapshot.notify(cmd)
 
     cmd_timeout = ret in (-signal.SIGTERM, -signal.SIGKILL)  # 143,137
-    if ret == -6 and retry >= 0 :  # special handling for sigAbrt
-        logger.warning("runCmd: retry abrt %s with subprocess %s", cmd, s32)
-        (sout, serr, ret) = runCmd(cmd, timeout, sh, env, -1)
+    if ret == -signal.SIGABRT and retry >= 0:  # special handling for sigAbrt
+        logger.warning("arun_cmd: retry abrt %s", log_cmd)
+        return await arun_cmd(cmd, timeout, sh, env, -1, _attempt + 1)
 
     if cmd_timeout and retry > 0:
         retry -= 1
-        logger.warning("runCmd: Retry command %s counter: %s", cmd, retry)
-        (sout, serr, ret) = runCmd(cmd, timeout, sh, env, retry)
+        logger.warning("arun_cmd: Retry command %s counter: %s", log_cmd, retry)
+        return await arun_cmd(cmd, timeout, sh, env, retry, _attempt + 1)
     elif cmd_timeout:
         serr = CMD_TIMEDOUT
-        logger.warning("runCmd: %s Timeout:%d ret:%s", cmd, timeout, ret)
+        logger.warning("arun_cmd: %s Timeout:%d ret:%s", log_cmd, timeout, ret)
     else:
-        logger.debug("runCmd: %s :(%d) ret:%s \n%s \n%s", cmd, timeout, ret, serr, sout)
+        logger.debug("arun_cmd: %s :(%d) ret:%s \n%s \n%s", log_cmd, timeout, ret, serr, sout)
 
     return (sout, serr, ret)
 
 
+def run_many(cmds, max_concurrency=8, timeout=300, sh=False, env=None, retry=0):
+    """
+    Execute several external commands concurrently, never running more than
+    max_concurrency of them at the same time.
+    @param cmds (list of str|list of str): commands to be executed
+    @param max_concurrency (int): maximum number of commands in flight
+    @param timeout (int): per command timeout in sec (see runCmd)
+    @param sh (bool): True if the commands are to be run in a shell
+    @param env (dict): environment variables for the new processes
+    @param retry (int): number of retries on command timeout
+    @return: (list of (stdout, stderr, rc)): the output of every command, in
+             the same order as cmds
+    """
+    if not cmds:
+        return []
+
+    async def _run_all():
+        semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+        async def _run_one(cmd):
+            async with semaphore:
+                return await arun_cmd(cmd, timeout, sh, env, retry)
+
+        return await asyncio.gather(*[_run_one(cmd) for cmd in cmds])
+
+    return list(asyncio.run(_run_all()))
+
+
+class SpectrumScaleCmdStream:
+    """
+    Streaming counterpart of runCmd(). Instead of buffering the complete
+    output, the stdout of the command is handed out line by line (without
+    the trailing newline) as it is read from the pipe. stderr is spooled to
+    a temporary file so that it can never block the command.
+
+    The stderr and rc attributes are only valid once the stream has been
+    exhausted (or closed):
+
+        stream = SpectrumScaleCmdStream(cmd)
+        for line in stream:
+            ...
+        if stream.rc != RC_SUCCESS:
+            ... stream.stderr ...
+    """
+
+    def __init__(self, cmd, timeout=300, sh=False, env=None):
+        self.logger = SpectrumScaleLogger.get_logger()
+        self.cmd = cmd
+        self.timeout = timeout
+        self.stderr = ""
+        self.rc = None
+        self.stdout_bytes = 0
+        self.proc = None
+        self.watch = None
+        self.t_start = time.time()
+
+        if isinstance(cmd, str):
+            self.log_cmd = cmd
+        else:
+            self.log_cmd = ' '.join(cmd)
+
+        if env is not None:
+            fullenv = dict(os.environ)
+            fullenv.update(env)
+            env = fullenv
+
+        self.err_file = tempfile.TemporaryFile(mode="w+")
+        try:
+            self.proc = subprocess.Popen(cmd, shell=sh,
+                                         stdout=subprocess.PIPE,
+                                         stderr=self.err_file,
+                                         close_fds=False, env=env,
+                                         universal_newlines=True,
+                                         start_new_session=True)
+        except OSError as e:
+            self.logger.debug(str(e))
+            self.err_file.close()
+            self.stderr = str(e)
+            self.rc = 127 if "No such file" in self.stderr else 255
+            return
+
+        self.watch = SpectrumScaleWatchdog.watch(self.proc, self.log_cmd,
+                                                 timeout)
+
+    def __iter__(self):
+        if self.proc is None:
+            return
+        try:
+            for line in self.proc.stdout:
+                self.stdout_bytes += len(line)
+                yield line.rstrip("\n")
+        finally:
+            self.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """
+        Reap the command. If the caller stopped reading early, the command
+        is terminated instead of being left blocked on a full pipe.
+        """
+        if self.proc is None or self.rc is not None:
+            return
+
+        if self.proc.poll() is None and not self.watch.timed_out:
+            self.logger.debug("SpectrumScaleCmdStream: Output of {0} not "
+                              "consumed, terminating".format(self.log_cmd))
+            _signal_process_group(self.proc, signal.SIGTERM)
+            try:
+                self.proc.wait(SpectrumScaleWatchdog.KILL_GRACE_PERIOD)
+            except subprocess.TimeoutExpired:
+                pass
+            _signal_process_group(self.proc, signal.SIGKILL)
+        self.proc.stdout.close()
+        self.rc = self.proc.wait()
+        SpectrumScaleWatchdog.unwatch(self.watch)
+
+        self.err_file.seek(0)
+        self.stderr = self.err_file.read()
+        self.err_file.close()
+
+        if self.watch.timed_out:
+            self.stderr = CMD_TIMEDOUT
+
+        t_run = time.time() - self.t_start
+        SpectrumScaleMetrics.record(self.cmd, t_run, self.rc,
+                                    self.stdout_bytes, 0)
+        SpectrumScaleClusterSnapshot.notify(self.cmd)
+        self.logger.debug("SpectrumScaleCmdStream: Command executed: {0} "
+                          "Start time: {1} End time: {2} Total time: "
+                          "{3} ret: {4}".format(self.log_cmd, self.t_start,
+                                                time.time(), t_run, self.rc))
+
+
+def _split_batch_output(stdout, stderr, rc, delimiter, num_cmds):
+    results = []
+    pos = 0
+    for idx in range(num_cmds):
+        begin_tag  = "{0}:BEGIN:{1}\n".format(delimiter, idx)
+        stderr_tag = "\n{0}:STDERR:{1}\n".format(delimiter, idx)
+        rc_tag     = "\n{0}:RC:{1}:".format(delimiter, idx)
+
+        begin = stdout.find(begin_tag, pos)
+        err_begin = stdout.find(stderr_tag, begin)
+        rc_begin = stdout.find(rc_tag, err_begin)
+        rc_end = stdout.find("\n", rc_begin + len(rc_tag))
+        if begin < 0 or err_begin < 0 or rc_begin < 0 or rc_end < 0:
+            # The batch did not get this far (e.g. the connection failed
+            # or the batch timed out). Report the error of the batch
+            # itself for this and all following commands
+            results.append(("", stderr or CMD_TIMEDOUT,
+                            rc if rc != RC_SUCCESS else 255))
+            continue
+
+        cmd_out = stdout[begin + len(begin_tag):err_begin]
+        cmd_err = stdout[err_begin + len(stderr_tag):rc_begin]
+        try:
+            cmd_rc = int(stdout[rc_begin + len(rc_tag):rc_end])
+        except ValueError:
+            cmd_rc = 255
+        results.append((cmd_out, cmd_err, cmd_rc))
+        pos = rc_end
+
+    return results
+
+
+def run_cmd_batch(cmds, admin_ip=None, timeout=300, retry=0):
+    """
+    Execute several commands in a single shell invocation (and therefore a
+    single ssh round trip if admin_ip is set). The commands run one after
+    the other. Their stdout, stderr and return code are separated by unique
+    delimiters and split back apart, so each result looks as if the command
+    had been executed through runCmd().
+    @param cmds (list of list of str): commands to be executed, without any ssh prefix
+    @param admin_ip (str): node on which the commands are to be executed
+    @param timeout (int): timeout in sec for the complete batch
+    @param retry (int): number of retries on batch timeout
+    @return: (list of (stdout, stderr, rc)): the output of every command, in
+             the same order as cmds
+    """
+    if not cmds:
+        return []
+
+    token = uuid.uuid4().hex
+    delimiter = "#SCALE-BATCH-{0}".format(token)
+
+    script = ['_err="${{TMPDIR:-/tmp}}/.scale-batch-{0}.$$"'.format(token),
+              'trap \'rm -f "$_err"\' EXIT']
+    for idx, cmd in enumerate(cmds):
+        script.append("printf '%s\\n' '{0}:BEGIN:{1}'".format(delimiter, idx))
+        script.append('{0} 2>"$_err"; _rc=$?'.format(
+                          ' '.join(shlex.quote(arg) for arg in cmd)))
+        script.append("printf '\\n%s\\n' '{0}:STDERR:{1}'".format(delimiter, idx))
+        script.append('cat "$_err"')
+        script.append("printf '\\n%s%s\\n' '{0}:RC:{1}:' \"$_rc\"".format(delimiter, idx))
+    script = '\n'.join(script)
+
+    if admin_ip:
+        # ssh passes the script to the remote login shell
+        cmd = SpectrumScaleSSH.get_command(admin_ip) + [script]
+    else:
+        cmd = ["/bin/sh", "-c", script]
+
+    stdout, stderr, rc = runCmd(cmd, timeout=timeout, sh=False, retry=retry)
+
+    # The shell running the batch hides the commands from runCmd()
+    for batch_cmd in cmds:
+        SpectrumScaleClusterSnapshot.notify(batch_cmd)
+
+    return _split_batch_output(stdout, stderr, rc, delimiter, len(cmds))
+
+
+def get_failed_nodes(node_names, cmd_err):
+    """
+    Attribute the failure of an mm command executed over a -N node list to
+    the nodes named in its error output (e.g. "mmdsh: node1 remote shell
+    process had return code 1." or "node1:  umount: target is busy").
+    A node may be named by its full or its short host name.
+    @param node_names (list of str): nodes passed to the command
+    @param cmd_err (str): error output of the command
+    @return: (dict): first error line naming each failed node, keyed by the
+             name given in node_names
+    """
+    name_index = {}
+    for node_name in node_names:
+        name_index[node_name] = node_name
+    for node_name in node_names:
+        short_name = node_name.split(".")[0]
+        if short_name == node_name or short_name.isdigit():
+            continue
+        if name_index.get(short_name, node_name) != node_name:
+            # The short name is ambiguous, only match the full names
+            name_index[short_name] = None
+        else:
+            name_index[short_name] = node_name
+
+    failed_nodes = {}
+    for line in cmd_err.splitlines():
+        for token in re.split(r"[\s,'\"]+", line):
+            node_name = name_index.get(token.strip(".:;()[]"))
+            if node_name and node_name not in failed_nodes:
+                failed_nodes[node_name] = line.strip()
+
+    return failed_nodes
+
+
 ######################################
 ##                                  ##
 ##        Parse Functions           ##
@@ -212,6 +1563,298 @@ def runCmd(cmd, timeout=300, sh=False, env=None, retry=0):
 # in terms of how the information is organized and therefore should be parsed.
 # Each of these different formats are listed below along with the appropriate 
 # parsing functions
+#
+# Fields containing special characters are "%" escaped in the -Y output and
+# are decoded by the parse functions. With raw=True the fields are returned
+# as they appear in the output instead, and it is up to the caller to
+# decode() the ones it actually reads (e.g. SpectrumScaleDisk getters) or
+# to decode_record() a whole record.
+
+#############################################
+#                                           #
+#             Column Plans                  #
+#                                           #
+#############################################
+#
+# All the parse functions share the same core: each HEADER line is compiled
+# once into a column plan, i.e. the names and indexes of the columns to
+# extract, with the "reserved" and empty columns already dropped. Data lines
+# are then materialized with a single itemgetter call instead of zipping the
+# full header and deleting the unwanted keys for every line.
+#
+#  mmlsnsd:nsd:HEADER:version:reserved:reserved:fileSystem:diskName:...
+#
+# compiles to [("version", 3), ("fileSystem", 6), ("diskName", 7), ...]
+#
+# If the header names a column more than once, the value of the last one is
+# used (as it would be when assigning the columns to a dict one by one).
+#
+class SpectrumScaleColumnPlan:
+    __slots__ = ("names", "indexes", "width", "getter",
+                 "command", "datatype", "record_class")
+
+    IGNORED_COLUMNS = ("", "reserved")
+
+    def __init__(self, header_values, header_index=2):
+        """
+        @param header_values (list of str): HEADER line split on ":"
+        @param header_index (int): index of the "HEADER" field
+        """
+        columns = OrderedDict()
+        self.command = header_values[0]
+        self.datatype = header_values[1]
+        self.record_class = None
+        for idx in range(header_index + 1, len(header_values)):
+            name = header_values[idx]
+            if name in SpectrumScaleColumnPlan.IGNORED_COLUMNS:
+                continue
+            columns[name] = idx
+
+        self.names = tuple(columns.keys())
+        self.indexes = tuple(columns.values())
+        self.width = max(self.indexes) + 1 if self.indexes else 0
+        if len(self.indexes) == 1:
+            index = self.indexes[0]
+            self.getter = lambda values: (values[index],)
+        elif self.indexes:
+            self.getter = itemgetter(*self.indexes)
+        else:
+            self.getter = lambda values: ()
+
+    def materialize(self, values, escaped=True):
+        """
+        Return the record of a data line (split on ":") as an OrderedDict
+        @param escaped (bool): False if the line is known not to contain
+                               any "%" escapes
+        """
+        if len(values) >= self.width:
+            fields = self.getter(values)
+            if escaped:
+                fields = [unquote(field) if "%" in field else field
+                          for field in fields]
+            return OrderedDict(zip(self.names, fields))
+
+        # Truncated line, only the columns present are returned
+        return OrderedDict([(name, decode(values[idx]) if escaped
+                                   else values[idx])
+                            for name, idx in zip(self.names, self.indexes)
+                            if idx < len(values)])
+
+    def materialize_record(self, values, escaped=True):
+        """
+        Return the record of a data line (split on ":") as an instance of
+        the record class of this header (see get_record_class())
+        """
+        if self.record_class is None:
+            self.record_class = get_record_class(self.command, self.datatype,
+                                                 self.names)
+
+        if len(values) >= self.width:
+            # Most columns repeat the same few values (pool names, states,
+            # "Yes"/"No", ...), share a single copy of each of them
+            if escaped:
+                fields = [intern(unquote(field)) if "%" in field
+                          else intern(field)
+                          for field in self.getter(values)]
+            else:
+                fields = map(intern, self.getter(values))
+            return self.record_class(*fields)
+
+        # Truncated line, the missing columns are left unset
+        record = self.record_class.__new__(self.record_class)
+        for name, idx in zip(self.names, self.indexes):
+            if idx < len(values):
+                record[name] = decode(values[idx]) if escaped else values[idx]
+        return record
+
+
+# Column plans are cached across calls, keyed by the HEADER line
+_column_plans = {}
+
+
+def get_column_plan(header_values, header_index=2):
+    plan_key = (tuple(header_values), header_index)
+    plan = _column_plans.get(plan_key)
+    if plan is None:
+        plan = SpectrumScaleColumnPlan(header_values, header_index)
+        _column_plans[plan_key] = plan
+    return plan
+
+
+#############################################
+#                                           #
+#             Record Classes                #
+#                                           #
+#############################################
+#
+# With as_records=True the parse functions return each line as an instance
+# of a __slots__ class built from its HEADER instead of an OrderedDict. The
+# classes are cached by command, datatype and header signature, so all the
+# lines of e.g. mmlsdisk share one class and each record only holds its
+# values (a fraction of the memory of a dict per line).
+#
+# Records support read access as a mapping (record["nsdName"], get(),
+# keys(), items(), "in", ==) as well as attribute access for the columns
+# whose name is a valid identifier (record.nsdName). to_dict() returns the
+# equivalent OrderedDict, e.g. for JSON serialization.
+#
+class SpectrumScaleRecord:
+    __slots__ = ()
+
+    # Column names and the slot that holds each of them
+    fields = ()
+    field_slots = {}
+
+    def __getitem__(self, name):
+        try:
+            return getattr(self, self.field_slots[name])
+        except (KeyError, AttributeError):
+            raise KeyError(name)
+
+    def __setitem__(self, name, value):
+        setattr(self, self.field_slots[name], value)
+
+    def __contains__(self, name):
+        return (name in self.field_slots and
+                hasattr(self, self.field_slots[name]))
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def __eq__(self, other):
+        if isinstance(other, (SpectrumScaleRecord, dict)):
+            return list(self.items()) == list(other.items())
+        return NotImplemented
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        if equal is NotImplemented:
+            return equal
+        return not equal
+
+    __hash__ = None
+
+    def __repr__(self):
+        return "{0}({1})".format(type(self).__name__, ", ".join(
+            ["{0}={1!r}".format(name, value) for name, value in self.items()]))
+
+    def get(self, name, default=None):
+        try:
+            return self[name]
+        except KeyError:
+            return default
+
+    def keys(self):
+        return [name for name in self.fields if name in self]
+
+    def values(self):
+        return [self[name] for name in self.keys()]
+
+    def items(self):
+        return [(name, self[name]) for name in self.keys()]
+
+    def to_dict(self):
+        return OrderedDict(self.items())
+
+
+def records_to_dicts(data):
+    """
+    Return a copy of data (e.g. the result of a parse function called with
+    as_records=True) with the records converted to OrderedDicts
+    """
+    if isinstance(data, SpectrumScaleRecord):
+        return data.to_dict()
+    if isinstance(data, list):
+        return [records_to_dicts(item) for item in data]
+    if isinstance(data, dict):
+        return OrderedDict([(key, records_to_dicts(value))
+                            for key, value in data.items()])
+    return data
+
+
+def _get_slot_name(name, used):
+    slot = re.sub(r"\W", "_", name)
+    if not slot or slot[0].isdigit() or slot in used or \
+       hasattr(SpectrumScaleRecord, slot):
+        slot = "f{0}_{1}".format(len(used), slot)
+    return slot
+
+
+# Record classes, keyed by (command, datatype, column names)
+_record_classes = {}
+
+
+def get_record_class(command, datatype, names):
+    """
+    Return the record class for the given -Y header signature
+    @param command (str): e.g. "mmlsdisk"
+    @param datatype (str): e.g. "nsd", "" if the command has none
+    @param names (tuple of str): column names (see SpectrumScaleColumnPlan)
+    """
+    class_key = (command, datatype, tuple(names))
+    record_class = _record_classes.get(class_key)
+    if record_class is not None:
+        return record_class
+
+    field_slots = OrderedDict()
+    for name in names:
+        field_slots[name] = _get_slot_name(name, field_slots.values())
+    slots = tuple(field_slots.values())
+
+    # The slot names only contain word characters (see _get_slot_name)
+    args = ", ".join(slots)
+    body = "".join(["    self.{0} = {0}\n".format(slot) for slot in slots])
+    namespace = {}
+    exec("def __init__(self, {0}):\n{1}    pass\n".format(args, body),
+         namespace)
+
+    class_name = "{0}{1}Record".format(
+        re.sub(r"\W", "", command).capitalize(),
+        re.sub(r"\W", "", datatype).capitalize())
+    record_class = type(class_name, (SpectrumScaleRecord,),
+                        {"__slots__": slots,
+                         "__init__": namespace["__init__"],
+                         "fields": tuple(names),
+                         "field_slots": dict(field_slots)})
+    _record_classes[class_key] = record_class
+    return record_class
+
+
+def _iter_data_lines(cmd_raw_out, datatype="", header_index=2,
+                     sticky_datatype=False):
+    """
+    Split the lines of "mm" -Y output and yield (datatype, column plan,
+    values, escaped) for every data line, escaped being False if the line
+    does not contain any "%" escapes. The datatype is taken from each line unless
+    set; with sticky_datatype the one of the first line is used throughout.
+    """
+    plans = {}
+
+    if isinstance(cmd_raw_out, str):
+        lines = cmd_raw_out.splitlines()
+    else:
+        lines = cmd_raw_out
+
+    for line in lines:
+        values = line.split(":")
+        if len(values) < 3:
+            continue
+
+        line_datatype = datatype or values[1] or values[0]
+        if sticky_datatype:
+            datatype = line_datatype
+        if line_datatype == "":
+            continue
+
+        if values[header_index] == 'HEADER':
+            plans[line_datatype] = get_column_plan(values, header_index)
+            continue
+
+        yield line_datatype, plans[line_datatype], values, "%" in line
+
 
 #############################################
 #                                           #
@@ -327,53 +1970,22 @@ def runCmd(cmd, timeout=300, sh=False, env=None, retry=0):
 #}
 #
 # TODO: Change function name to something more appropriate
-def parse_aggregate_cmd_output(cmd_raw_out, summary_records, header_index=2):
+def parse_aggregate_cmd_output(cmd_raw_out, summary_records, header_index=2,
+                               raw=False, as_records=False):
     data_out = OrderedDict()
-    headers = OrderedDict()
-
-    if isinstance(cmd_raw_out, str):
-        lines = cmd_raw_out.splitlines()
-    else:
-        lines = cmd_raw_out
-
-    for line in lines:
-        values = line.split(":")
-        if len(values) < 3:
-            continue
-
-        command = values[0]
-        datatype = values[1] or values[0]
-        if datatype == "":
-            continue
-
-        if values[header_index] == 'HEADER':
-            headers[datatype] = values
-            continue
-
-        columnNames = headers[datatype]
-
-        json_object = OrderedDict()
-        for key, value in zip(columnNames[header_index+1:], 
-                              values[header_index+1:]):
-            json_object[key] =  decode(value)
-
-        if "" in json_object:
-            del json_object[""]
-        if 'reserved' in json_object:
-            del json_object['reserved']
 
+    records = parse_records_iter(cmd_raw_out, "", header_index, raw,
+                                 as_records)
+    for datatype, json_object in records:
         # Summary records should only exist once
         if datatype in summary_records:
-            json_d_type = "object"
             data_out[datatype] = json_object
         else:
-            json_d_type = "array"
-            json_array = []
-            if datatype in list(data_out.keys()):
-                # An element in the array already exists
-                json_array = data_out[datatype]
+            json_array = data_out.get(datatype)
+            if json_array is None:
+                json_array = []
+                data_out[datatype] = json_array
             json_array.append(json_object)
-            data_out[datatype] = json_array
 
     return data_out
 
@@ -476,71 +2088,33 @@ def parse_aggregate_cmd_output(cmd_raw_out, summary_records, header_index=2):
 def parse_simple_cmd_output(cmd_raw_out, cmd_key, cmd_prop_name, 
                             datatype="", header_index=2):
     data_out = OrderedDict()
-    headers = OrderedDict()
-
-    if isinstance(cmd_raw_out, str):
-        lines = cmd_raw_out.splitlines()
-    else:
-        lines = cmd_raw_out
-
-    for line in lines:
-        values = line.split(":")
-        if len(values) < 3:
-            continue
-
-        command = values[0]
 
-        if not datatype:
-            datatype = values[1] or values[0]
-        if datatype == "":
-            continue
-
-        if values[header_index] == 'HEADER':
-            headers[datatype] = values
-            continue
+    # Index of the property lists of every instance, by datatype and
+    # instance key
+    instances = {}
 
-        columnNames = headers[datatype]
+    records = parse_records_iter(cmd_raw_out, datatype, header_index,
+                                 single_datatype=True)
+    for datatype, json_object in records:
+        instance_key = json_object.pop(cmd_key, "")
 
-        json_object = OrderedDict()
-        instance_key = ""
-        for key, value in zip(columnNames[header_index+1:], 
-                              values[header_index+1:]):
-            if cmd_key in key:
-                instance_key = value
-            else:
-                json_object[key] =  decode(value)
-
-        if "" in json_object:
-            del json_object[""]
-        if 'reserved' in json_object:
-            del json_object['reserved']
-
-        json_array = []
-        obj_found = False
-        if datatype in list(data_out.keys()):
-            # List of OrederDict
-            json_array = data_out[datatype]
-            prop_list = []
-            # Each obj is an OrderDict
-            for obj in json_array:
-                key_val = obj[cmd_key]
-                if instance_key in key_val:
-                    # We found the obj to which this record should be added
-                    prop_list = obj[cmd_prop_name]
-                    prop_list.append(json_object)
-                    obj[cmd_prop_name] = prop_list
-                    obj_found = True
-                    break
+        datatype_instances = instances.get(datatype)
+        if datatype_instances is None:
+            datatype_instances = {}
+            instances[datatype] = datatype_instances
+            data_out[datatype] = []
 
-        if not obj_found:
+        prop_list = datatype_instances.get(instance_key)
+        if prop_list is None:
+            # First record of this instance
             prop_list = []
-            prop_list.append(json_object)
+            datatype_instances[instance_key] = prop_list
             device_dict = OrderedDict()
             device_dict[cmd_key] = instance_key
             device_dict[cmd_prop_name] = prop_list
-            json_array.append(device_dict)
-            
-        data_out[datatype] = json_array
+            data_out[datatype].append(device_dict)
+
+        prop_list.append(json_object)
 
     return data_out
 
@@ -595,52 +2169,255 @@ def parse_simple_cmd_output(cmd_raw_out, cmd_key, cmd_prop_name,
 #  }
 #
 # TODO: Change function name to something more appropriate
-def parse_unique_records(cmd_raw_out, datatype="", header_index=2):
+def parse_unique_records(cmd_raw_out, datatype="", header_index=2, raw=False,
+                         as_records=False):
     data_out = OrderedDict()
-    headers = OrderedDict()
 
-    if isinstance(cmd_raw_out, str):
-        lines = cmd_raw_out.splitlines()
-    else:
-        lines = cmd_raw_out
+    records = parse_records_iter(cmd_raw_out, datatype, header_index, raw,
+                                 as_records, single_datatype=True)
+    for datatype, json_object in records:
+        json_array = data_out.get(datatype)
+        if json_array is None:
+            json_array = []
+            data_out[datatype] = json_array
+        json_array.append(json_object)
 
-    for line in lines:
-        values = line.split(":")
-        if len(values) < 3:
-            continue
+    return data_out
 
-        command = values[0]
 
-        if not datatype:
-            datatype = values[1] or values[0]
-        if datatype == "":
-            continue
+#############################################
+#                                           #
+#           Incremental Parsing             #
+#                                           #
+#############################################
+#
+# parse_records_iter() accepts the same input as the parse functions above
+# (raw output or any iterable of lines, e.g. a SpectrumScaleCmdStream) but
+# instead of accumulating the whole result it yields one (datatype, record)
+# pair per data line. Only the HEADER lines are retained, so the memory
+# required is independent of the size of the command output. The parse
+# functions above are built on it.
+#
+#  for datatype, record in parse_records_iter(SpectrumScaleCmdStream(cmd)):
+#      ...
+#
+# Filters are applied to the split line, before the record is built, so
+# lines that do not match cost little more than the split:
+#
+#  parse_records_iter(stdout, filters={"remarks": "server node",
+#                                      "serverList": lambda servers:
+#                                          node in servers.split(",")})
+#
+def parse_records_iter(cmd_raw_out, datatype="", header_index=2, raw=False,
+                       as_records=False, filters=None, single_datatype=False):
+    """
+    @param datatype (str): datatype reported for all the records (by default
+                           the one of each line)
+    @param raw (bool): do not decode the fields (see decode())
+    @param as_records (bool): yield records instead of OrderedDicts (see
+                              get_record_class())
+    @param filters (dict): only yield the lines whose column (key) matches
+                           the value, or for which the value called with the
+                           (decoded) column returns True. Lines are filtered
+                           before being materialized
+    @param single_datatype (bool): report all the records under the
+                                   datatype of the first line
+    """
+    filter_plan = None
+    checks = None
+
+    data_lines = _iter_data_lines(cmd_raw_out, datatype, header_index,
+                                  single_datatype)
+    for line_datatype, plan, values, escaped in data_lines:
+        if filters:
+            if plan is not filter_plan:
+                filter_plan = plan
+                checks = _compile_filters(plan, filters)
+            if checks is None:
+                # A filtered column is not part of this header
+                continue
+            matched = True
+            for idx, check in checks:
+                if idx >= len(values) or not check(decode(values[idx])):
+                    matched = False
+                    break
+            if not matched:
+                continue
 
-        if values[header_index] == 'HEADER':
-            headers[datatype] = values
-            continue
+        if as_records:
+            yield line_datatype, plan.materialize_record(values,
+                                                         escaped and not raw)
+        else:
+            yield line_datatype, plan.materialize(values, escaped and not raw)
 
-        columnNames = headers[datatype]
 
-        json_object = OrderedDict()
-        for key, value in zip(columnNames[header_index+1:], 
-                              values[header_index+1:]):
-            json_object[key] =  decode(value)
+def _compile_filters(plan, filters):
+    plan_indexes = dict(zip(plan.names, plan.indexes))
+    checks = []
+    for name, expected in filters.items():
+        if name not in plan_indexes:
+            return None
+        if callable(expected):
+            checks.append((plan_indexes[name], expected))
+        else:
+            checks.append((plan_indexes[name],
+                           lambda value, expected=expected: value == expected))
+    return checks
 
-        if "" in json_object:
-            del json_object[""]
-        if 'reserved' in json_object:
-            del json_object['reserved']
 
-        json_array = []
-        if datatype in list(data_out.keys()):
-            # List of OrederDict
-            json_array = data_out[datatype]
-        json_array.append(json_object)
-            
-        data_out[datatype] = json_array
+#############################################
+#                                           #
+#            Columnar Parsing               #
+#                                           #
+#############################################
+#
+# parse_columnar() keeps only the requested columns of one datatype, one
+# typed array per column instead of one dict per line. Integer columns are
+# stored in an array("q") (or a NumPy int64 array when NumPy is installed)
+# so that totals per storage pool, failure group, server etc. are computed
+# as reductions over the columns.
+#
+#  df = parse_columnar(stdout, "nsd", ["nsdName", "storagePool"],
+#                      ["diskSize", "freeBlocks"])
+#  df.group_sum("freeBlocks", "storagePool")  -> {"system": ..., "data": ...}
+#
+class SpectrumScaleColumns:
+    def __init__(self, str_columns, int_columns):
+        self.columns = OrderedDict()
+        for name in str_columns:
+            self.columns[name] = []
+        for name in int_columns:
+            self.columns[name] = array("q")
+        self.int_columns = tuple(int_columns)
+        self.num_rows = 0
+        self.finalized = False
+
+    def __len__(self):
+        return self.num_rows
+
+    def finalize(self):
+        # Expose the integer columns as NumPy arrays (without copying)
+        if HAS_NUMPY and not self.finalized:
+            for name in self.int_columns:
+                self.columns[name] = numpy.frombuffer(self.columns[name],
+                                                      dtype=numpy.int64)
+        self.finalized = True
+        return self
+
+    def get_column(self, name):
+        return self.columns[name]
+
+    def get_row(self, row):
+        return OrderedDict([(name, column[row])
+                            for name, column in self.columns.items()])
+
+    def select(self, name, values):
+        """
+        Return the indexes of the rows whose column name is one of values
+        """
+        values = set(values)
+        return [row for row, value in enumerate(self.columns[name])
+                if value in values]
+
+    def complement(self, rows):
+        """
+        Return the indexes of the rows that are not in rows
+        """
+        rows = set(rows)
+        return [row for row in range(self.num_rows) if row not in rows]
+
+    def sum(self, name, rows=None):
+        column = self.columns[name]
+        if rows is None:
+            return int(column.sum()) if HAS_NUMPY else sum(column)
+        if HAS_NUMPY:
+            return int(column[numpy.asarray(rows, dtype=numpy.intp)].sum())
+        return sum([column[row] for row in rows])
+
+    def group_sum(self, name, by, rows=None):
+        """
+        Return an OrderedDict of the sum of column name for each value of
+        column by (in first-seen order)
+        @param rows (list of int): restrict the sums to these rows
+        """
+        keys = self.columns[by]
+        column = self.columns[name]
+        if rows is None:
+            rows = range(self.num_rows)
+
+        codes = OrderedDict()
+        row_codes = [codes.setdefault(keys[row], len(codes)) for row in rows]
+        if HAS_NUMPY:
+            totals = numpy.zeros(len(codes), dtype=numpy.int64)
+            numpy.add.at(totals, numpy.asarray(row_codes, dtype=numpy.intp),
+                         column[numpy.asarray(list(rows), dtype=numpy.intp)])
+            totals = [int(total) for total in totals]
+        else:
+            totals = [0] * len(codes)
+            for row, code in zip(rows, row_codes):
+                totals[code] += column[row]
 
-    return data_out
+        return OrderedDict(zip(codes.keys(), totals))
+
+
+def parse_columnar(cmd_raw_out, datatype, str_columns, int_columns=(),
+                   header_index=2):
+    """
+    Parse the records of one datatype of "mm" -Y output into columns.
+    @param datatype (str): e.g. "nsd" for mmdf, "mmlsdisk" for mmlsdisk
+    @param str_columns (list of str): columns returned as (decoded) str
+    @param int_columns (list of str): columns returned as int (empty
+                                      fields are 0)
+    @return: (SpectrumScaleColumns)
+    @raise SpectrumScaleException: if a column is not part of the HEADER
+                                   or an int column holds another value
+    """
+    table = SpectrumScaleColumns(str_columns, int_columns)
+    plan_columns = None
+    plan = None
+
+    data_lines = _iter_data_lines(cmd_raw_out, "", header_index)
+    for line_datatype, line_plan, values, escaped in data_lines:
+        if line_datatype != datatype:
+            continue
+
+        if line_plan is not plan:
+            plan = line_plan
+            plan_indexes = dict(zip(plan.names, plan.indexes))
+            missing = [name for name in list(str_columns) + list(int_columns)
+                       if name not in plan_indexes]
+            if missing:
+                raise SpectrumScaleException(
+                          "Column(s) {0} not reported by {1} ({2} "
+                          "HEADER)".format(", ".join(missing), plan.command,
+                                           datatype),
+                          plan.command, [], -1, "", "")
+            plan_columns = [(table.columns[name], plan_indexes[name])
+                            for name in str_columns]
+            plan_int_columns = [(name, table.columns[name], plan_indexes[name])
+                                for name in int_columns]
+            width = max([idx for column, idx in plan_columns] +
+                        [idx for name, column, idx in plan_int_columns],
+                        default=-1) + 1
+
+        if len(values) < width:
+            # Truncated line, the missing columns are left empty
+            values = values + [""] * (width - len(values))
+
+        for column, idx in plan_columns:
+            column.append(decode(values[idx]))
+        for name, column, idx in plan_int_columns:
+            value = values[idx]
+            try:
+                column.append(int(value) if value else 0)
+            except ValueError:
+                raise SpectrumScaleException(
+                          "Column {0} of {1} is not an integer: "
+                          "{2}".format(name, plan.command, value),
+                          plan.command, [], -1, "", "")
+        table.num_rows += 1
+
+    return table.finalize()
 
 
 ###############################################################################
@@ -24,13 +24,14 @@ import time
 
 try:
     from ansible.module_utils.ibm_spectrumscale_utils import runCmd, \
-            GPFS_CMD_PATH, RC_SUCCESS, SpectrumScaleException
+            GPFS_CMD_PATH, RC_SUCCESS, SpectrumScaleException, SpectrumScaleSSH
 except:
     from ibm_spectrumscale_utils import runCmd, GPFS_CMD_PATH, \
-            RC_SUCCESS, SpectrumScaleException
+            RC_SUCCESS, SpectrumScaleException, \
+            SpectrumScaleSSH
 
 
-def get_zimon_collectors():
+def get_zimon_collectors(admin_ip=None):
     """
         This function returns zimon collector node ip's.
     """
@@ -40,7 +41,7 @@ def get_zimon_collectors():
     cmd = []
     mmcmd_idx = 1
     if admin_ip:
-        cmd.extend(["ssh", admin_ip])
+        cmd.extend(SpectrumScaleSSH.get_command(admin_ip))
         mmcmd_idx = len(cmd) + 1
 
     cmd.extend([os.path.join(GPFS_CMD_PATH, "mmperfmon"), "config", "show"])
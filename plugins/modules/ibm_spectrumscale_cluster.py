@@ -98,6 +98,15 @@ results:
     description: The JSON document containing the cluster information
     type: str
     returned: when supported
+
+perf:
+    description: Latency statistics of the IBM Spectrum Scale mm commands
+                 executed by the module (count, failures, retries, min/max/mean
+                 and total wall time, stdout size and a latency histogram)
+                 and the number of requests served from the cluster snapshot
+                 instead (snapshot_hits), keyed by mm command name
+    type: dict
+    returned: always
 '''
 
 import os
@@ -107,9 +116,11 @@ import traceback
 from ansible.module_utils.basic import AnsibleModule
 
 try: 
-    from ansible.module_utils.ibm_spectrumscale_utils import RC_SUCCESS, SpectrumScaleLogger
+    from ansible.module_utils.ibm_spectrumscale_utils import RC_SUCCESS, SpectrumScaleLogger, \
+                                                            SpectrumScaleSSH, SpectrumScaleMetrics
 except:
-    from ibm_spectrumscale_utils import RC_SUCCESS, SpectrumScaleLogger
+    from ibm_spectrumscale_utils import RC_SUCCESS, SpectrumScaleLogger, SpectrumScaleSSH, \
+                                        SpectrumScaleMetrics
 
 try: 
     from ansible.module_utils.ibm_spectrumscale_cluster_utils import SpectrumScaleCluster
@@ -177,7 +188,8 @@ def main():
         except Exception as e:
             st = traceback.format_exc()
             e_msg = ("Exception: {0}  StackTrace: {1}".format(str(e), st))
-            module.fail_json(msg=e_msg)
+            module.fail_json(msg=e_msg,
+                             perf=SpectrumScaleMetrics.get_summary())
     elif module.params['state']:
         if "present" in module.params['state']:
             # Create a new IBM Spectrum Scale cluster
@@ -192,7 +204,8 @@ def main():
             except Exception as e:
                 st = traceback.format_exc()
                 e_msg = ("Exception: {0}  StackTrace: {1}".format(str(e), st))
-                module.fail_json(msg=e_msg)
+                module.fail_json(msg=e_msg,
+                                 perf=SpectrumScaleMetrics.get_summary())
         else:
             # Delete the existing IBM Spectrum Scale cluster
             try:
@@ -205,7 +218,8 @@ def main():
             except Exception as e:
                 st = traceback.format_exc()
                 e_msg = ("Exception: {0}  StackTrace: {1}".format(str(e), st))
-                module.fail_json(msg=e_msg)
+                module.fail_json(msg=e_msg,
+                                 perf=SpectrumScaleMetrics.get_summary())
 
 
         if rc == RC_SUCCESS:
@@ -215,10 +229,12 @@ def main():
     logger.debug("Function Exit: ibm_spectrumscale_cluster.main()")
     logger.debug("------------------------------------")
 
+    SpectrumScaleSSH.shutdown()
     SpectrumScaleLogger.shutdown()
 
     # Module is done. Return back the result
-    module.exit_json(changed=state_changed, msg=msg, rc=rc, result=result_json)
+    module.exit_json(changed=state_changed, msg=msg, rc=rc, result=result_json,
+                     perf=SpectrumScaleMetrics.get_summary())
 
 
 if __name__ == '__main__':
@@ -122,6 +122,15 @@ results:
     description: The JSON document containing the filesystem information
     type: str
     returned: when supported
+
+perf:
+    description: Latency statistics of the IBM Spectrum Scale mm commands
+                 executed by the module (count, failures, retries, min/max/mean
+                 and total wall time, stdout size and a latency histogram)
+                 and the number of requests served from the cluster snapshot
+                 instead (snapshot_hits), keyed by mm command name
+    type: dict
+    returned: always
 '''
 
 import json
@@ -130,9 +139,11 @@ import traceback
 from ansible.module_utils.basic import AnsibleModule
 
 try: 
-    from ansible.module_utils.ibm_spectrumscale_utils import RC_SUCCESS, SpectrumScaleLogger
+    from ansible.module_utils.ibm_spectrumscale_utils import RC_SUCCESS, SpectrumScaleLogger, \
+                                                            SpectrumScaleSSH, SpectrumScaleMetrics
 except:
-    from ibm_spectrumscale_utils import RC_SUCCESS, SpectrumScaleLogger
+    from ibm_spectrumscale_utils import RC_SUCCESS, SpectrumScaleLogger, SpectrumScaleSSH, \
+                                        SpectrumScaleMetrics
 
 try:
     from ansible.module_utils.ibm_spectrumscale_filesystem_utils import SpectrumScaleFS
@@ -241,7 +252,8 @@ def main():
         except Exception as e:
             st = traceback.format_exc()
             e_msg = ("Exception: {0}  StackTrace: {1}".format(str(e), st))
-            module.fail_json(msg=e_msg)
+            module.fail_json(msg=e_msg,
+                             perf=SpectrumScaleMetrics.get_summary())
     elif module.params['state']:
         if "present" in module.params['state']:
             # Create a new IBM Spectrum Scale cluster
@@ -260,7 +272,8 @@ def main():
             except Exception as e:
                 st = traceback.format_exc()
                 e_msg = ("Exception: {0}  StackTrace: {1}".format(str(e), st))
-                module.fail_json(msg=e_msg)
+                module.fail_json(msg=e_msg,
+                                 perf=SpectrumScaleMetrics.get_summary())
         else:
             # Delete the existing IBM Spectrum Scale cluster
             try:
@@ -271,7 +284,8 @@ def main():
             except Exception as e:
                 st = traceback.format_exc()
                 e_msg = ("Exception: {0}  StackTrace: {1}".format(str(e), st))
-                module.fail_json(msg=e_msg)
+                module.fail_json(msg=e_msg,
+                                 perf=SpectrumScaleMetrics.get_summary())
 
         if rc == RC_SUCCESS:
             state_changed = True
@@ -280,10 +294,12 @@ def main():
     logger.debug("Function Exit: ibm_spectrumscale_filesystem.main()")
     logger.debug("---------------------------------------")
 
+    SpectrumScaleSSH.shutdown()
     logger = SpectrumScaleLogger.shutdown()
 
     # Module is done. Return back the result
-    module.exit_json(changed=state_changed, msg=msg, rc=rc, result=result_json)
+    module.exit_json(changed=state_changed, msg=msg, rc=rc, result=result_json,
+                     perf=SpectrumScaleMetrics.get_summary())
 
 
 if __name__ == '__main__':
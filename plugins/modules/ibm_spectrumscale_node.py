@@ -55,6 +55,13 @@ options:
             - The name of the Node to be added, removed or whose 
               information is to be retrieved
         required: false
+    batch_size:
+        description:
+            - Maximum number of nodes passed to a single IBM Spectrum Scale
+              command when nodes are added, started, stopped or removed
+              in bulk
+        required: false
+        default: 100
 
 '''
 
@@ -98,6 +105,15 @@ results:
     description: The JSON document containing the cluster information
     type: str
     returned: when supported
+
+perf:
+    description: Latency statistics of the IBM Spectrum Scale mm commands
+                 executed by the module (count, failures, retries, min/max/mean
+                 and total wall time, stdout size and a latency histogram)
+                 and the number of requests served from the cluster snapshot
+                 instead (snapshot_hits), keyed by mm command name
+    type: dict
+    returned: always
 '''
 
 import os
@@ -113,11 +129,19 @@ try:
     from ansible.module_utils.ibm_spectrumscale_utils import runCmd, RC_SUCCESS, \
                                                   parse_aggregate_cmd_output, \
                                                   SpectrumScaleLogger, \
-                                                  SpectrumScaleException
+                                                  SpectrumScaleException, \
+                                                  SpectrumScaleSSH, \
+                                                  SpectrumScaleMetrics, \
+                                                  SpectrumScaleRetryPolicy, \
+                                                  SpectrumScaleClusterSnapshot, \
+                                                  get_failed_nodes
 except Exception as e:
     print(e)
     from ibm_spectrumscale_utils import runCmd, RC_SUCCESS, parse_aggregate_cmd_output, \
-                             SpectrumScaleLogger, SpectrumScaleException
+                             SpectrumScaleLogger, SpectrumScaleException, \
+                             SpectrumScaleSSH, SpectrumScaleMetrics, \
+                             SpectrumScaleRetryPolicy, SpectrumScaleClusterSnapshot, \
+                             get_failed_nodes
 
 try:
     from ansible.module_utils.ibm_spectrumscale_disk_utils import SpectrumScaleDisk
@@ -151,79 +175,90 @@ try:
 except:
     from ibm_spectrumscale_zimon_utils import get_zimon_collectors
 
+# Retry policy applied to the mm commands that modify the cluster. These
+# commands fail while the cluster configuration is locked by another mm
+# command (e.g. a busy CCR); retry them with a backoff instead of failing.
+# mmdeldisk, mmaddnode and mmdelnode are not idempotent, so only the lock
+# messages (reported before anything was changed) are treated as transient
+RETRY_POLICY = SpectrumScaleRetryPolicy(
+    transient_patterns=SpectrumScaleRetryPolicy.LOCK_TRANSIENT_PATTERNS)
+
+# Number of nodes passed in a single -N list to the mm commands when nodes
+# are added, started, stopped or removed in bulk
+DEFAULT_BATCH_SIZE = 100
+
 ###############################################################################
 ##                                                                           ##
 ##                           Helper Functions                                ##
 ##                                                                           ##
 ###############################################################################
 
-def get_all_nsds_of_node(logger, instance):
+def gpfs_df_disk(logger, fs_name, disks_to_delete):
     """
-        This function performs "mmlsnsd -X -Y".
-        Args:
-            instance (str): instance for which disks are use by filesystem.
-            region (str): Region of operation
-        Returns:
-           all_disk_names (list): Disk names in list format.
-                                  Ex: [nsd_1a_1_0, nsd_1c_1_0, nsd_1c_d_1]
-    """
-    logger.debug("Function Entry: get_all_nsds_of_node. "
-                 "Args: instance={0}".format(instance))
-    nsd_list = []
-    nsd_list = SpectrumScaleNSD.get_all_nsd_info()
-
-    all_nsd_names = []
-    for nsd in nsd_list:
-        if nsd.get_remarks() == 'server node' and instance in nsd.get_server_list():
-            all_nsd_names.append(nsd.get_name())
-
-    logger.debug("Function Exit: get_all_nsds_of_node(). "
-                 "Return Params: all_nsd_names={0} ".format(all_nsd_names))
-
-    return all_nsd_names
-
-
-def gpfs_df_disk(logger, fs_name):
-    """
-        This function performs "mmdf" to obtain disk capacities.
+        This function performs "mmdf" to obtain, for each storage pool of
+        the given disks, the capacity left to the pool if they are deleted.
+        mmdeldisk restripes the data of a disk within its storage pool.
         Args:
             fs_name (str): Filesystem name associated with the disks.
+            disks_to_delete (list): Disk names to be deleted.
         Returns:
-            disk_size_map (dict): Disk name vs. free block size vs. percent
-                                  free blocks.
-                                  Ex: {
-                                        'nsd_1a_1_0': {'free_size': 10485760,
-                                                       'used_size': 480256,
-                                                       'percent': 95},
-                                        'nsd_1c_1_0': {'free_size': 10485760,
-                                                       'used_size': 480256,
-                                                       'percent': 95}
-                                      }
+            capacity (dict): Used size (KB) of the disks to be deleted, free
+                             size (KB) and number of the other disks, per
+                             storage pool of the disks to be deleted.
+                             Ex: {
+                                   'system': {
+                                     'used_size': 480256,
+                                     'free_size': 20971520,
+                                     'other_disks': 2
+                                   }
+                                 }
     """
     logger.debug("Function Entry: gpfs_df_disk(). "
-                 "Args: fs_name={0}".format(fs_name))
-
-    nsd_df_list = SpectrumScaleDf.get_df_info(fs_name)
-    disk_size_map = {}
-    for nsd_df in nsd_df_list:
-        total = nsd_df.get_disk_size()
-        free  = nsd_df.get_free_blocks()
-        used  = total - free
-        free_block_pct = nsd_df.get_free_blocks_pct()
-        disk  = nsd_df.get_nsd_name()
-        disk_size_map[disk] = {
-                                  'free_size': free, 
-                                  'used_size': used,
-                                  'percent': free_block_pct
-                              }
-
+                 "Args: fs_name={0} disks_to_delete="
+                 "{1}".format(fs_name, disks_to_delete))
+
+    df = SpectrumScaleDf.get_df_columns(fs_name)
+
+    rows_to_delete = df.select("nsdName", disks_to_delete)
+    other_rows = df.complement(rows_to_delete)
+
+    size_to_delete = df.group_sum("diskSize", "storagePool", rows_to_delete)
+    free_to_delete = df.group_sum("freeBlocks", "storagePool", rows_to_delete)
+    free_other = df.group_sum("freeBlocks", "storagePool", other_rows)
+
+    pools = df.get_column("storagePool")
+    other_disks = {}
+    for row in other_rows:
+        other_disks[pools[row]] = other_disks.get(pools[row], 0) + 1
+
+    capacity = {}
+    for pool in size_to_delete:
+        capacity[pool] = {
+                             'used_size': (size_to_delete[pool] -
+                                           free_to_delete[pool]),
+                             'free_size': free_other.get(pool, 0),
+                             'other_disks': other_disks.get(pool, 0)
+                         }
+
+    logger.debug("Free size per failure group of the other disks: "
+                 "{0}".format(dict(df.group_sum("freeBlocks", "failureGroup",
+                                                other_rows))))
     logger.debug("Function Exit: gpfs_df_disk(). "
-                 "Return Params: disk_size_map={0} ".format(disk_size_map))
+                 "Return Params: capacity={0} ".format(capacity))
 
-    return disk_size_map
+    return capacity
 
 
 def get_node_nsd_info(logger):
+    """
+        This function performs "mmlsnsd -X -Y" once and indexes the NSD
+        servers in both directions.
+        Returns:
+           node_nsd_map (dict): NSD names served by each node.
+                                Ex: {'node1': ['nsd_1', 'nsd_2']}
+           nsd_node_map (dict): Server names of each NSD.
+                                Ex: {'nsd_1': ['node1', 'node2']}
+    """
     logger.debug("Function Entry: get_node_nsd_info().")
 
     nsd_list = SpectrumScaleNSD.get_all_nsd_info()
@@ -233,21 +268,15 @@ def get_node_nsd_info(logger):
 
     for nsd in nsd_list:
         if  nsd.get_remarks() == 'server node':
+            nsd_name = nsd.get_name()
+            server_list = nsd.get_server_list()
+
             # Populate the node_nsd_map data structure
-            nsd_list = []
-            for node_name in nsd.get_server_list():
-                if node_name in list(node_nsd_map.keys()):
-                    nsd_list = node_nsd_map[node_name]
-                nsd_list.append(nsd.get_name())
-                node_nsd_map[node_name] = nsd_list
-            
+            for node_name in server_list:
+                node_nsd_map.setdefault(node_name, []).append(nsd_name)
+
             # Populate the nsd_node_map data structure
-            host_list = []
-            if nsd.get_name() in list(nsd_node_map.keys()):
-                host_list = nsd_node_map[nsd.get_name()]
-            for server in nsd.get_server_list():
-                host_list.append(server)
-            nsd_node_map[nsd.get_name()] = host_list 
+            nsd_node_map.setdefault(nsd_name, []).extend(server_list)
 
     logger.debug("Function Exit: get_node_nsd_info(). "
                  "Return Params: node_nsd_map={0} "
@@ -327,14 +356,11 @@ def check_nodes_exist(logger, nodes_to_be_deleted):
                  "Args: nodes_to_be_deleted={0}".format(nodes_to_be_deleted))
 
     logger.info("Checking if node(s) marked for removal exist in the cluster")
-    filtered_nodes_to_be_deleted = []
-    existing_node_list = SpectrumScaleCluster().get_nodes()
-    for node_to_del in nodes_to_be_deleted:
-        for existing_node in existing_node_list:
-            if (node_to_del in existing_node.get_daemon_node_name() or
-                node_to_del in existing_node.get_admin_node_name()  or
-                node_to_del in existing_node.get_ip_address()):
-                filtered_nodes_to_be_deleted.append(existing_node)
+    filtered_nodes_to_be_deleted, unknown_nodes = \
+        SpectrumScaleCluster().resolve_nodes(nodes_to_be_deleted)
+    if unknown_nodes:
+        logger.info("Node(s) {0} not found in the cluster, "
+                    "skipping".format(unknown_nodes))
 
     logger.debug("Function Exit: check_nodes_exist(). "
                  "Return Params: filtered_nodes_to_be_deleted="
@@ -350,22 +376,25 @@ def check_roles_before_delete(logger, existing_node_list_to_del):
 
     logger.info("Checking the designations for all nodes marked for removal")
 
-    for node_to_del in existing_node_list_to_del:
-        # Do not delete nodes that are designated as "quorum", "manager",
-        # "gateway", "ces", "TCT", "SNMP"
-        if (node_to_del.is_quorum_node()  or
-            node_to_del.is_manager_node() or
-            node_to_del.is_gateway_node() or
-            node_to_del.is_ces_node()     or
-            node_to_del.is_tct_node()     or
-            node_to_del.is_snmp_node()):
-            exp_msg = ("Cannot remove node {0} since it is designated "
-                       "as either a quorum, gateway, CES, TCT or SNMP "
-                       "node. Re-run the current command without "
-                       "{1}".format(node_to_del.get_admin_node_name(),
-                                    node_to_del.get_admin_node_name()))
-            logger.error(exp_msg)
-            raise SpectrumScaleException(exp_msg, "", [], -1, "", "")
+    # Do not delete nodes that are designated as "quorum", "manager",
+    # "gateway", "ces", "TCT", "SNMP"
+    protected_roles = (SpectrumScaleNode.ROLE_QUORUM  |
+                       SpectrumScaleNode.ROLE_MANAGER |
+                       SpectrumScaleNode.ROLE_GATEWAY |
+                       SpectrumScaleNode.ROLE_CES     |
+                       SpectrumScaleNode.ROLE_TCT     |
+                       SpectrumScaleNode.ROLE_SNMP)
+    protected_nodes = SpectrumScaleCluster.filter_nodes_by_roles(
+                          existing_node_list_to_del, protected_roles)
+    if protected_nodes:
+        protected_names = ', '.join([node.get_admin_node_name()
+                                     for node in protected_nodes])
+        exp_msg = ("Cannot remove node {0} since it is designated "
+                   "as either a quorum, gateway, CES, TCT or SNMP "
+                   "node. Re-run the current command without "
+                   "{1}".format(protected_names, protected_names))
+        logger.error(exp_msg)
+        raise SpectrumScaleException(exp_msg, "", [], -1, "", "")
 
     # TODO: Should we also check the Zimon Collector Nodes
     # zimon_col_nodes = get_zimon_collectors()
@@ -394,49 +423,186 @@ def check_disk_health(logger, fs_nsd_map):
     logger.debug("Function Exit: check_disk_health(). ")
 
 
-def remove_multi_attach_nsd(logger, nodes_to_be_deleted):
+def plan_disk_evacuation(logger, node_names, node_nsd_map, fs_nsd_map):
+    """
+        This function unions the disks served by all the nodes to be
+        deleted, per filesystem, so that each filesystem is restriped once.
+        Args:
+            node_names (list): Names of the nodes to be deleted.
+            node_nsd_map (dict): NSD names served by each node
+                                 (see get_node_nsd_info).
+            fs_nsd_map (dict): SpectrumScaleDisk objects of each filesystem
+                               (see get_filesystem_to_nsd_mapping).
+        Returns:
+            fs_disk_map (dict): Disk names to be deleted per filesystem.
+                                Ex: {'fs1': ['nsd_1', 'nsd_2']}
+    """
+    logger.debug("Function Entry: plan_disk_evacuation(). "
+                 "Args: node_names={0}".format(node_names))
+
+    disks_to_delete = set()
+    for node_name in node_names:
+        disks_to_delete.update(node_nsd_map.get(node_name, []))
+
+    fs_disk_map = {}
+    for fs_name, disks in list(fs_nsd_map.items()):
+        fs_disks = [disk.get_nsd_name() for disk in disks
+                    if disk.get_nsd_name() in disks_to_delete]
+        if fs_disks:
+            fs_disk_map[fs_name] = fs_disks
+
+    logger.debug("Function Exit: plan_disk_evacuation(). "
+                 "Return Params: fs_disk_map={0} ".format(fs_disk_map))
+
+    return fs_disk_map
+
+
+def check_evacuation_capacity(logger, fs_disk_map):
+    """
+        This function checks, for every storage pool of every filesystem,
+        that the data of all the disks to be deleted fits in the other
+        disks of the pool with at least 20% of their free space left. No
+        disk is deleted unless every pool passes.
+        Args:
+            fs_disk_map (dict): Disk names to be deleted per filesystem
+                                (see plan_disk_evacuation).
+    """
+    logger.debug("Function Entry: check_evacuation_capacity(). "
+                 "Args: fs_disk_map={0}".format(fs_disk_map))
+
+    for fs, disks_to_delete in list(fs_disk_map.items()):
+        # mmdeldisk restripes the data of a disk within its storage pool.
+        # Algorithm used for checking at-least 20% free space during
+        # mmdeldisk in progress, for each storage pool of the disks;
+        # - Identify the size of data stored in disks going to be
+        #   deleted.
+        # - Identify the free size of the storage pool
+        #   (excluding the disk going to be deleted)
+        # - Allow for disk deletion, if total_free size is 20% greater
+        #   even after moving used data stored in disk going to be deleted.
+        pool_cap = gpfs_df_disk(logger, fs, disks_to_delete)
+        logger.debug("Identified disk capacity per storage pool for "
+                     "filesystem ({0}): {1}".format(fs, pool_cap))
+
+        for pool, disk_cap in list(pool_cap.items()):
+            size_to_be_del = disk_cap['used_size']
+            logger.debug("Identified data size going to be deleted from "
+                         "storage pool {0} of filesystem ({1}): "
+                         "{2}".format(pool, fs, size_to_be_del))
+
+            if not disk_cap['other_disks']:
+                msg = str("No free disks available to restripe data "
+                          "for the storage pool {0} of the filesystem "
+                          "{1}".format(pool, fs))
+                logger.error(msg)
+                raise SpectrumScaleException(msg=msg, mmcmd="", cmdargs=[],
+                                             rc=-1, stdout="", stderr="")
+
+            total_free = disk_cap['free_size']
+            logger.debug("Identified free size in other disks of the "
+                         "storage pool {0} of filesystem ({1}): "
+                         "{2}".format(pool, fs, total_free))
+
+            if total_free <= 0:
+                msg = str("No free space left to restripe data for the "
+                          "storage pool {0} of the filesystem "
+                          "{1}".format(pool, fs))
+                logger.error(msg)
+                raise SpectrumScaleException(msg=msg, mmcmd="", cmdargs=[],
+                                             rc=-1, stdout="", stderr="")
+
+            size_avail_after_migration = total_free - size_to_be_del
+            logger.debug("Expected size after restriping of the storage "
+                         "pool {0} of filesystem ({1}): "
+                         "{2}".format(pool, fs, size_avail_after_migration))
+
+            percent = int(size_avail_after_migration*100/total_free)
+            logger.debug("Expected percentage of size left after restriping "
+                         "of the storage pool {0} of filesystem ({1}): "
+                         "{2}".format(pool, fs, percent))
+
+            if percent < 20:
+                msg = ("Not enough space left for restriping data for "
+                       "storage pool {0} of filesystem {1}".format(pool, fs))
+                logger.error(msg)
+                raise SpectrumScaleException(msg=msg, mmcmd="", cmdargs=[],
+                                             rc=-1, stdout="", stderr="")
+
+    logger.debug("Function Exit: check_evacuation_capacity().")
+
+
+def remove_multi_attach_nsd(logger, nodes_to_be_deleted, node_map, nsd_map):
+    """
+        This function removes the nodes to be deleted from the server list
+        of the NSDs that are also served by other nodes, and waits for the
+        asynchronous mmchnsd changes to be committed.
+        Args:
+            nodes_to_be_deleted (list): SpectrumScaleNode objects.
+            node_map (dict): NSD names served by each node.
+            nsd_map (dict): Server names of each NSD.
+        Returns:
+            elapsed (float): Seconds taken by the changes to be committed.
+    """
     logger.debug("Function Entry: remove_multi_attach_nsd(). "
                  "Args nodes_to_be_deleted={0}".format(nodes_to_be_deleted))
 
     logger.info("Checking node(s) for multi-node attached NSD(s)")
 
-    # Iterate through each server to be deleted 
-    node_map, nsd_map = get_node_nsd_info(logger)
+    # Servers removed from each NSD, to verify the changes got committed
+    removed_servers = {}
+
+    # Iterate through each server to be deleted. node_map and nsd_map (see
+    # get_node_nsd_info) are updated as the server access lists change, so
+    # that they can still be used once this function returns
     for node_to_delete in nodes_to_be_deleted:
+        node_name = node_to_delete.get_admin_node_name()
         logger.debug("Processing all NSDs on node={0} for "
-                     "removal".format(node_to_delete.get_admin_node_name()))
-        #node_map, nsd_map = get_node_nsd_info(logger)
+                     "removal".format(node_name))
 
         # Check if the node to be deleted has access to any NSDs
-        #if node_to_delete in node_map.keys():
-        if node_to_delete.get_admin_node_name() in list(node_map.keys()):
-            nsds_to_delete_list = node_map[node_to_delete.get_admin_node_name()]
-
-            # For each Node, check all the NSDS it has access to. If the 
-            # Node has access to an NSD that can also be accessed from other
-            # NSD servers, then we can simply modify the server access list 
-            # through the mmchnsd command
-            for nsd_to_delete in nsds_to_delete_list: 
-                # Clone list to avoid modifying original content
-                nsd_attached_to_nodes = (nsd_map[nsd_to_delete])[:]
-                nsd_attached_to_nodes.remove(node_to_delete.get_admin_node_name())
-                if len(nsd_attached_to_nodes) >= 1:
-                    # This node has access to an NSD, that can also be 
-                    # accessed by other NSD servers. Therefore modify the 
-                    # server access list
-                    logger.info("Removing server access to NSD {0} from node "
-                                "{1}".format(nsd_to_delete, 
-                                             node_to_delete.get_admin_node_name()))
-                    SpectrumScaleNSD.remove_server_access_to_nsd(nsd_to_delete, 
-                                                node_to_delete.get_admin_node_name(),
-                                                nsd_attached_to_nodes)
-   
+        # For each Node, check all the NSDS it has access to. If the
+        # Node has access to an NSD that can also be accessed from other
+        # NSD servers, then we can simply modify the server access list
+        # through the mmchnsd command
+        for nsd_to_delete in list(node_map.get(node_name, [])):
+            # Clone list to avoid modifying original content
+            nsd_attached_to_nodes = (nsd_map[nsd_to_delete])[:]
+            nsd_attached_to_nodes.remove(node_name)
+            if len(nsd_attached_to_nodes) >= 1:
+                # This node has access to an NSD, that can also be
+                # accessed by other NSD servers. Therefore modify the
+                # server access list
+                logger.info("Removing server access to NSD {0} from node "
+                            "{1}".format(nsd_to_delete, node_name))
+                SpectrumScaleNSD.remove_server_access_to_nsd(nsd_to_delete,
+                                            node_name,
+                                            nsd_attached_to_nodes,
+                                            retry_policy=RETRY_POLICY)
+                nsd_map[nsd_to_delete] = nsd_attached_to_nodes
+                node_map[node_name].remove(nsd_to_delete)
+                removed_servers.setdefault(nsd_to_delete, []).append(node_name)
+
     # All "mmchnsd" calls are asynchronous. Therefore wait here till all 
-    # modifications are committed before proceeding further. For now just
-    # sleep but we need to enhance this to ensure the async op has completed
-    time.sleep(10)
+    # modifications are committed before proceeding further
+    elapsed = 0
+    if removed_servers:
+        elapsed, pending = SpectrumScaleNSD.wait_for_server_removal(
+                               removed_servers, retry_policy=RETRY_POLICY)
+        if pending:
+            msg = str("Server access list changes of NSD(s) {0} are not "
+                      "committed after {1:.1f} seconds".format(
+                          ' '.join(pending), elapsed))
+            logger.error(msg)
+            raise SpectrumScaleException(msg=msg, mmcmd="", cmdargs=[],
+                                         rc=-1, stdout="", stderr="")
+
+        logger.info("Server access list changes of {0} NSD(s) committed in "
+                    "{1:.1f} seconds".format(len(removed_servers), elapsed))
 
-    logger.debug("Function Exit: remove_multi_attach_nsd(). ")
+    logger.debug("Function Exit: remove_multi_attach_nsd(). "
+                 "Return Params: elapsed={0}".format(elapsed))
+
+    return elapsed
 
 
 #
@@ -447,11 +613,157 @@ def remove_multi_attach_nsd(logger, nodes_to_be_deleted):
 #
 # Args: 
 #   node_names_to_delete: Nodes to be deleted from the cluster
+def get_cluster_members(logger, node_names):
+    """
+        This function lists the cluster (mmlscluster) to find which of the
+        nodes are still members of it.
+        Args:
+            node_names (list): Node names, addresses or numbers.
+        Returns:
+            node_names (list): Nodes that are still members of the cluster.
+    """
+    cluster = SpectrumScaleCluster(retry_policy=RETRY_POLICY)
+    resolved, unresolved = cluster.resolve_nodes(node_names)
+    logger.debug("Node(s) no longer member of the cluster: "
+                 "{0}".format(unresolved))
+
+    return [node_name for node_name in node_names
+            if node_name not in unresolved]
+
+
+def run_node_batch(logger, step, step_func, node_names, failed_nodes,
+                   get_remaining=None):
+    """
+        This function runs one step (a single mm command over a -N list)
+        for a batch of nodes. When the command fails, the failure is
+        attributed to the nodes named in its error output and the step is
+        repeated for the other nodes of the batch. If the failure can not
+        be attributed, all the nodes of the batch fail.
+        Args:
+            step (str): Description of the step, for the messages.
+            step_func (function): Runs the step for a list of node names.
+            node_names (list): Nodes of the batch.
+            failed_nodes (dict): Updated with the reason of the failure of
+                                 every node that failed the step.
+            get_remaining (function): For a step that is not idempotent,
+                                      returns the nodes of a list on which
+                                      the step has not taken effect. Called
+                                      after a failure, the nodes completed
+                                      by the failed command are neither
+                                      failed nor retried.
+        Returns:
+            node_names (list): Nodes that completed the step.
+    """
+    completed = []
+    pending = list(node_names)
+    while pending:
+        try:
+            step_func(pending)
+            return completed + pending
+        except SpectrumScaleException as sse:
+            if get_remaining is not None:
+                try:
+                    remaining = get_remaining(pending)
+                except SpectrumScaleException as check_sse:
+                    logger.error("Unable to check the outcome of {0}: "
+                                 "{1}".format(step.lower(), str(check_sse)))
+                    remaining = pending
+                completed.extend([node_name for node_name in pending
+                                  if node_name not in remaining])
+                pending = [node_name for node_name in pending
+                           if node_name in remaining]
+
+            node_errors = get_failed_nodes(pending, sse.get_stderr() or "")
+            if not node_errors:
+                node_errors = dict((node_name, str(sse))
+                                   for node_name in pending)
+
+            for node_name, error in list(node_errors.items()):
+                logger.error("{0} failed on node {1}: "
+                             "{2}".format(step, node_name, error))
+                failed_nodes[node_name] = "{0} failed: {1}".format(step, error)
+
+            pending = [node_name for node_name in pending
+                       if node_name not in node_errors]
+
+    return completed + pending
+
+
+def teardown_nodes(logger, node_names, batch_size=DEFAULT_BATCH_SIZE):
+    """
+        This function unmounts the filesystems on the nodes, shuts them
+        down and deletes them from the cluster, running each of these
+        steps as a single mm command for up to batch_size nodes. A node
+        that fails a step is skipped by the following steps, the other
+        nodes of its batch carry on. The nodes must not serve any NSD.
+        Args:
+            node_names (list): Admin node names of the nodes to be deleted.
+            batch_size (int): Maximum number of nodes per mm command.
+        Returns:
+            removed_node_list (list): Nodes deleted from the cluster.
+            failed_nodes (dict): Reason of the failure of every node that
+                                 could not be deleted.
+    """
+    logger.debug("Function Entry: teardown_nodes(). "
+                 "Args: node_names={0} batch_size={1}".format(node_names,
+                                                             batch_size))
+
+    removed_node_list = []
+    failed_nodes = {}
+    batch_size = max(1, batch_size)
+
+    for idx in range(0, len(node_names), batch_size):
+        batch = node_names[idx:idx + batch_size]
+
+        logger.info("Unmounting filesystem(s) on {0}".format(' '.join(batch)))
+        batch = run_node_batch(logger, "Unmounting filesystem(s)",
+                               lambda nodes: SpectrumScaleFS.unmount_filesystems(
+                                   nodes, wait=True),
+                               batch, failed_nodes)
+
+        if batch:
+            logger.info("Shutting down node(s) {0}".format(' '.join(batch)))
+            batch = run_node_batch(logger, "Shutting down node",
+                                   lambda nodes: SpectrumScaleNode.shutdown_node(
+                                       nodes, wait=False,
+                                       retry_policy=RETRY_POLICY),
+                                   batch, failed_nodes)
+
+        if batch:
+            reached, pending = SpectrumScaleNode.wait_for_state(
+                                   batch, "down", retry_policy=RETRY_POLICY)
+            for node_name in pending:
+                logger.error("Node {0} is not \"down\" after "
+                             "retries".format(node_name))
+                failed_nodes[node_name] = str("Shutting down node timed out: "
+                                              "Node state is not \"down\" "
+                                              "after retries")
+            batch = [node_name for node_name in batch
+                     if node_name not in pending]
+
+        if batch:
+            logger.info("Deleting node(s) {0}".format(' '.join(batch)))
+            batch = run_node_batch(logger, "Deleting node",
+                                   lambda nodes: SpectrumScaleCluster.delete_node(
+                                       nodes, retry_policy=RETRY_POLICY),
+                                   batch, failed_nodes,
+                                   lambda nodes: get_cluster_members(logger,
+                                                                     nodes))
+
+        removed_node_list.extend(batch)
+
+    logger.debug("Function Exit: teardown_nodes(). "
+                 "Return Params: removed_node_list={0} "
+                 "failed_nodes={1}".format(removed_node_list, failed_nodes))
+
+    return removed_node_list, failed_nodes
+
+
 #
 # Return:
 #   rc: Return code
 #   msg: Output message
-def remove_nodes(logger, node_names_to_delete):
+def remove_nodes(logger, node_names_to_delete, batch_size=DEFAULT_BATCH_SIZE):
     logger.debug("Function Entry: remove_nodes(). "
                  "Args: node_list={0}".format(node_names_to_delete))
 
@@ -501,7 +813,11 @@ def remove_nodes(logger, node_names_to_delete):
     # that are to be deleted. Note: As long as these are Shared NSD's
     # another NSD server will continue to have access to the NSD (and 
     # therefore Data)
-    remove_multi_attach_nsd(logger, nodes_to_delete)
+    # Retrieve the NSD servers once (a single "mmlsnsd -X"), every per
+    # node lookup below is served from these maps
+    node_nsd_map, nsd_node_map = get_node_nsd_info(logger)
+    nsd_change_time = remove_multi_attach_nsd(logger, nodes_to_delete,
+                                              node_nsd_map, nsd_node_map)
 
     # Finally delete any dedicated NSDs (this will force the data to be
     # copied to another NSD in the same Filesystem). Finally delete the
@@ -509,129 +825,60 @@ def remove_nodes(logger, node_names_to_delete):
 
     logger.debug("Identified all filesystem to disk mapping: "
                  "{0}".format(fs_nsd_map))
-    
-    for node_to_del_obj in nodes_to_delete:
-        node_to_del = node_to_del_obj.get_admin_node_name()
-        logger.debug("Operating on server: {0}".format(node_to_del))
-        
-        # For each node to be deleted, retrieve the NSDs (disks) on the node
-        all_node_disks = get_all_nsds_of_node(logger, node_to_del)
-        logger.debug("Identified disks for server ({0}): "
-                     "{1}".format(node_to_del, all_node_disks))
-
-        # The Node does not have any disks on it (compute node). Delete the
-        # node without any more processing
-        if len(all_node_disks) == 0:
-            logger.info("Unmounting filesystem(s) on {0}".format(node_to_del))
-            SpectrumScaleFS.unmount_filesystems(node_to_del, wait=True)
-
-            logger.info("Shutting down node {0}".format(node_to_del))
-            SpectrumScaleNode.shutdown_node(node_to_del, wait=True)
-
-            logger.info("Deleting compute node {0}".format(node_to_del))
-            SpectrumScaleCluster.delete_node(node_to_del)
-
-            removed_node_list.append(node_to_del)
-            continue
-   
-        # Generate a list of NSD (disks) on the host to be deleted for
-        # each filesystem
-        #
-        # fs_disk_map{} contains the following:
-        #    Filesystem Name -> NSDs on the host to be deleted
-        fs_disk_map = {}
-        for fs_name, disks in list(fs_nsd_map.items()):
-            node_specific_disks = []
-            for disk_instance in disks:
-                if disk_instance.get_nsd_name() in all_node_disks:
-                    node_specific_disks.append(disk_instance.get_nsd_name())
-            fs_disk_map[fs_name] = node_specific_disks
-
-        logger.debug("Identified filesystem to disk map for server "
-                     "({0}): {1}".format(node_to_del, fs_disk_map))
-
-        for fs in fs_disk_map:
-            disk_cap = gpfs_df_disk(logger, fs)
-            logger.debug("Identified disk capacity for filesystem "
-                         "({0}): {1}".format(fs, disk_cap))
-
-            # Algorithm used for checking at-least 20% free space during
-            # mmdeldisk in progress;
-            # - Identify the size of data stored in disks going to be
-            #   deleted.
-            # - Identify the free size of the filesystem
-            #   (excluding the disk going to be deleted)
-            # - Allow for disk deletion, if total_free size is 20% greater
-            #   even after moving used data stored in disk going to be deleted.
-            size_to_be_del = 0
-            for disk in fs_disk_map[fs]:
-                size_to_be_del += disk_cap[disk]['used_size']
-            logger.debug("Identified data size going to be deleted from "
-                         "filesystem ({0}): {1}".format(fs, size_to_be_del))
-
-            other_disks = []
-            for disk_name in disk_cap:
-                if disk_name not in fs_disk_map[fs]:
-                    other_disks.append(disk_name)
-            logger.debug("Identified other disks of the filesystem "
-                         "({0}): {1}".format(fs, other_disks))
-
-            if not other_disks:
-                msg = str("No free disks available to restripe data "
-                          "for the filesystem {0}".format(fs))
-                logger.error(msg)
-                raise SpectrumScaleException(msg=msg, mmcmd="", cmdargs=[], 
-                                             rc=-1, stdout="", stderr="")
-
-            size_avail_after_migration, total_free = 0, 0
-            for disk in other_disks:
-                # Accumulate free size on all disks.
-                total_free += disk_cap[disk]['free_size']
-                logger.debug("Identified free size in other disks of the "
-                             "filesystem ({0}): {1}".format(fs, total_free))
-
-            size_avail_after_migration = total_free - size_to_be_del
-            logger.debug("Expected size after restriping of the filesystem "
-                         "({0}): {1}".format(fs, size_avail_after_migration))
-
-            percent = int(size_avail_after_migration*100/total_free)
-            logger.debug("Expected percentage of size left after restriping "
-                         "of the filesystem ({0}): {1}".format(fs, percent))
-
-            if percent < 20:
-                msg = ("Not enough space left for restriping data for "
-                       "filesystem {0}".format(fs))
-                logger.error(msg)
-                raise SpectrumScaleException(msg=msg, mmcmd="", cmdargs=[], 
-                                             rc=-1, stdout="", stderr="")
 
-            if fs_disk_map[fs]:
-                # mmdeldisk will not be hit if there are no disks to delete.
-                logger.info("Deleting disk(s) {0} from node "
-                            "{1}".format(' '.join(map(str, fs_disk_map[fs])), 
-                                         node_to_del))
-                SpectrumScaleDisk.delete_disk(node_to_del, fs, fs_disk_map[fs])
-
-        if all_node_disks:
-            # mmdelnsd will not be hot if there are no disks to delete.
-            logger.info("Deleting all NSD(s) {0} attached to node "
-                        "{1}".format(' '.join(map(str, all_node_disks)), 
-                                     node_to_del))
-            SpectrumScaleNSD.delete_nsd(all_node_disks)
-
-        logger.info("Unmounting filesystem(s) on {0}".format(node_to_del))
-        SpectrumScaleFS.unmount_filesystems(node_to_del, wait=True)
-
-        logger.info("Shutting down node {0}".format(node_to_del))
-        SpectrumScaleNode.shutdown_node(node_to_del, wait=True)
-
-        logger.info("Deleting storage node {0}".format(node_to_del))
-        SpectrumScaleCluster.delete_node(node_to_del)
-
-        removed_node_list.append(node_to_del)
-        
-    msg = str("Successfully removed node(s) {0} from the "
-              "cluster".format(' '.join(map(str, removed_node_list))))
+    # Evacuate the disks of all the nodes to be deleted together: a
+    # single capacity check and a single mmdeldisk (restripe) per
+    # filesystem, so that no data is migrated onto a disk that is deleted
+    # next
+    node_names_to_del = [node.get_admin_node_name()
+                         for node in nodes_to_delete]
+    fs_disk_map = plan_disk_evacuation(logger, node_names_to_del,
+                                       node_nsd_map, fs_nsd_map)
+    logger.debug("Identified filesystem to disk map for server(s) "
+                 "({0}): {1}".format(node_names_to_del, fs_disk_map))
+
+    check_evacuation_capacity(logger, fs_disk_map)
+
+    # Nodes whose disks are deleted restripe the data, as when removing
+    # a single node
+    storage_nodes = [node_name for node_name in node_names_to_del
+                     if node_nsd_map.get(node_name)]
+
+    for fs, disks_to_delete in list(fs_disk_map.items()):
+        logger.info("Deleting disk(s) {0} from node(s) "
+                    "{1}".format(' '.join(map(str, disks_to_delete)),
+                                 ' '.join(storage_nodes)))
+        SpectrumScaleDisk.delete_disk(storage_nodes, fs, disks_to_delete,
+                                      retry_policy=RETRY_POLICY)
+
+    all_nodes_disks = []
+    for node_name in storage_nodes:
+        all_nodes_disks.extend(node_nsd_map[node_name])
+    if all_nodes_disks:
+        # mmdelnsd will not be hit if there are no disks to delete.
+        logger.info("Deleting all NSD(s) {0} attached to node(s) "
+                    "{1}".format(' '.join(map(str, all_nodes_disks)),
+                                 ' '.join(storage_nodes)))
+        SpectrumScaleNSD.delete_nsd(all_nodes_disks,
+                                    retry_policy=RETRY_POLICY)
+
+    # None of the nodes serves an NSD anymore, unmount, shut down and
+    # delete them in batches
+    removed_node_list, failed_nodes = teardown_nodes(logger, node_names_to_del,
+                                                     batch_size)
+
+    result = {"removedNodes": removed_node_list,
+              "nsdServerChangeTime": round(nsd_change_time, 1)}
+    if failed_nodes:
+        rc = -1
+        msg = str("Failed to remove node(s) {0} from the cluster. Removed "
+                  "node(s): {1}".format(' '.join(map(str, failed_nodes)),
+                                        ' '.join(map(str, removed_node_list))))
+        result["failedNodes"] = failed_nodes
+    else:
+        msg = str("Successfully removed node(s) {0} from the "
+                  "cluster".format(' '.join(map(str, removed_node_list))))
+    result_json = json.dumps(result)
 
     logger.info(msg)
     logger.debug("Function Exit: remove_nodes(). "
@@ -703,19 +950,91 @@ def get_node_status_as_json(logger, node_names=[]):
 ##                                                                           ##
 ###############################################################################
 
-def start_nodes(logger, node_names):
+def change_node_state(logger, node_names, state, batch_size=DEFAULT_BATCH_SIZE):
+    """
+        This function starts (state "active") or stops (state "down") the
+        nodes, with one mmstartup/mmshutdown per batch of up to batch_size
+        nodes, and then polls the state of all the nodes together until
+        they reach the state.
+        Args:
+            node_names (list): Nodes to be started or stopped.
+            state (str): "active" or "down".
+            batch_size (int): Maximum number of nodes per mm command.
+        Returns:
+            state_time (dict): Seconds taken by each node to reach the
+                               state, from the command of its batch.
+            failed_nodes (dict): Reason of the failure of every node that
+                                 did not reach the state.
+    """
+    logger.debug("Function Entry: change_node_state(). "
+                 "Args: node_names={0} state={1} "
+                 "batch_size={2}".format(node_names, state, batch_size))
+
+    if state == "active":
+        step = "Starting node"
+        step_func = lambda nodes: SpectrumScaleNode.start_node(
+                        nodes, wait=False, retry_policy=RETRY_POLICY)
+    else:
+        step = "Shutting down node"
+        step_func = lambda nodes: SpectrumScaleNode.shutdown_node(
+                        nodes, wait=False, retry_policy=RETRY_POLICY)
+
+    failed_nodes = {}
+    issued = {}
+    batch_size = max(1, batch_size)
+
+    for idx in range(0, len(node_names), batch_size):
+        batch = node_names[idx:idx + batch_size]
+        logger.info("{0}(s) {1}".format(step, ' '.join(batch)))
+        issue_time = time.time()
+        for node_name in run_node_batch(logger, step, step_func, batch,
+                                        failed_nodes):
+            issued[node_name] = issue_time
+
+    reached, pending = SpectrumScaleNode.wait_for_state(
+                           list(issued), state, retry_policy=RETRY_POLICY)
+    for node_name in pending:
+        logger.error("Node {0} is not \"{1}\" after "
+                     "retries".format(node_name, state))
+        failed_nodes[node_name] = str("{0} timed out: Node state is not "
+                                      "\"{1}\" after retries".format(step,
+                                                                   state))
+
+    state_time = {}
+    for node_name in node_names:
+        if node_name in reached:
+            state_time[node_name] = round(reached[node_name] -
+                                          issued[node_name], 1)
+
+    logger.debug("Function Exit: change_node_state(). "
+                 "Return Params: state_time={0} "
+                 "failed_nodes={1}".format(state_time, failed_nodes))
+
+    return state_time, failed_nodes
+
+
+def start_nodes(logger, node_names, batch_size=DEFAULT_BATCH_SIZE):
     logger.debug("Function Entry: start_nodes(). "
                  "Args: node_names={0}".format(node_names))
 
     rc = RC_SUCCESS
-    msg = stdout = result_json = ""
-
-    for node in node_names:
-        logger.info("Attempting to start node {0}".format(node))
-        rc, stdout = SpectrumScaleNode.start_node(node, wait=True)
+    msg = result_json = ""
 
-    msg = str("Successfully started node(s) "
-              "{0}".format(' '.join(map(str, node_names))))
+    logger.info("Attempting to start node(s) "
+                "{0}".format(' '.join(map(str, node_names))))
+    state_time, failed_nodes = change_node_state(logger, node_names, "active",
+                                                 batch_size)
+
+    result = {"timeToActive": state_time}
+    if failed_nodes:
+        rc = -1
+        msg = str("Failed to start node(s) "
+                  "{0}".format(' '.join(map(str, failed_nodes))))
+        result["failedNodes"] = failed_nodes
+    else:
+        msg = str("Successfully started node(s) "
+                  "{0}".format(' '.join(map(str, node_names))))
+    result_json = json.dumps(result)
 
     logger.info(msg)
 
@@ -726,19 +1045,28 @@ def start_nodes(logger, node_names):
     return rc, msg, result_json
 
 
-def stop_nodes(logger, node_names):
+def stop_nodes(logger, node_names, batch_size=DEFAULT_BATCH_SIZE):
     logger.debug("Function Entry: stop_nodes(). "
                  "Args: node_names={0}".format(node_names))
 
     rc = RC_SUCCESS
-    msg = stdout = result_json = ""
-
-    for node in node_names:
-        logger.info("Attempting to stop node {0}".format(node))
-        rc, stdout = SpectrumScaleNode.shutdown_node(node, wait=True)
+    msg = result_json = ""
 
-    msg = str("Successfully stopped node(s) "
-              "{0}".format(' '.join(map(str, node_names))))
+    logger.info("Attempting to stop node(s) "
+                "{0}".format(' '.join(map(str, node_names))))
+    state_time, failed_nodes = change_node_state(logger, node_names, "down",
+                                                 batch_size)
+
+    result = {"timeToDown": state_time}
+    if failed_nodes:
+        rc = -1
+        msg = str("Failed to stop node(s) "
+                  "{0}".format(' '.join(map(str, failed_nodes))))
+        result["failedNodes"] = failed_nodes
+    else:
+        msg = str("Successfully stopped node(s) "
+                  "{0}".format(' '.join(map(str, node_names))))
+    result_json = json.dumps(result)
 
     logger.info(msg)
 
@@ -755,7 +1083,8 @@ def stop_nodes(logger, node_names):
 ##                                                                           ##
 ###############################################################################
 
-def add_nodes(logger, node_names, stanza, license):
+def add_nodes(logger, node_names, stanza, license,
+              batch_size=DEFAULT_BATCH_SIZE):
     logger.debug("Function Entry: add_nodes(). "
                  "Args: node_names={0}".format(node_names))
 
@@ -765,19 +1094,31 @@ def add_nodes(logger, node_names, stanza, license):
     logger.info("Attempting to add node(s) {0} to the "
                 "cluster".format(' '.join(map(str, node_names))))
 
-    rc, stdout, stderr = SpectrumScaleCluster.add_node(node_names, stanza)
+    rc, stdout, stderr = SpectrumScaleCluster.add_node(node_names, stanza,
+                                                       retry_policy=RETRY_POLICY)
 
     logger.info("Attempting to apply licenses to newly added "
                 "node(s)".format(' '.join(map(str, node_names))))
 
-    rc, stdout = SpectrumScaleCluster.apply_license(node_names, license)
-
-    for node in node_names:
-        logger.info("Attempting to start node {0}".format(node))
-        rc, stdout = SpectrumScaleNode.start_node(node, wait=True)
-
-    msg = str("Successfully added node(s) {0} to the "
-              "cluster".format(' '.join(map(str, node_names))))
+    rc, stdout = SpectrumScaleCluster.apply_license(node_names, license,
+                                                    retry_policy=RETRY_POLICY)
+
+    logger.info("Attempting to start node(s) "
+                "{0}".format(' '.join(map(str, node_names))))
+    state_time, failed_nodes = change_node_state(logger, node_names, "active",
+                                                 batch_size)
+
+    result = {"timeToActive": state_time}
+    if failed_nodes:
+        rc = -1
+        msg = str("Added node(s) {0} to the cluster, failed to start node(s) "
+                  "{1}".format(' '.join(map(str, node_names)),
+                               ' '.join(map(str, failed_nodes))))
+        result["failedNodes"] = failed_nodes
+    else:
+        msg = str("Successfully added node(s) {0} to the "
+                  "cluster".format(' '.join(map(str, node_names))))
+    result_json = json.dumps(result)
 
     logger.info(msg)
 
@@ -794,6 +1135,28 @@ def add_nodes(logger, node_names, stanza, license):
 ##                                                                           ##
 ###############################################################################
 
+def has_changed_nodes(result_json):
+    """
+        This function tells whether the result of an operation reports
+        nodes that were removed, started or stopped. The batched operations
+        can fail for some of the nodes only, the other nodes were changed.
+        Args:
+            result_json (str): Result of the operation.
+        Returns:
+            changed (bool): True if any node was changed.
+    """
+    try:
+        result = json.loads(result_json)
+    except ValueError:
+        return False
+
+    if not isinstance(result, dict):
+        return False
+
+    return any(result.get(key) for key in ["removedNodes", "timeToActive",
+                                           "timeToDown"])
+
+
 def main():
     logger = SpectrumScaleLogger.get_logger()
 
@@ -826,6 +1189,11 @@ def main():
                                             choices=['server', 'client', 'fpo'], 
                                             required=False
                                           ),
+                           batch_size = dict(
+                                            type='int',
+                                            default=DEFAULT_BATCH_SIZE,
+                                            required=False
+                                          ),
                          )
 
 
@@ -871,10 +1239,14 @@ def main():
                                                                node_names)
             elif "start" in module.params['op']:
                 # Start the IBM Spectrum Scale Server(s)
-                rc, msg, result_json = start_nodes(logger, node_names)
+                rc, msg, result_json = start_nodes(logger, node_names,
+                                                   module.params['batch_size'])
             elif "stop" in module.params['op']:
                 # Stop the IBM Spectrum Scale Server(s)
-                rc, msg, result_json = stop_nodes(logger, node_names)
+                rc, msg, result_json = stop_nodes(logger, node_names,
+                                                  module.params['batch_size'])
+
+            state_changed = has_changed_nodes(result_json)
 
         elif module.params['state']:
             listofserver = module.params['name']
@@ -883,13 +1255,20 @@ def main():
                 rc, msg, result_json = add_nodes(logger,
                                                  listofserver.split(','),
                                                  module.params['nodefile'],
-                                                 module.params['license'])
+                                                 module.params['license'],
+                                                 module.params['batch_size'])
             else:
+                # The removal queries the whole cluster configuration
+                # (mmlscluster, mmlsnsd, mmlsfs). Serve it from a snapshot
+                # shared with the other tasks
+                SpectrumScaleClusterSnapshot.enable()
+
                 # Delete the existing IBM Spectrum Scale cluster
                 rc, msg, result_json = remove_nodes(logger, 
-                                                    listofserver.split(','))
+                                                    listofserver.split(','),
+                                                    module.params['batch_size'])
 
-            if rc == RC_SUCCESS:
+            if rc == RC_SUCCESS or has_changed_nodes(result_json):
                 state_changed = True
                 
     except SpectrumScaleException as sse:
@@ -898,28 +1277,33 @@ def main():
         logger.debug(e_msg)
         failure_msg = "FAILED: " + sse.get_message()
         module.fail_json(msg=failure_msg, changed=False, rc=-1, 
-                         result=result_json, stderr=str(st))
+                         result=result_json, stderr=str(st),
+                         perf=SpectrumScaleMetrics.get_summary())
     except Exception as e:
         st = traceback.format_exc()
         e_msg = ("Exception: {0}  StackTrace: {1}".format(str(e), st))
         logger.debug(e_msg)
         failure_msg = "FAILED: " + e.get_message()
         module.fail_json(msg=failure_msg, changed=False, rc=-1, 
-                         result=result_json, stderr=str(st))
+                         result=result_json, stderr=str(st),
+                         perf=SpectrumScaleMetrics.get_summary())
 
     logger.debug("---------------------------------")
     logger.debug("Function Exit: ibm_spectrumscale_node.main()")
     logger.debug("---------------------------------")
 
+    SpectrumScaleSSH.shutdown()
     SpectrumScaleLogger.shutdown()
 
     # Module is done. Return back the result
     if rc == RC_SUCCESS:
-        module.exit_json(msg=msg, changed=state_changed, rc=rc, result=result_json)
+        module.exit_json(msg=msg, changed=state_changed, rc=rc, result=result_json,
+                         perf=SpectrumScaleMetrics.get_summary())
     else:
         failure_msg = "FAILED: " + msg
         module.fail_json(msg=failure_msg, changed=state_changed, rc=rc, 
-                         result=result_json)
+                         result=result_json,
+                         perf=SpectrumScaleMetrics.get_summary())
 
 
 if __name__ == '__main__':
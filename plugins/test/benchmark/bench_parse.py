@@ -0,0 +1,258 @@
+#!/usr/bin/python3
+#
+# Copyright 2020 IBM Corporation
+# and other contributors as indicated by the @author tags.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+Throughput of the -Y parse functions in ibm_spectrumscale_utils.
+
+Compares the current parse functions against the reference implementations
+they replaced (one zip + OrderedDict + unquote per field, reserved/empty
+columns deleted per row; a linear scan of the instances per mmlsfs row) on
+synthetic mmlsdisk, mmlsnsd and mmlsfs output, and checks that both return
+the same result.
+
+    ./bench_parse.py [--rows 1000000] [--filesystems 500] [--properties 60]
+                     [--repeat 3]
+"""
+
+import os
+import sys
+import time
+import argparse
+import urllib.parse
+from collections import OrderedDict
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                "..", "..", "module_utils"))
+
+from ibm_spectrumscale_utils import parse_unique_records, \
+        parse_simple_cmd_output
+
+
+###############################################################################
+##                                                                           ##
+##                           Synthetic -Y Output                             ##
+##                                                                           ##
+###############################################################################
+
+def gen_mmlsdisk(rows):
+    lines = ["mmlsdisk::HEADER:version:reserved:reserved:nsdName:driverType:"
+             "sectorSize:failureGroup:metadata:data:status:availability:"
+             "diskID:storagePool:remarks:numQuorumDisks:readQuorumValue:"
+             "writeQuorumValue:diskSizeKB:diskUID:thinDiskType:"]
+    for idx in range(rows):
+        lines.append("mmlsdisk::0:1:::nsd{0:07d}:nsd:512:{1}:{2}:Yes:ready:"
+                     "up:{3}:{4}:{5}:3:2:2:10737418240:0A0B{0:012X}:no:".format(
+                         idx, idx % 100 + 1, "Yes" if idx % 4 == 0 else "No",
+                         idx + 1, "system" if idx % 4 == 0 else "data",
+                         "desc" if idx < 3 else ""))
+    return "\n".join(lines) + "\n"
+
+
+def gen_mmlsnsd(rows):
+    lines = ["mmlsnsd:nsd:HEADER:version:reserved:reserved:fileSystem:"
+             "diskName:volumeId:serverList:thinDisk:"]
+    for idx in range(rows):
+        server = idx % 500
+        lines.append("mmlsnsd:nsd:0:1:::fs{0:03d}:nsd{1:07d}:0A0B{1:012X}:"
+                     "node{2:05d}.scale.sim,node{3:05d}.scale.sim::".format(
+                         idx % 40 + 1, idx, server, server + 1))
+    return "\n".join(lines) + "\n"
+
+
+def gen_mmlsfs(filesystems, properties):
+    lines = ["mmlsfs::HEADER:version:reserved:reserved:deviceName:fieldName:"
+             "data:remarks:"]
+    for fs_idx in range(filesystems):
+        for prop_idx in range(properties):
+            lines.append("mmlsfs::0:1:::fs{0:03d}:property{1:02d}:{2}:"
+                         "Property {1}:".format(fs_idx, prop_idx,
+                                                fs_idx * prop_idx))
+    return "\n".join(lines) + "\n"
+
+
+###############################################################################
+##                                                                           ##
+##                         Reference Implementation                          ##
+##                                                                           ##
+###############################################################################
+
+def reference_parse_unique_records(cmd_raw_out, datatype="", header_index=2):
+    data_out = OrderedDict()
+    headers = OrderedDict()
+
+    for line in cmd_raw_out.splitlines():
+        values = line.split(":")
+        if len(values) < 3:
+            continue
+
+        if not datatype:
+            datatype = values[1] or values[0]
+        if datatype == "":
+            continue
+
+        if values[header_index] == 'HEADER':
+            headers[datatype] = values
+            continue
+
+        columnNames = headers[datatype]
+
+        json_object = OrderedDict()
+        for key, value in zip(columnNames[header_index+1:],
+                              values[header_index+1:]):
+            json_object[key] = urllib.parse.unquote(value)
+
+        if "" in json_object:
+            del json_object[""]
+        if 'reserved' in json_object:
+            del json_object['reserved']
+
+        json_array = []
+        if datatype in list(data_out.keys()):
+            json_array = data_out[datatype]
+        json_array.append(json_object)
+
+        data_out[datatype] = json_array
+
+    return data_out
+
+
+def reference_parse_simple_cmd_output(cmd_raw_out, cmd_key, cmd_prop_name,
+                                      datatype="", header_index=2):
+    data_out = OrderedDict()
+    headers = OrderedDict()
+
+    for line in cmd_raw_out.splitlines():
+        values = line.split(":")
+        if len(values) < 3:
+            continue
+
+        if not datatype:
+            datatype = values[1] or values[0]
+        if datatype == "":
+            continue
+
+        if values[header_index] == 'HEADER':
+            headers[datatype] = values
+            continue
+
+        columnNames = headers[datatype]
+
+        json_object = OrderedDict()
+        instance_key = ""
+        for key, value in zip(columnNames[header_index+1:],
+                              values[header_index+1:]):
+            if cmd_key in key:
+                instance_key = value
+            else:
+                json_object[key] = urllib.parse.unquote(value)
+
+        if "" in json_object:
+            del json_object[""]
+        if 'reserved' in json_object:
+            del json_object['reserved']
+
+        json_array = []
+        obj_found = False
+        if datatype in list(data_out.keys()):
+            json_array = data_out[datatype]
+            prop_list = []
+            for obj in json_array:
+                key_val = obj[cmd_key]
+                if instance_key in key_val:
+                    prop_list = obj[cmd_prop_name]
+                    prop_list.append(json_object)
+                    obj[cmd_prop_name] = prop_list
+                    obj_found = True
+                    break
+
+        if not obj_found:
+            prop_list = []
+            prop_list.append(json_object)
+            device_dict = OrderedDict()
+            device_dict[cmd_key] = instance_key
+            device_dict[cmd_prop_name] = prop_list
+            json_array.append(device_dict)
+
+        data_out[datatype] = json_array
+
+    return data_out
+
+
+###############################################################################
+##                                                                           ##
+##                                   Main                                    ##
+##                                                                           ##
+###############################################################################
+
+def measure(func, cmd_raw_out, repeat):
+    best = None
+    result = None
+    for _ in range(repeat):
+        result = None
+        t_start = time.perf_counter()
+        result = func(cmd_raw_out)
+        t_run = time.perf_counter() - t_start
+        best = t_run if best is None else min(best, t_run)
+    return best, result
+
+
+def parse_mmlsfs(cmd_raw_out):
+    return parse_simple_cmd_output(cmd_raw_out, "deviceName", "properties")
+
+
+def reference_parse_mmlsfs(cmd_raw_out):
+    return reference_parse_simple_cmd_output(cmd_raw_out, "deviceName",
+                                             "properties")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--filesystems", type=int, default=500)
+    parser.add_argument("--properties", type=int, default=60)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    fs_rows = args.filesystems * args.properties
+    scenarios = [
+        ("mmlsdisk", args.rows, lambda: gen_mmlsdisk(args.rows),
+         reference_parse_unique_records, parse_unique_records),
+        ("mmlsnsd", args.rows, lambda: gen_mmlsnsd(args.rows),
+         reference_parse_unique_records, parse_unique_records),
+        ("mmlsfs", fs_rows,
+         lambda: gen_mmlsfs(args.filesystems, args.properties),
+         reference_parse_mmlsfs, parse_mmlsfs),
+    ]
+
+    print("{0:<10} {1:>9} {2:>14} {3:>14} {4:>8}".format(
+        "output", "rows", "reference r/s", "current r/s", "speedup"))
+    for name, rows, generator, reference, current in scenarios:
+        cmd_raw_out = generator()
+        t_ref, ref_result = measure(reference, cmd_raw_out, args.repeat)
+        t_cur, cur_result = measure(current, cmd_raw_out, args.repeat)
+        if ref_result != cur_result:
+            print("{0}: results differ".format(name))
+            return 1
+        ref_result = cur_result = None
+        print("{0:<10} {1:>9} {2:>14.0f} {3:>14.0f} {4:>7.2f}x".format(
+            name, rows, rows / t_ref, rows / t_cur, t_ref / t_cur))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,93 @@
+#!/usr/bin/python3
+#
+# Copyright 2020 IBM Corporation
+# and other contributors as indicated by the @author tags.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+Serial runCmd() against concurrent run_many() fan-out.
+
+Runs --commands stub commands (each one sleeps --delay seconds, standing
+in for a remote mm* query, then echoes its index) one after another with
+runCmd() and then through run_many() at every --concurrency, and checks
+that run_many() returns the results in submission order.
+
+    ./bench_run_many.py [--commands 200] [--delay 0.05] [--concurrency 8,32]
+"""
+
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                "..", "..", "module_utils"))
+
+from ibm_spectrumscale_utils import runCmd, run_many, RC_SUCCESS
+
+
+###############################################################################
+##                                                                           ##
+##                                   Main                                    ##
+##                                                                           ##
+###############################################################################
+
+def stub_commands(count, delay):
+    return [["sh", "-c", "sleep {0}; echo {1}".format(delay, idx)]
+            for idx in range(count)]
+
+
+def check_results(results):
+    for idx, (stdout, stderr, rc) in enumerate(results):
+        if rc != RC_SUCCESS or stdout.strip() != str(idx):
+            raise RuntimeError("Unexpected result for command {0}: rc={1} "
+                               "stdout={2!r} stderr={3!r}".format(
+                                   idx, rc, stdout, stderr))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument("--commands", type=int, default=200)
+    parser.add_argument("--delay", type=float, default=0.05,
+                        help="run time of every stub command (sec)")
+    parser.add_argument("--concurrency", default="8,32",
+                        help="comma separated max_concurrency values")
+    args = parser.parse_args()
+
+    cmds = stub_commands(args.commands, args.delay)
+
+    t_start = time.perf_counter()
+    check_results([runCmd(cmd) for cmd in cmds])
+    t_serial = time.perf_counter() - t_start
+
+    rows = [("serial runCmd", t_serial)]
+    for concurrency in args.concurrency.split(","):
+        t_start = time.perf_counter()
+        check_results(run_many(cmds, max_concurrency=int(concurrency)))
+        rows.append(("run_many({0})".format(concurrency),
+                     time.perf_counter() - t_start))
+
+    print("{0} commands, {1:.3f} s each\n".format(args.commands, args.delay))
+    print("{0:<18} {1:>9} {2:>11} {3:>8}".format("mode", "total s",
+                                                 "per cmd ms", "speedup"))
+    for name, elapsed in rows:
+        print("{0:<18} {1:>9.2f} {2:>11.2f} {3:>7.1f}x".format(
+            name, elapsed, elapsed / args.commands * 1000,
+            t_serial / elapsed))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,173 @@
+#!/usr/bin/python3
+#
+# Copyright 2020 IBM Corporation
+# and other contributors as indicated by the @author tags.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+Per-call latency of remote commands through SpectrumScaleSSH.
+
+Compares one ssh connection per command ("ssh <admin_ip> <cmd>", the
+transport the helpers used before SpectrumScaleSSH) against the pooled
+ControlMaster channel of SpectrumScaleSSH.get_command(), both through
+runCmd().
+
+By default ssh is replaced by a stub (put first in PATH) that runs the
+command locally and sleeps --handshake seconds for every connection it
+has to establish: the master start and every command that does not find
+a master on its ControlPath. Pass --host to measure a real (e.g. local)
+sshd instead; key based authentication must be set up.
+
+    ./bench_ssh.py [--calls 50] [--handshake 0.15] [--host localhost]
+"""
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                "..", "..", "module_utils"))
+
+from ibm_spectrumscale_utils import runCmd, RC_SUCCESS, SpectrumScaleSSH
+
+
+STUB_HOST = "stub-admin-node"
+
+STUB_SSH = '''#!{python}
+import os
+import sys
+import time
+import subprocess
+
+args = sys.argv[1:]
+options = {{}}
+control_op = None
+idx = 0
+while idx < len(args) and args[idx].startswith("-"):
+    if args[idx] == "-o":
+        name, _, value = args[idx + 1].partition("=")
+        options[name] = value
+        idx += 2
+    elif args[idx] == "-O":
+        control_op = args[idx + 1]
+        idx += 2
+    else:
+        idx += 1
+host = args[idx]
+command = args[idx + 1:]
+control_path = options.get("ControlPath", "").replace("%C", host)
+
+if control_op == "exit":
+    if os.path.exists(control_path):
+        os.remove(control_path)
+    sys.exit(0)
+
+if options.get("ControlMaster") == "yes":
+    # Background master (-N -f): connect once and publish the socket
+    time.sleep({handshake})
+    open(control_path, "w").close()
+    sys.exit(0)
+
+if not (control_path and os.path.exists(control_path)):
+    time.sleep({handshake})
+sys.exit(subprocess.call(" ".join(command), shell=True))
+'''
+
+
+###############################################################################
+##                                                                           ##
+##                                   Main                                    ##
+##                                                                           ##
+###############################################################################
+
+def measure(get_prefix, calls):
+    """
+    Run "true" calls times on the remote node.
+    @return: (list of float) the latency of every call, in sec
+    """
+    latencies = []
+    for _ in range(calls):
+        t_start = time.perf_counter()
+        stdout, stderr, rc = runCmd(get_prefix() + ["true"], sh=False)
+        latencies.append(time.perf_counter() - t_start)
+        if rc != RC_SUCCESS:
+            raise RuntimeError("Remote command failed (rc={0}): "
+                               "{1}".format(rc, stderr))
+    return latencies
+
+
+def report(name, latencies):
+    ordered = sorted(latencies)
+    print("{0:<16} {1:>9.1f} {2:>9.1f} {3:>9.1f} {4:>9.1f}".format(
+        name, ordered[0] * 1000, ordered[len(ordered) // 2] * 1000,
+        sum(ordered) / len(ordered) * 1000, ordered[-1] * 1000))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument("--calls", type=int, default=50)
+    parser.add_argument("--handshake", type=float, default=0.15,
+                        help="connection setup time of the stub ssh (sec)")
+    parser.add_argument("--host", default=None,
+                        help="measure a real sshd on this host instead of "
+                             "the stub")
+    args = parser.parse_args()
+
+    stub_dir = None
+    host = args.host
+    if host is None:
+        host = STUB_HOST
+        stub_dir = tempfile.mkdtemp(prefix="bench-ssh-")
+        stub_path = os.path.join(stub_dir, "ssh")
+        with open(stub_path, "w") as stub_file:
+            stub_file.write(STUB_SSH.format(python=sys.executable,
+                                            handshake=args.handshake))
+        os.chmod(stub_path, 0o755)
+        os.environ["PATH"] = stub_dir + os.pathsep + os.environ["PATH"]
+
+    try:
+        per_call = measure(lambda: ["ssh", host], args.calls)
+
+        # The first call starts the master, report it separately
+        t_start = time.perf_counter()
+        measure(lambda: SpectrumScaleSSH.get_command(host), 1)
+        t_master = time.perf_counter() - t_start
+        pooled = measure(lambda: SpectrumScaleSSH.get_command(host),
+                         args.calls)
+    finally:
+        SpectrumScaleSSH.shutdown()
+        if stub_dir:
+            shutil.rmtree(stub_dir, ignore_errors=True)
+
+    print("{0} calls to {1}{2}\n".format(
+        args.calls, host,
+        " (stub, {0:.3f} s handshake)".format(args.handshake)
+        if stub_dir else ""))
+    print("{0:<16} {1:>9} {2:>9} {3:>9} {4:>9}".format(
+        "transport", "min ms", "median ms", "mean ms", "max ms"))
+    report("per-call ssh", per_call)
+    report("pooled", pooled)
+    print("\nfirst pooled call (starts the master): {0:.1f} ms".format(
+        t_master * 1000))
+    print("speedup (mean): {0:.2f}x".format(
+        sum(per_call) / sum(pooled)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
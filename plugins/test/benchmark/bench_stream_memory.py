@@ -0,0 +1,133 @@
+#!/usr/bin/python3
+#
+# Copyright 2020 IBM Corporation
+# and other contributors as indicated by the @author tags.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+Peak Python memory of buffered against streamed -Y parsing.
+
+A synthetic mmlsdisk -Y output of every --lines size is written to a
+temporary file and "cat" is used as the command, so that the output
+really comes through a pipe. The peak traced by tracemalloc is reported
+for:
+
+  buffered   runCmd() + parse_unique_records() (the whole output, its
+             lines and every parsed record are alive at the same time)
+  stream     SpectrumScaleCmdStream + parse_unique_records() (the parsed
+             records are still kept)
+  stream-iter  SpectrumScaleCmdStream + parse_records_iter(), consuming
+             each record as it is produced
+
+    ./bench_stream_memory.py [--lines 50000,500000]
+"""
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                "..", "..", "module_utils"))
+
+from ibm_spectrumscale_utils import runCmd, parse_unique_records, \
+        parse_records_iter, SpectrumScaleCmdStream, RC_SUCCESS
+from bench_parse import gen_mmlsdisk
+
+
+###############################################################################
+##                                                                           ##
+##                                  Modes                                    ##
+##                                                                           ##
+###############################################################################
+
+def buffered(path):
+    stdout, stderr, rc = runCmd(["cat", path])
+    if rc != RC_SUCCESS:
+        raise RuntimeError(stderr)
+    return len(parse_unique_records(stdout)["mmlsdisk"])
+
+
+def stream(path):
+    stream = SpectrumScaleCmdStream(["cat", path])
+    records = parse_unique_records(stream)
+    if stream.rc != RC_SUCCESS:
+        raise RuntimeError(stream.stderr)
+    return len(records["mmlsdisk"])
+
+
+def stream_iter(path):
+    stream = SpectrumScaleCmdStream(["cat", path])
+    count = 0
+    for _ in parse_records_iter(stream):
+        count += 1
+    if stream.rc != RC_SUCCESS:
+        raise RuntimeError(stream.stderr)
+    return count
+
+
+MODES = [("buffered", buffered), ("stream", stream),
+         ("stream-iter", stream_iter)]
+
+
+###############################################################################
+##                                                                           ##
+##                                   Main                                    ##
+##                                                                           ##
+###############################################################################
+
+def measure(func, path):
+    """
+    @return: (int, int, float) records parsed, peak traced bytes, elapsed sec
+    """
+    tracemalloc.start()
+    t_start = time.perf_counter()
+    count = func(path)
+    elapsed = time.perf_counter() - t_start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return count, peak, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument("--lines", default="50000,500000",
+                        help="comma separated number of data lines")
+    args = parser.parse_args()
+
+    print("{0:<12} {1:>8} {2:>9} {3:>10} {4:>9}".format(
+        "mode", "lines", "output MB", "peak MB", "time s"))
+    for lines in [int(value) for value in args.lines.split(",")]:
+        fd, path = tempfile.mkstemp(prefix="bench-stream-", suffix=".out")
+        try:
+            with os.fdopen(fd, "w") as out_file:
+                out_file.write(gen_mmlsdisk(lines))
+            size = os.path.getsize(path)
+            for name, func in MODES:
+                count, peak, elapsed = measure(func, path)
+                if count != lines:
+                    raise RuntimeError("{0}: parsed {1} records out of "
+                                       "{2}".format(name, count, lines))
+                print("{0:<12} {1:>8} {2:>9.1f} {3:>10.2f} {4:>9.2f}".format(
+                    name, lines, size / 1e6, peak / 1e6, elapsed))
+        finally:
+            os.remove(path)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,505 @@
+#!/usr/bin/python3
+#
+# Copyright 2020 IBM Corporation
+# and other contributors as indicated by the @author tags.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+Benchmark suite for the -Y parsers, the models and the node module helpers.
+
+For every size tier a cluster is generated with the simulator
+(test/simulator/mmsim.py) and the output of the commands used by the
+module_utils is written as SpectrumScaleReplay fixtures, so the scenarios
+run the real code paths (runCmd included) without a cluster and without a
+subprocess per command.
+
+Each scenario runs in its own process, so that its peak RSS is not hidden
+by the previous ones, and reports:
+
+    time_best_s/time_median_s   wall time of one run (best/median of --repeat)
+    alloc_peak_bytes            peak of the memory allocated by one run
+    alloc_retained_bytes        memory still held by the result of one run
+    rss_setup_kb/rss_peak_kb    peak RSS after the setup/after all the runs
+
+The report is written as JSON. Pass the report of another commit with
+--compare to print the ratios and fail (rc 1) on a time or allocation
+regression above --threshold.
+
+    ./bench_suite.py [--tiers small,medium,large] [--scenarios ...]
+                     [--repeat 5] [--workdir DIR] [--output report.json]
+                     [--compare baseline.json] [--threshold 1.25]
+                     [--timeout 600]
+
+The node module scenarios require ansible to be importable; they are
+reported as skipped otherwise.
+"""
+
+import os
+import gc
+import sys
+import json
+import time
+import shutil
+import inspect
+import logging
+import platform
+import argparse
+import resource
+import tempfile
+import contextlib
+import subprocess
+import tracemalloc
+from collections import OrderedDict
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, "..", "..", "module_utils"))
+sys.path.insert(0, os.path.join(BENCH_DIR, "..", "..", "modules"))
+sys.path.insert(0, os.path.join(BENCH_DIR, "..", "simulator"))
+
+import mmsim
+from ibm_spectrumscale_utils import runCmd, GPFS_CMD_PATH, \
+        SpectrumScaleLogger, SpectrumScaleReplay, \
+        parse_aggregate_cmd_output, parse_simple_cmd_output, \
+        parse_unique_records
+from ibm_spectrumscale_cluster_utils import SpectrumScaleCluster, \
+        SpectrumScaleNode
+from ibm_spectrumscale_filesystem_utils import SpectrumScaleFS
+
+
+# name: (nodes, disks, filesystems)
+TIERS = OrderedDict([
+    ("small", (10, 100, 1)),
+    ("medium", (1000, 10000, 50)),
+    ("large", (10000, 100000, 500)),
+])
+
+FIXTURE_DIR = "fixtures"
+TIER_FILE = "tier.json"
+SEED = 0
+MIN_RUN_TIME = 0.2
+
+
+###############################################################################
+##                                                                           ##
+##                              Fixtures                                     ##
+##                                                                           ##
+###############################################################################
+
+def get_tier_commands(filesystems):
+    """
+    Return the commands (as run by the module_utils, without the command
+    path) whose output is needed by the scenarios
+    """
+    commands = [["mmlscluster", "-Y"],
+                ["mmgetstate", "-a", "-Y"],
+                ["mmlsnsd", "-a", "-X", "-Y"],
+                ["mmlsfs", "all", "-Y"]]
+    for fs_name in filesystems:
+        commands.append(["mmlsdisk", fs_name, "-Y"])
+        commands.append(["mmdf", fs_name, "-Y"])
+    return commands
+
+
+def get_mm_cmd(command):
+    return [os.path.join(GPFS_CMD_PATH, command[0])] + command[1:]
+
+
+def prepare_tier(workdir, tier):
+    """
+    Generate the simulated cluster of a tier and record the fixtures of
+    its commands, unless workdir already holds them
+    """
+    nodes, disks, filesystems = TIERS[tier]
+    tier_dir = os.path.join(workdir, tier)
+    tier_desc = {"nodes": nodes, "disks": disks, "filesystems": filesystems,
+                 "seed": SEED, "gpfs_cmd_path": GPFS_CMD_PATH}
+
+    tier_path = os.path.join(tier_dir, TIER_FILE)
+    if os.path.exists(tier_path):
+        with open(tier_path) as tier_file:
+            if json.load(tier_file) == tier_desc:
+                return tier_dir
+        shutil.rmtree(tier_dir)
+
+    with open(os.devnull, "w") as devnull:
+        with contextlib.redirect_stdout(devnull):
+            mmsim.init([tier_dir, "--nodes", str(nodes),
+                        "--filesystems", str(filesystems),
+                        "--nsds", str(disks), "--seed", str(SEED)])
+
+    SpectrumScaleReplay.configure(SpectrumScaleReplay.MODE_RECORD,
+                                  os.path.join(tier_dir, FIXTURE_DIR))
+    with mmsim.SimulatorState(tier_dir) as state:
+        for command in get_tier_commands(state.get_filesystem_names()):
+            lines = getattr(mmsim, command[0])(state, command[1:])
+            SpectrumScaleReplay.record(get_mm_cmd(command),
+                                       "\n".join(lines) + "\n", "", 0, 0.0)
+    SpectrumScaleReplay.configure(SpectrumScaleReplay.MODE_OFF)
+
+    with open(tier_path, "w") as tier_file:
+        json.dump(tier_desc, tier_file)
+    return tier_dir
+
+
+def get_output(command):
+    stdout, stderr, rc = runCmd(get_mm_cmd(command), sh=False)
+    if rc != 0:
+        raise RuntimeError("{0}: {1}".format(' '.join(command), stderr))
+    return stdout
+
+
+###############################################################################
+##                                                                           ##
+##                              Scenarios                                    ##
+##                                                                           ##
+###############################################################################
+
+def get_accessors(cls):
+    """
+    Return the names of the instance methods of cls that take no argument
+    and start with get_ or is_
+    """
+    accessors = []
+    for name in sorted(dir(cls)):
+        if not name.startswith(("get_", "is_")):
+            continue
+        if isinstance(inspect.getattr_static(cls, name), staticmethod):
+            continue
+        parameters = inspect.signature(getattr(cls, name)).parameters
+        if list(parameters) == ["self"]:
+            accessors.append(name)
+    return accessors
+
+
+def get_node_module():
+    import ibm_spectrumscale_node
+    return ibm_spectrumscale_node
+
+
+# Each setup function returns (func, rows): func is the timed callable and
+# rows the number of records it processes. Setup is not timed.
+
+def setup_parse_aggregate():
+    cmd_raw_out = get_output(["mmlscluster", "-Y"])
+    summary = ["clusterSummary", "cnfsSummary", "cesSummary"]
+    return (lambda: parse_aggregate_cmd_output(cmd_raw_out, summary),
+            cmd_raw_out.count("\n"))
+
+
+def setup_parse_simple():
+    cmd_raw_out = get_output(["mmlsfs", "all", "-Y"])
+    return (lambda: parse_simple_cmd_output(cmd_raw_out, "deviceName",
+                                            "properties", "filesystems"),
+            cmd_raw_out.count("\n"))
+
+
+def setup_parse_unique():
+    cmd_raw_out = get_output(["mmlsnsd", "-a", "-X", "-Y"])
+    return (lambda: parse_unique_records(cmd_raw_out),
+            cmd_raw_out.count("\n"))
+
+
+def setup_fs_getters():
+    filesystems = SpectrumScaleFS.get_filesystems()
+    accessors = get_accessors(SpectrumScaleFS)
+
+    def run():
+        for fs in filesystems:
+            for accessor in accessors:
+                getattr(fs, accessor)()
+
+    return run, len(filesystems) * len(accessors)
+
+
+def setup_node_roles():
+    nodes = SpectrumScaleCluster().get_nodes()
+    predicates = [name for name in get_accessors(SpectrumScaleNode)
+                  if name.startswith("is_")]
+
+    def run():
+        for node in nodes:
+            for predicate in predicates:
+                getattr(node, predicate)()
+
+    return run, len(nodes) * len(predicates)
+
+
+def setup_node_roles_filter():
+    nodes = SpectrumScaleCluster().get_nodes()
+    roles = (SpectrumScaleNode.ROLE_QUORUM | SpectrumScaleNode.ROLE_MANAGER |
+             SpectrumScaleNode.ROLE_GATEWAY | SpectrumScaleNode.ROLE_CES |
+             SpectrumScaleNode.ROLE_TCT | SpectrumScaleNode.ROLE_SNMP)
+    return (lambda: SpectrumScaleCluster.filter_nodes_by_roles(nodes, roles),
+            len(nodes))
+
+
+def setup_node_nsd_map():
+    node_module = get_node_module()
+    logger = SpectrumScaleLogger.get_logger()
+    return (lambda: node_module.get_node_nsd_info(logger),
+            TIERS[os.environ["BENCH_TIER"]][1])
+
+
+def setup_fs_nsd_map():
+    node_module = get_node_module()
+    logger = SpectrumScaleLogger.get_logger()
+    return (lambda: node_module.get_filesystem_to_nsd_mapping(logger),
+            TIERS[os.environ["BENCH_TIER"]][1])
+
+
+def setup_fs_capacity():
+    node_module = get_node_module()
+    logger = SpectrumScaleLogger.get_logger()
+    fs_name = SpectrumScaleFS.get_filesystems()[0].get_device_name()
+    disks = [disk.get_nsd_name() for disk in
+             node_module.SpectrumScaleDisk.get_all_disk_info(fs_name)]
+    return (lambda: node_module.gpfs_df_disk(logger, fs_name, disks[:2]),
+            len(disks))
+
+
+SCENARIOS = OrderedDict([
+    ("parse_aggregate", setup_parse_aggregate),
+    ("parse_simple", setup_parse_simple),
+    ("parse_unique", setup_parse_unique),
+    ("fs_getters", setup_fs_getters),
+    ("node_roles", setup_node_roles),
+    ("node_roles_filter", setup_node_roles_filter),
+    ("node_nsd_map", setup_node_nsd_map),
+    ("fs_nsd_map", setup_fs_nsd_map),
+    ("fs_capacity", setup_fs_capacity),
+])
+
+
+###############################################################################
+##                                                                           ##
+##                              Measurement                                  ##
+##                                                                           ##
+###############################################################################
+
+def get_maxrss_kb():
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes on Linux
+    if sys.platform == "darwin":
+        maxrss //= 1024
+    return maxrss
+
+
+def run_scenario(workdir, tier, scenario, repeat):
+    """
+    Run one scenario of one tier in this process and return its result
+    """
+    # The modules log at DEBUG level: keep the cost of formatting the
+    # messages, drop the I/O
+    logger = logging.getLogger("bench_suite")
+    logger.setLevel(logging.DEBUG)
+    logger.addHandler(logging.NullHandler())
+    logger.propagate = False
+    SpectrumScaleLogger.logger = logger
+
+    os.environ["BENCH_TIER"] = tier
+    SpectrumScaleReplay.configure(SpectrumScaleReplay.MODE_REPLAY,
+                                  os.path.join(workdir, tier, FIXTURE_DIR))
+
+    result = OrderedDict([("tier", tier), ("scenario", scenario)])
+    try:
+        func, rows = SCENARIOS[scenario]()
+    except ImportError as e:
+        result["skipped"] = str(e)
+        return result
+    result["rows"] = rows
+    result["rss_setup_kb"] = get_maxrss_kb()
+
+    # Short runs are looped until they take MIN_RUN_TIME, so that the
+    # time of the small tiers is not timer noise
+    loops = 1
+    while True:
+        t_start = time.perf_counter()
+        for _ in range(loops):
+            func()
+        if time.perf_counter() - t_start >= MIN_RUN_TIME:
+            break
+        loops *= 10
+
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        t_start = time.perf_counter()
+        for _ in range(loops):
+            func()
+        times.append((time.perf_counter() - t_start) / loops)
+    times.sort()
+
+    gc.collect()
+    tracemalloc.start()
+    alloc_base = tracemalloc.get_traced_memory()[0]
+    output = func()
+    alloc_current, alloc_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    output = None
+
+    result["loops"] = loops
+    result["time_best_s"] = times[0]
+    result["time_median_s"] = times[len(times) // 2]
+    result["alloc_peak_bytes"] = alloc_peak - alloc_base
+    result["alloc_retained_bytes"] = alloc_current - alloc_base
+    result["rss_peak_kb"] = get_maxrss_kb()
+    return result
+
+
+def run_scenario_process(workdir, tier, scenario, repeat, timeout):
+    cmd = [sys.executable, os.path.abspath(__file__), "--run-scenario",
+           scenario, "--tiers", tier, "--workdir", workdir,
+           "--repeat", str(repeat)]
+    try:
+        proc = subprocess.run(cmd, stdout=subprocess.PIPE,
+                              stderr=subprocess.PIPE, universal_newlines=True,
+                              timeout=timeout)
+    except subprocess.TimeoutExpired:
+        return OrderedDict([("tier", tier), ("scenario", scenario),
+                            ("error", "timed out after {0} "
+                                      "seconds".format(timeout))])
+    if proc.returncode != 0:
+        return OrderedDict([("tier", tier), ("scenario", scenario),
+                            ("error", "\n".join(
+                                proc.stderr.strip().splitlines()[-1:]))])
+    # The result is the last line, the modules may print on import
+    return json.loads(proc.stdout.strip().splitlines()[-1],
+                      object_pairs_hook=OrderedDict)
+
+
+def get_commit():
+    try:
+        proc = subprocess.run(["git", "rev-parse", "HEAD"], cwd=BENCH_DIR,
+                              stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                              universal_newlines=True)
+    except OSError:
+        return ""
+    return proc.stdout.strip()
+
+
+def compare(baseline, report, threshold):
+    """
+    Print the ratios of the report to the baseline and return the number
+    of regressions above threshold
+    """
+    baseline_results = {(result["tier"], result["scenario"]): result
+                        for result in baseline["results"]}
+    regressions = 0
+
+    print("{0:<8} {1:<18} {2:>10} {3:>10} {4:>8} {5:>8}".format(
+        "tier", "scenario", "base ms", "ms", "time", "alloc"))
+    for result in report["results"]:
+        base = baseline_results.get((result["tier"], result["scenario"]))
+        if not base or "time_best_s" not in base or \
+           "time_best_s" not in result:
+            continue
+        time_ratio = result["time_best_s"] / base["time_best_s"]
+        alloc_ratio = (float(result["alloc_peak_bytes"]) /
+                       max(base["alloc_peak_bytes"], 1))
+        flag = ""
+        if time_ratio > threshold or alloc_ratio > threshold:
+            regressions += 1
+            flag = "  REGRESSION"
+        print("{0:<8} {1:<18} {2:>10.2f} {3:>10.2f} {4:>7.2f}x {5:>7.2f}x{6}".format(
+            result["tier"], result["scenario"], base["time_best_s"] * 1000,
+            result["time_best_s"] * 1000, time_ratio, alloc_ratio, flag))
+    return regressions
+
+
+###############################################################################
+##                                                                           ##
+##                                   Main                                    ##
+##                                                                           ##
+###############################################################################
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument("--tiers", default=",".join(TIERS))
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--workdir", default=None,
+                        help="directory for the simulated clusters and "
+                             "fixtures, reused across runs (default: a "
+                             "temporary directory)")
+    parser.add_argument("--output", default=None,
+                        help="file for the JSON report (default: stdout)")
+    parser.add_argument("--compare", default=None,
+                        help="JSON report to compare against")
+    parser.add_argument("--threshold", type=float, default=1.25)
+    parser.add_argument("--timeout", type=int, default=600,
+                        help="seconds allowed per scenario (setup and all "
+                             "the runs)")
+    parser.add_argument("--run-scenario", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    tiers = [tier for tier in args.tiers.split(",") if tier]
+    scenarios = [scenario for scenario in args.scenarios.split(",") if scenario]
+    for tier in tiers:
+        if tier not in TIERS:
+            parser.error("unknown tier {0}".format(tier))
+    for scenario in scenarios:
+        if scenario not in SCENARIOS:
+            parser.error("unknown scenario {0}".format(scenario))
+
+    if args.run_scenario:
+        result = run_scenario(args.workdir, tiers[0], args.run_scenario,
+                              args.repeat)
+        sys.stdout.write(json.dumps(result) + "\n")
+        return 0
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="bench_suite.")
+    try:
+        report = OrderedDict([
+            ("commit", get_commit()),
+            ("python", platform.python_version()),
+            ("platform", platform.platform()),
+            ("repeat", args.repeat),
+            ("tiers", OrderedDict([(tier, dict(zip(
+                ("nodes", "disks", "filesystems"), TIERS[tier])))
+                for tier in tiers])),
+            ("results", []),
+        ])
+        for tier in tiers:
+            sys.stderr.write("Preparing tier {0}\n".format(tier))
+            prepare_tier(workdir, tier)
+            for scenario in scenarios:
+                result = run_scenario_process(workdir, tier, scenario,
+                                              args.repeat, args.timeout)
+                sys.stderr.write("  {0:<18} {1}\n".format(
+                    scenario, "{0:.2f} ms".format(result["time_best_s"] * 1000)
+                    if "time_best_s" in result else
+                    result.get("skipped") or result.get("error")))
+                report["results"].append(result)
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(report, output_file, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)
+        if compare(baseline, report, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,201 @@
+#!/usr/bin/python3
+#
+# Copyright 2020 IBM Corporation
+# and other contributors as indicated by the @author tags.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+Timeout enforcement of runCmd() and run_many() on hanging commands.
+
+Every stub is a shell that backgrounds a "sleep" grandchild and hangs. The
+command must return the timeout rc within timeout + KILL_GRACE_PERIOD (plus
+--slack), and neither its process group nor the grandchild may survive:
+
+  hang         the grandchild keeps the output pipes open
+  detached     the grandchild has its output redirected to /dev/null
+  ignore-term  the shell and the grandchild ignore SIGTERM (needs SIGKILL)
+
+Then --commands short commands with a long timeout are run while another
+command is in flight, to check that the completed commands do not pile up
+in the SpectrumScaleWatchdog heap.
+Exits with 1 if any check fails. Linux only (reads /proc).
+
+    ./bench_watchdog.py [--timeout 2] [--slack 1] [--commands 1000]
+"""
+
+import os
+import sys
+import time
+import signal
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                "..", "..", "module_utils"))
+
+from ibm_spectrumscale_utils import runCmd, run_many, SpectrumScaleWatchdog
+
+
+STUBS = [
+    ("hang", "sleep 300 & echo $$ $! > {pid_file}; wait"),
+    ("detached", "sleep 300 > /dev/null 2>&1 & echo $$ $! > {pid_file}; "
+                 "wait"),
+    ("ignore-term", "trap '' TERM; sleep 300 & echo $$ $! > {pid_file}; "
+                    "wait"),
+]
+
+TIMEOUT_RCS = (-signal.SIGTERM, -signal.SIGKILL)
+
+
+###############################################################################
+##                                                                           ##
+##                              Process Checks                               ##
+##                                                                           ##
+###############################################################################
+
+def read_stat(pid):
+    """
+    @return: (tuple|None) (state, process group id) of a live process, None
+             if the process does not exist or is a zombie
+    """
+    try:
+        with open("/proc/{0}/stat".format(pid)) as stat_file:
+            stat = stat_file.read()
+    except (IOError, OSError):
+        return None
+    # The command name may contain blanks, the fields follow its ")"
+    fields = stat[stat.rindex(")") + 2:].split()
+    if fields[0] == "Z":
+        return None
+    return fields[0], int(fields[2])
+
+
+def group_members(pgid):
+    members = []
+    for entry in os.listdir("/proc"):
+        if entry.isdigit():
+            stat = read_stat(entry)
+            if stat is not None and stat[1] == pgid:
+                members.append(int(entry))
+    return members
+
+
+def wait_gone(pids, pgid, wait=1.0):
+    """
+    Killed processes may take a moment to disappear.
+    @return: (list) the pids still alive and the members of pgid
+    """
+    deadline = time.time() + wait
+    while True:
+        alive = [pid for pid in pids if read_stat(pid) is not None]
+        alive.extend([pid for pid in group_members(pgid) if pid not in alive])
+        if not alive or time.time() >= deadline:
+            return alive
+        time.sleep(0.05)
+
+
+###############################################################################
+##                                                                           ##
+##                                   Main                                    ##
+##                                                                           ##
+###############################################################################
+
+def run_stub(mode, script, timeout):
+    if mode == "runCmd":
+        return runCmd(["sh", "-c", script], timeout=timeout)[2]
+    return run_many([["sh", "-c", script]], timeout=timeout)[0][2]
+
+
+def check_stub(mode, name, template, timeout, slack, work_dir):
+    pid_file = os.path.join(work_dir, "{0}-{1}.pid".format(mode, name))
+    script = template.format(pid_file=pid_file)
+
+    t_start = time.perf_counter()
+    rc = run_stub(mode, script, timeout)
+    elapsed = time.perf_counter() - t_start
+
+    with open(pid_file) as pid_fd:
+        shell_pid, grandchild_pid = [int(pid) for pid in pid_fd.read().split()]
+    alive = wait_gone([shell_pid, grandchild_pid], shell_pid)
+    for pid in alive:
+        os.kill(pid, signal.SIGKILL)
+
+    errors = []
+    if rc not in TIMEOUT_RCS:
+        errors.append("rc {0} is not a timeout rc".format(rc))
+    limit = timeout + SpectrumScaleWatchdog.KILL_GRACE_PERIOD + slack
+    if elapsed > limit:
+        errors.append("returned after {0:.2f} s (> {1:.2f} s)".format(elapsed,
+                                                                     limit))
+    if shell_pid in alive or any(pid != grandchild_pid for pid in alive):
+        errors.append("process group {0} still alive".format(shell_pid))
+    if grandchild_pid in alive:
+        errors.append("grandchild {0} still alive".format(grandchild_pid))
+
+    print("{0:<9} {1:<12} {2:>5} {3:>9.2f}  {4}".format(
+        mode, name, rc, elapsed, "; ".join(errors) or "ok"))
+    return not errors
+
+
+def check_heap(commands):
+    # A command still running with an earlier deadline stays at the top of
+    # the heap, the entries of the commands completed after it queue up
+    # behind it
+    proc = subprocess.Popen(["sleep", "600"], start_new_session=True)
+    watch = SpectrumScaleWatchdog.watch(proc, "sleep 600", 300)
+    try:
+        for _ in range(commands):
+            runCmd(["true"], timeout=3600)
+        size = len(SpectrumScaleWatchdog.deadlines)
+    finally:
+        SpectrumScaleWatchdog.unwatch(watch)
+        proc.kill()
+        proc.wait()
+    limit = 2 * SpectrumScaleWatchdog.COMPACT_THRESHOLD + 2
+    ok = size <= limit
+    print("\n{0} commands with a 3600 s timeout: {1} watchdog heap entries "
+          "(limit {2})  {3}".format(commands, size, limit,
+                                         "ok" if ok else "FAILED"))
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument("--timeout", type=float, default=2)
+    parser.add_argument("--slack", type=float, default=1,
+                        help="allowed delay past timeout + grace period (sec)")
+    parser.add_argument("--commands", type=int, default=1000)
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="bench-watchdog-")
+    ok = True
+    try:
+        print("{0:<9} {1:<12} {2:>5} {3:>9}  {4}".format("mode", "stub", "rc",
+                                                         "time s", "result"))
+        for mode in ["runCmd", "run_many"]:
+            for name, template in STUBS:
+                ok &= check_stub(mode, name, template, args.timeout,
+                                 args.slack, work_dir)
+        ok &= check_heap(args.commands)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,906 @@
+#!/usr/bin/python3
+#
+# Copyright 2020 IBM Corporation
+# and other contributors as indicated by the @author tags.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+Synthetic IBM Spectrum Scale "mm" command simulator.
+
+Generates a consistent cluster topology of any size and serves the "-Y"
+output of the commands used by the module_utils for it, so that the
+SpectrumScaleCluster/SpectrumScaleNSD/SpectrumScaleDisk code paths can be
+exercised (and benchmarked) without a real cluster.
+
+Create a simulated cluster:
+
+    ./mmsim.py init /tmp/sim --nodes 5000 --filesystems 40 --nsds 20000
+
+This writes the topology to /tmp/sim/state.json and creates /tmp/sim/bin
+with one entry per simulated command. Point the module_utils at it with:
+
+    export SPECTRUMSCALE_GPFS_CMD_PATH=/tmp/sim/bin
+    export SPECTRUMSCALE_MMSDRFS_PATH=/tmp/sim/mmsdrfs
+
+/tmp/sim/mmsdrfs holds the version line of the cluster configuration
+file; its generation is bumped by every simulated configuration change.
+
+Commands can also be run as "mmsim.py <command> ..." with MMSIM_STATE_DIR
+set to the directory of the simulated cluster.
+
+Simulated commands:
+    mmlscluster -Y, mmgetstate, mmlsnsd [-d] [-X], mmlsfs, mmlsdisk, mmdf,
+    mmperfmon config show
+Simulated mutations (persisted in state.json):
+    mmdelnode, mmdeldisk, mmdelnsd, mmchnsd, mmshutdown, mmstartup, mmumount
+
+"init" also takes --latency (seconds added to every command),
+--chnsd-delay (seconds before an mmchnsd becomes visible in mmlsnsd) and
+--state-delay (seconds before mmstartup/mmshutdown are reflected by
+mmgetstate) to reproduce the asynchronous behaviour of a real cluster.
+mmumount fails on the nodes flagged "busy": true in state.json, mmdelnode
+on the nodes flagged "undeletable": true (the other nodes are deleted).
+"""
+
+import os
+import sys
+import json
+import time
+import fcntl
+import random
+import argparse
+
+try:
+    from urllib.parse import quote
+except ImportError:
+    from urllib import quote
+
+
+STATE_FILE = "state.json"
+MMSDRFS_FILE = "mmsdrfs"
+LOCK_FILE = "state.lock"
+BIN_DIR = "bin"
+
+SIM_COMMANDS = ["mmlscluster", "mmgetstate", "mmlsnsd", "mmlsfs", "mmlsdisk",
+                "mmdf", "mmperfmon", "mmdelnode", "mmdeldisk", "mmdelnsd",
+                "mmchnsd", "mmshutdown", "mmstartup", "mmumount"]
+
+DOMAIN = "scale.sim"
+DISK_SIZE_KB = 10 * 1024 * 1024 * 1024
+BLOCK_SIZE = 4194304
+MIN_FRAGMENT_SIZE = 8192
+INODE_SIZE = 4096
+
+
+class SimulatorError(Exception):
+    def __init__(self, msg, rc=1):
+        Exception.__init__(self, msg)
+        self.rc = rc
+
+
+###############################################################################
+##                                                                           ##
+##                          Topology Generation                              ##
+##                                                                           ##
+###############################################################################
+
+def generate_topology(nodes, filesystems, nsds, nsd_servers=None,
+                      servers_per_nsd=2, quorum_nodes=None, perfmon_nodes=2,
+                      disk_size=DISK_SIZE_KB, fill=0.5, seed=0):
+    """
+    Return a consistent cluster state as a dict.
+    Quorum nodes are numbered first and NSD servers last; every NSD is
+    served by a group of servers_per_nsd servers, and each server group is
+    a failure group. NSDs are assigned round robin to the file systems, one
+    in four to the system pool (data and metadata), the rest to the "data"
+    pool (data only).
+    """
+    rnd = random.Random(seed)
+
+    if quorum_nodes is None:
+        quorum_nodes = 7 if nodes >= 100 else min(nodes, 3)
+    if nsd_servers is None:
+        nsd_servers = max(servers_per_nsd, nodes // 10)
+    nsd_servers = min(nodes, nsd_servers)
+    servers_per_nsd = min(servers_per_nsd, nsd_servers)
+
+    node_list = []
+    for number in range(1, nodes + 1):
+        roles = []
+        alias = []
+        if number <= perfmon_nodes:
+            roles.append("Z")
+            alias.append("perfmon")
+        node_list.append({
+            "number": number,
+            "name": "node{0:05d}.{1}".format(number, DOMAIN),
+            "ip": "10.{0}.{1}.{2}".format((number >> 16) & 255,
+                                          (number >> 8) & 255, number & 255),
+            "designation": "quorumManager" if number <= quorum_nodes else "",
+            "roles": ",".join(roles),
+            "alias": ",".join(alias),
+            "state": "active",
+        })
+
+    servers = [node["name"] for node in node_list[nodes - nsd_servers:]]
+    server_groups = [servers[idx:idx + servers_per_nsd]
+                     for idx in range(0, len(servers) - servers_per_nsd + 1,
+                                      servers_per_nsd)]
+
+    fs_dict = {}
+    for fs_idx in range(1, filesystems + 1):
+        fs_name = "fs{0:03d}".format(fs_idx)
+        fs_dict[fs_name] = {"mount_point": "/gpfs/{0}".format(fs_name),
+                            "create_time": int(time.time()) - fs_idx * 3600}
+
+    fs_names = sorted(fs_dict.keys())
+    fs_disk_count = {}
+    nsd_list = []
+    for nsd_idx in range(nsds):
+        group_idx = nsd_idx % len(server_groups)
+        fs_name = fs_names[nsd_idx % len(fs_names)] if fs_names else None
+        pool = None
+        if fs_name:
+            disk_number = fs_disk_count.get(fs_name, 0)
+            fs_disk_count[fs_name] = disk_number + 1
+            pool = "system" if disk_number % 4 == 0 else "data"
+        used = int(disk_size * min(1.0, fill * rnd.uniform(0.8, 1.2)))
+        nsd_list.append({
+            "name": "nsd{0:06d}".format(nsd_idx + 1),
+            "volume_id": "0A0B{0:012X}".format(nsd_idx + 1),
+            "device": "/dev/dm-{0}".format(nsd_idx),
+            "servers": list(server_groups[group_idx]),
+            "fs": fs_name,
+            "pool": pool,
+            "failure_group": group_idx + 1,
+            "metadata": pool == "system",
+            "size": disk_size,
+            "free": disk_size - used if fs_name else disk_size,
+        })
+
+    return {
+        "config": {"cluster_name": "sim.{0}".format(DOMAIN),
+                   "cluster_id": "{0}".format(rnd.randint(10 ** 18, 10 ** 19)),
+                   "latency": 0.0,
+                   "chnsd_delay": 0.0,
+                   "state_delay": 0.0,
+                   "generation": 1},
+        "nodes": node_list,
+        "filesystems": fs_dict,
+        "nsds": nsd_list,
+    }
+
+
+###############################################################################
+##                                                                           ##
+##                              State Handling                               ##
+##                                                                           ##
+###############################################################################
+
+class SimulatorState:
+    def __init__(self, state_dir, exclusive=False):
+        self.state_dir = state_dir
+        self.exclusive = exclusive
+        self.lock_file = None
+        self.state = None
+
+    def __enter__(self):
+        state_path = os.path.join(self.state_dir, STATE_FILE)
+        if not os.path.exists(state_path):
+            raise SimulatorError("mmsim: No simulated cluster in {0}. Run "
+                                 "\"mmsim.py init\" first.".format(self.state_dir))
+        self.lock_file = open(os.path.join(self.state_dir, LOCK_FILE), "a")
+        fcntl.flock(self.lock_file,
+                    fcntl.LOCK_EX if self.exclusive else fcntl.LOCK_SH)
+        with open(state_path) as state_file:
+            self.state = json.load(state_file)
+        self.__apply_pending()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        fcntl.flock(self.lock_file, fcntl.LOCK_UN)
+        self.lock_file.close()
+
+    def __apply_pending(self):
+        now = time.time()
+        for node in self.state["nodes"]:
+            if node.get("target") and node["target_at"] <= now:
+                node["state"] = node.pop("target")
+                node.pop("target_at")
+        for nsd in self.state["nsds"]:
+            if nsd.get("pending_servers") and nsd["pending_at"] <= now:
+                nsd["servers"] = nsd.pop("pending_servers")
+                nsd.pop("pending_at")
+
+    def save(self, config_changed=True):
+        # Like the mmsdrfs of a real cluster, the generation is bumped by
+        # the configuration changes but not by the node state changes
+        if config_changed:
+            self.state["config"]["generation"] = \
+                self.state["config"].get("generation", 1) + 1
+            write_mmsdrfs(self.state_dir, self.state)
+
+        state_path = os.path.join(self.state_dir, STATE_FILE)
+        tmp_path = "{0}.{1}.tmp".format(state_path, os.getpid())
+        with open(tmp_path, "w") as state_file:
+            json.dump(self.state, state_file)
+        os.rename(tmp_path, state_path)
+
+    def get_config(self, name):
+        return self.state["config"][name]
+
+    def get_nodes(self):
+        return self.state["nodes"]
+
+    def resolve_nodes(self, command, node_args):
+        """
+        Resolve the -N argument(s) of a command (comma or blank separated
+        node names, short names, IP addresses, node numbers or "all").
+        """
+        index = {}
+        for node in self.state["nodes"]:
+            index[node["name"]] = node
+            index[node["name"].split(".")[0]] = node
+            index[node["ip"]] = node
+            index[str(node["number"])] = node
+
+        names = " ".join(node_args).replace(",", " ").split()
+        if "all" in names:
+            return list(self.state["nodes"])
+
+        resolved = []
+        for name in names:
+            if name not in index:
+                raise SimulatorError("{0}: Incorrect node {1} specified for "
+                                     "command.".format(command, name))
+            if index[name] not in resolved:
+                resolved.append(index[name])
+        return resolved
+
+    def get_filesystem(self, command, fs_name):
+        if fs_name not in self.state["filesystems"]:
+            raise SimulatorError("mmcommon: File system {0} is not known to "
+                                 "the GPFS cluster.".format(fs_name))
+        return self.state["filesystems"][fs_name]
+
+    def get_filesystem_names(self):
+        return sorted(self.state["filesystems"].keys())
+
+    def get_nsds(self, fs_name=None):
+        if fs_name is None:
+            return self.state["nsds"]
+        return [nsd for nsd in self.state["nsds"] if nsd["fs"] == fs_name]
+
+
+def write_mmsdrfs(state_dir, state):
+    """
+    Write the version line of the cluster configuration file, whose fourth
+    field is the configuration generation
+    """
+    config = state["config"]
+    mmsdrfs_path = os.path.join(state_dir, MMSDRFS_FILE)
+    tmp_path = "{0}.{1}.tmp".format(mmsdrfs_path, os.getpid())
+    with open(tmp_path, "w") as mmsdrfs_file:
+        mmsdrfs_file.write("%%9999%%:00_VERSION_LINE::{0}:3:1::lc:{1}::0:"
+                           "/usr/bin/ssh:/usr/bin/scp:{2}:\n".format(
+                               config["generation"], config["cluster_name"],
+                               config["cluster_id"]))
+    os.rename(tmp_path, mmsdrfs_path)
+
+
+###############################################################################
+##                                                                           ##
+##                              Output Helpers                               ##
+##                                                                           ##
+###############################################################################
+
+def encode(value):
+    if isinstance(value, bool):
+        value = "Yes" if value else "No"
+    return quote(str(value), safe=" ,.-_()*+=@;")
+
+
+def records(command, datatype, header, rows):
+    """
+    Return the "-Y" lines (header first) for a list of rows
+    """
+    prefix = "{0}:{1}:".format(command, datatype)
+    lines = [prefix + "HEADER:version:reserved:reserved:" +
+             ":".join(header) + ":"]
+    for row in rows:
+        lines.append(prefix + "0:1:::" +
+                     ":".join([encode(value) for value in row]) + ":")
+    return lines
+
+
+def get_option(args, option, default=None):
+    if option in args and args.index(option) + 1 < len(args):
+        return args[args.index(option) + 1]
+    return default
+
+
+def get_positional(args, with_value=("-N", "-f")):
+    positional = []
+    skip = False
+    for arg in args:
+        if skip:
+            skip = False
+        elif arg in with_value:
+            skip = True
+        elif not arg.startswith("-"):
+            positional.append(arg)
+    return positional
+
+
+def require_y(command, args):
+    if "-Y" not in args:
+        raise SimulatorError("{0}: mmsim only supports the -Y output "
+                             "format.".format(command))
+
+
+def short_name(name):
+    return name.split(".")[0]
+
+
+def node_state(node):
+    if node.get("target") == "active":
+        return "arbitrating"
+    return node["state"]
+
+
+###############################################################################
+##                                                                           ##
+##                            Simulated Commands                             ##
+##                                                                           ##
+###############################################################################
+
+def mmlscluster(state, args):
+    require_y("mmlscluster", args)
+    name = state.get_config("cluster_name")
+    quorum = [node["name"] for node in state.get_nodes()
+              if "quorum" in node["designation"]]
+
+    lines = records("mmlscluster", "clusterSummary",
+                    ["clusterName", "clusterId", "uidDomain", "rshPath",
+                     "rshSudoWrapper", "rcpPath", "rcpSudoWrapper",
+                     "repositoryType", "primaryServer", "secondaryServer"],
+                    [[name, state.get_config("cluster_id"), name,
+                      "/usr/bin/ssh", "no", "/usr/bin/scp", "no", "CCR",
+                      quorum[0] if quorum else "", ""]])
+    lines.extend(records("mmlscluster", "clusterNode",
+                         ["nodeNumber", "daemonNodeName", "ipAddress",
+                          "adminNodeName", "designation", "otherNodeRoles",
+                          "adminLoginName", "otherNodeRolesAlias"],
+                         [[node["number"], node["name"], node["ip"],
+                           node["name"], node["designation"], node["roles"],
+                           "root", node["alias"]]
+                          for node in state.get_nodes()]))
+    return lines
+
+
+def mmgetstate(state, args):
+    require_y("mmgetstate", args)
+    if "-N" in args:
+        nodes = state.resolve_nodes("mmgetstate", [get_option(args, "-N")])
+    else:
+        nodes = state.get_nodes()
+
+    quorum_nodes = [node for node in state.get_nodes()
+                    if "quorum" in node["designation"]]
+    quorum = len(quorum_nodes) // 2 + 1
+    nodes_up = len([node for node in quorum_nodes
+                    if node_state(node) == "active"])
+    total = len(state.get_nodes())
+
+    return records("mmgetstate", "",
+                   ["nodeName", "nodeNumber", "state", "quorum", "nodesUp",
+                    "totalNodes", "remarks", "cnfsState"],
+                   [[short_name(node["name"]), node["number"],
+                     node_state(node), quorum, nodes_up, total,
+                     "quorum node" if "quorum" in node["designation"] else "",
+                     "(undefined)"]
+                    for node in nodes])
+
+
+def mmlsnsd(state, args):
+    require_y("mmlsnsd", args)
+    fs_name = get_option(args, "-f")
+    if fs_name:
+        state.get_filesystem("mmlsnsd", fs_name)
+    nsds = state.get_nsds(fs_name)
+    disk_names = get_option(args, "-d")
+    if disk_names:
+        disk_names = set(disk_names.split(";"))
+        nsds = [nsd for nsd in nsds if nsd["name"] in disk_names]
+
+    if "-X" in args:
+        return records("mmlsnsd", "nsd",
+                       ["diskName", "volumeId", "localDiskName", "deviceType",
+                        "serverList", "remarks"],
+                       [[nsd["name"], nsd["volume_id"], nsd["device"],
+                         "dmm", ",".join(nsd["servers"]), "server node"]
+                        for nsd in nsds])
+
+    return records("mmlsnsd", "nsd",
+                   ["fileSystem", "diskName", "volumeId", "serverList",
+                    "thinDisk"],
+                   [[nsd["fs"] or "(free disk)", nsd["name"],
+                     nsd["volume_id"], ",".join(nsd["servers"]), ""]
+                    for nsd in nsds])
+
+
+def mmlsfs(state, args):
+    require_y("mmlsfs", args)
+    positional = get_positional(args)
+    if not positional or positional[0] == "all":
+        fs_names = state.get_filesystem_names()
+        if not fs_names:
+            raise SimulatorError("mmlsfs: No file systems were found.")
+    else:
+        fs_names = positional[:1]
+        state.get_filesystem("mmlsfs", fs_names[0])
+
+    rows = []
+    for fs_name in fs_names:
+        fs = state.get_filesystem("mmlsfs", fs_name)
+        nsds = state.get_nsds(fs_name)
+        pools = sorted(set([nsd["pool"] for nsd in nsds]))
+        properties = [
+            ("minFragmentSize", MIN_FRAGMENT_SIZE, "Minimum fragment (subblock) size in bytes (system pool)"),
+            ("minFragmentSize", MIN_FRAGMENT_SIZE, "Minimum fragment (subblock) size in bytes (other pools)"),
+            ("inodeSize", INODE_SIZE, "Inode size in bytes"),
+            ("indirectBlockSize", 32768, "Indirect block size in bytes"),
+            ("defaultMetadataReplicas", 1, "Default number of metadata replicas"),
+            ("maxMetadataReplicas", 2, "Maximum number of metadata replicas"),
+            ("defaultDataReplicas", 1, "Default number of data replicas"),
+            ("maxDataReplicas", 2, "Maximum number of data replicas"),
+            ("blockAllocationType", "scatter", "Block allocation type"),
+            ("fileLockingSemantics", "nfs4", "File locking semantics in effect"),
+            ("ACLSemantics", "nfs4", "ACL semantics in effect"),
+            ("numNodes", 32, "Estimated number of nodes that will mount file system"),
+            ("blockSize", BLOCK_SIZE, "Block size (system pool)"),
+            ("blockSize", BLOCK_SIZE, "Block size (other pools)"),
+            ("quotasAccountingEnabled", "none", "Quotas accounting enabled"),
+            ("quotasEnforced", "none", "Quotas enforced"),
+            ("defaultQuotasEnabled", "none", "Default quotas enabled"),
+            ("perfilesetQuotas", "No", "Per-fileset quota enforcement"),
+            ("filesetdfEnabled", "No", "Fileset df enabled?"),
+            ("filesystemVersion", "22.00 (5.0.4.0)", "File system version"),
+            ("filesystemVersionLocal", "22.00 (5.0.4.0)", "File system version for local access"),
+            ("filesystemVersionManager", "22.00 (5.0.4.0)", "File system version for manager"),
+            ("filesystemVersionOriginal", "22.00 (5.0.4.0)", "File system version at time of creation"),
+            ("filesystemHighestSupported", "22.00 (5.0.4.0)", "Highest supported version"),
+            ("create-time", time.ctime(fs["create_time"]), "File system creation time"),
+            ("DMAPIEnabled", "No", "Is DMAPI enabled?"),
+            ("logfileSize", 33554432, "Logfile size"),
+            ("exactMtime", "Yes", "Exact mtime mount option"),
+            ("suppressAtime", "relatime", "Suppress atime mount option"),
+            ("strictReplication", "whenpossible", "Strict replica allocation option"),
+            ("fastEAenabled", "Yes", "Fast external attributes enabled?"),
+            ("encryption", "No", "Encryption enabled?"),
+            ("maxNumberOfInodes", 1048576 * max(1, len(nsds)), "Maximum number of inodes"),
+            ("maxSnapshotId", 0, "Maximum snapshot id"),
+            ("UID", "0A0B0C0D:{0:08X}".format(fs["create_time"]), "File system UID"),
+            ("logReplicas", 0, "Number of log replicas"),
+            ("is4KAligned", "Yes", "is4KAligned"),
+            ("rapidRepairEnabled", "Yes", "rapidRepair enabled?"),
+            ("write-cache-threshold", 0, "HAWC Threshold (max 65536)"),
+            ("subblocksPerFullBlock", BLOCK_SIZE // MIN_FRAGMENT_SIZE, "Number of subblocks per full block"),
+            ("storagePools", ";".join(pools), "Disk storage pools in file system"),
+            ("file-audit-log", "No", "File Audit Logging enabled?"),
+            ("maintenance-mode", "No", "Maintenance Mode enabled?"),
+            ("disks", ";".join([nsd["name"] for nsd in nsds]), "Disks in file system"),
+            ("automaticMountOption", "yes", "Automatic mount option"),
+            ("additionalMountOptions", "none", "Additional mount options"),
+            ("defaultMountPoint", fs["mount_point"], "Default mount point"),
+            ("mountPriority", 0, "Mount priority"),
+        ]
+        for field_name, data, remarks in properties:
+            rows.append([fs_name, field_name, data, remarks])
+
+    return records("mmlsfs", "",
+                   ["deviceName", "fieldName", "data", "remarks"], rows)
+
+
+def mmlsdisk(state, args):
+    require_y("mmlsdisk", args)
+    positional = get_positional(args)
+    if not positional:
+        raise SimulatorError("mmlsdisk: Missing arguments.")
+    state.get_filesystem("mmlsdisk", positional[0])
+    nsds = state.get_nsds(positional[0])
+
+    return records("mmlsdisk", "",
+                   ["nsdName", "driverType", "sectorSize", "failureGroup",
+                    "metadata", "data", "status", "availability", "diskID",
+                    "storagePool", "remarks", "numQuorumDisks",
+                    "readQuorumValue", "writeQuorumValue", "diskSizeKB",
+                    "diskUID", "thinDiskType"],
+                   [[nsd["name"], "nsd", 512, nsd["failure_group"],
+                     nsd["metadata"], True, "ready", "up", idx + 1,
+                     nsd["pool"], "desc" if idx < 3 else "",
+                     min(3, len(nsds)), min(2, len(nsds)),
+                     min(2, len(nsds)), nsd["size"], nsd["volume_id"], "no"]
+                    for idx, nsd in enumerate(nsds)])
+
+
+def mmdf(state, args):
+    require_y("mmdf", args)
+    positional = get_positional(args)
+    if not positional:
+        raise SimulatorError("mmdf: Missing arguments.")
+    state.get_filesystem("mmdf", positional[0])
+    nsds = state.get_nsds(positional[0])
+
+    def pct(part, whole):
+        return int(part * 100 // whole) if whole else 0
+
+    nsd_rows = []
+    pools = {}
+    for nsd in nsds:
+        fragments = nsd["free"] // 1000
+        nsd_rows.append([nsd["name"], nsd["pool"], nsd["size"],
+                         nsd["failure_group"], nsd["metadata"], True,
+                         nsd["free"], pct(nsd["free"], nsd["size"]),
+                         fragments, pct(fragments, nsd["size"]), "Yes"])
+        pool = pools.setdefault(nsd["pool"], [0, 0, 0, 0])
+        pool[0] += nsd["size"]
+        pool[1] += nsd["free"]
+        pool[2] += fragments
+        pool[3] = max(pool[3], nsd["size"])
+
+    def totals(select):
+        size = sum([nsd["size"] for nsd in nsds if select(nsd)])
+        free = sum([nsd["free"] for nsd in nsds if select(nsd)])
+        fragments = sum([nsd["free"] // 1000 for nsd in nsds if select(nsd)])
+        return [size, free, pct(free, size), fragments, pct(fragments, size)]
+
+    lines = records("mmdf", "nsd",
+                    ["nsdName", "storagePool", "diskSize", "failureGroup",
+                     "metadata", "data", "freeBlocks", "freeBlocksPct",
+                     "freeFragments", "freeFragmentsPct",
+                     "diskAvailableForAlloc"], nsd_rows)
+    lines.extend(records("mmdf", "poolTotal",
+                         ["poolName", "poolSize", "freeBlocks",
+                          "freeBlocksPct", "freeFragments",
+                          "freeFragmentsPct", "maxDiskSize"],
+                         [[name, pool[0], pool[1], pct(pool[1], pool[0]),
+                           pool[2], pct(pool[2], pool[0]), pool[3]]
+                          for name, pool in sorted(pools.items())]))
+    lines.extend(records("mmdf", "data",
+                         ["totalData", "freeBlocks", "freeBlocksPct",
+                          "freeFragments", "freeFragmentsPct"],
+                         [totals(lambda nsd: True)]))
+    lines.extend(records("mmdf", "metadata",
+                         ["totalMetadata", "freeBlocks", "freeBlocksPct",
+                          "freeFragments", "freeFragmentsPct"],
+                         [totals(lambda nsd: nsd["metadata"])]))
+    lines.extend(records("mmdf", "fsTotal",
+                         ["fsSize", "freeBlocks", "freeBlocksPct",
+                          "freeFragments", "freeFragmentsPct"],
+                         [totals(lambda nsd: True)]))
+    max_inodes = 1048576 * max(1, len(nsds))
+    lines.extend(records("mmdf", "inode",
+                         ["usedInodes", "freeInodes", "allocatedInodes",
+                          "maxInodes"],
+                         [[max_inodes // 10, max_inodes // 2,
+                           max_inodes * 6 // 10, max_inodes]]))
+    return lines
+
+
+def mmperfmon(state, args):
+    if args[:2] != ["config", "show"]:
+        raise SimulatorError("mmperfmon: mmsim only supports "
+                             "\"mmperfmon config show\".")
+    collectors = [node["name"] for node in state.get_nodes()
+                  if "perfmon" in node["alias"]]
+    return ["cephMon = \"/opt/IBM/zimon/CephMonProxy\"",
+            "cephRados = \"/opt/IBM/zimon/CephRadosProxy\"",
+            "colCandidates = {0}".format(
+                ", ".join(["\"{0}\"".format(name) for name in collectors])),
+            "colRedundancy = {0}".format(min(2, len(collectors))),
+            "collectors = {",
+            "host = \"\"",
+            "port = \"4739\"",
+            "}",
+            "config = \"/opt/IBM/zimon/ZIMonSensors.cfg\"",
+            "ctdbstat = \"\"",
+            "daemonize = T",
+            "hostname = \"\"",
+            "ipfixinterface = \"0.0.0.0\"",
+            "logfile = \"/var/log/zimon/ZIMonSensors.log\"",
+            "loglevel = \"info\"",
+            "sensors = {",
+            "name = \"CPU\"",
+            "period = 1",
+            "}"]
+
+
+def mmdelnode(state, args):
+    if "-a" in args:
+        nodes = list(state.get_nodes())
+    else:
+        nodes = state.resolve_nodes("mmdelnode", [get_option(args, "-N", "")])
+    if not nodes:
+        raise SimulatorError("mmdelnode: Missing arguments.")
+
+    names = set([node["name"] for node in nodes])
+    for node in nodes:
+        if node_state(node) != "down":
+            raise SimulatorError("mmdelnode: Node {0} is active. Shut down "
+                                 "GPFS on the node first.".format(node["name"]))
+    if "-a" not in args:
+        for nsd in state.get_nsds():
+            servers = nsd.get("pending_servers") or nsd["servers"]
+            served = names.intersection(servers)
+            if served:
+                raise SimulatorError("mmdelnode: Node {0} is an NSD server "
+                                     "for {1}. Remove it from the NSD server "
+                                     "list first.".format(served.pop(),
+                                                          nsd["name"]))
+
+    # The nodes flagged "undeletable" are kept, the other nodes are deleted
+    # and the command fails naming the nodes kept
+    errors = []
+    for node in nodes:
+        if node.get("undeletable"):
+            names.discard(node["name"])
+            errors.append("mmdelnode: Unable to remove node {0} from the "
+                          "cluster configuration.".format(node["name"]))
+
+    state.state["nodes"] = [node for node in state.get_nodes()
+                            if node["name"] not in names]
+    state.save()
+    if errors:
+        raise SimulatorError("\n".join(errors))
+    return ["mmdelnode: Command successfully completed"]
+
+
+def mmdeldisk(state, args):
+    positional = get_positional(args)
+    if len(positional) < 2:
+        raise SimulatorError("mmdeldisk: Missing arguments.")
+    fs_name = positional[0]
+    state.get_filesystem("mmdeldisk", fs_name)
+    disk_names = [name for name in positional[1].split(";") if name]
+
+    fs_nsds = dict([(nsd["name"], nsd) for nsd in state.get_nsds(fs_name)])
+    for name in disk_names:
+        if name not in fs_nsds:
+            raise SimulatorError("mmdeldisk: Disk {0} is not in file system "
+                                 "{1}.".format(name, fs_name))
+
+    # Move the data of the deleted disks to the remaining disks of the
+    # same storage pool
+    deleted = set(disk_names)
+    for pool in set([fs_nsds[name]["pool"] for name in disk_names]):
+        used = sum([nsd["size"] - nsd["free"] for nsd in fs_nsds.values()
+                    if nsd["name"] in deleted and nsd["pool"] == pool])
+        remaining = [nsd for nsd in fs_nsds.values()
+                     if nsd["name"] not in deleted and nsd["pool"] == pool]
+        free = sum([nsd["free"] for nsd in remaining])
+        if used > free:
+            raise SimulatorError("mmdeldisk: Not enough free space in storage "
+                                 "pool {0} of file system {1} to migrate the "
+                                 "data of the deleted disks.".format(pool,
+                                                                     fs_name),
+                                 rc=28)
+        for nsd in remaining:
+            nsd["free"] -= used * nsd["free"] // free if free else 0
+
+    for name in disk_names:
+        nsd = fs_nsds[name]
+        nsd["fs"] = None
+        nsd["pool"] = None
+        nsd["metadata"] = False
+        nsd["free"] = nsd["size"]
+
+    state.save()
+    return ["Deleting disks ...",
+            "mmdeldisk: Command successfully completed"]
+
+
+def mmdelnsd(state, args):
+    positional = get_positional(args)
+    if not positional:
+        raise SimulatorError("mmdelnsd: Missing arguments.")
+    nsd_names = set([name for name in positional[0].split(";") if name])
+
+    nsds = dict([(nsd["name"], nsd) for nsd in state.get_nsds()])
+    for name in nsd_names:
+        if name not in nsds:
+            raise SimulatorError("mmdelnsd: Disk {0} not found.".format(name))
+        if nsds[name]["fs"]:
+            raise SimulatorError("mmdelnsd: Disk {0} still belongs to file "
+                                 "system {1}.".format(name, nsds[name]["fs"]))
+
+    state.state["nsds"] = [nsd for nsd in state.get_nsds()
+                           if nsd["name"] not in nsd_names]
+    state.save()
+    return ["mmdelnsd: Command successfully completed"]
+
+
+def mmchnsd(state, args):
+    positional = get_positional(args)
+    if not positional:
+        raise SimulatorError("mmchnsd: Missing arguments.")
+
+    nsds = dict([(nsd["name"], nsd) for nsd in state.get_nsds()])
+    node_names = set([node["name"] for node in state.get_nodes()])
+    changes = []
+    for descriptor in positional[0].split(";"):
+        if not descriptor:
+            continue
+        name, _, server_list = descriptor.partition(":")
+        if name not in nsds:
+            raise SimulatorError("mmchnsd: Disk {0} not found.".format(name))
+        servers = [server for server in server_list.split(",") if server]
+        for server in servers:
+            if server not in node_names:
+                raise SimulatorError("mmchnsd: Incorrect node {0} specified "
+                                     "for command.".format(server))
+        changes.append((nsds[name], servers))
+
+    apply_at = time.time() + state.get_config("chnsd_delay")
+    for nsd, servers in changes:
+        nsd["pending_servers"] = servers
+        nsd["pending_at"] = apply_at
+
+    state.save()
+    return ["mmchnsd: Processing disk(s) ...",
+            "mmchnsd: Propagating the cluster configuration data to all",
+            "  affected nodes.  This is an asynchronous process."]
+
+
+def change_state(state, command, args, target):
+    if "-a" in args:
+        nodes = list(state.get_nodes())
+    else:
+        nodes = state.resolve_nodes(command, [get_option(args, "-N", "")])
+
+    apply_at = time.time() + state.get_config("state_delay")
+    for node in nodes:
+        node["target"] = target
+        node["target_at"] = apply_at
+
+    state.save(config_changed=False)
+    return ["{0}: Command successfully completed".format(command)]
+
+
+def mmshutdown(state, args):
+    return change_state(state, "mmshutdown", args, "down")
+
+
+def mmstartup(state, args):
+    return change_state(state, "mmstartup", args, "active")
+
+
+def mmumount(state, args):
+    if "-N" in args:
+        nodes = state.resolve_nodes("mmumount", [get_option(args, "-N")])
+    else:
+        nodes = state.get_nodes()
+
+    # The file systems of the nodes flagged "busy" can not be unmounted.
+    # The other nodes are processed, and the failures reported by node
+    # like mmdsh does
+    errors = []
+    for node in nodes:
+        if node.get("busy"):
+            errors.append("{0}:  umount: target is busy.".format(node["name"]))
+            errors.append("mmdsh: {0} remote shell process had return "
+                          "code 1.".format(node["name"]))
+    if errors:
+        raise SimulatorError("\n".join(errors))
+    return []
+
+
+MUTATIONS = ["mmdelnode", "mmdeldisk", "mmdelnsd", "mmchnsd", "mmshutdown",
+             "mmstartup"]
+
+
+###############################################################################
+##                                                                           ##
+##                                   Main                                    ##
+##                                                                           ##
+###############################################################################
+
+def init(argv):
+    parser = argparse.ArgumentParser(prog="mmsim.py init",
+                                     description="Create a simulated cluster")
+    parser.add_argument("dir", help="directory for the simulated cluster")
+    parser.add_argument("--nodes", type=int, default=10)
+    parser.add_argument("--filesystems", type=int, default=1)
+    parser.add_argument("--nsds", type=int, default=100)
+    parser.add_argument("--nsd-servers", type=int, default=None)
+    parser.add_argument("--servers-per-nsd", type=int, default=2)
+    parser.add_argument("--quorum-nodes", type=int, default=None)
+    parser.add_argument("--perfmon-nodes", type=int, default=2)
+    parser.add_argument("--fill", type=float, default=0.5,
+                        help="average fraction of each disk in use")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--chnsd-delay", type=float, default=0.0)
+    parser.add_argument("--state-delay", type=float, default=0.0)
+    args = parser.parse_args(argv)
+
+    state = generate_topology(args.nodes, args.filesystems, args.nsds,
+                              nsd_servers=args.nsd_servers,
+                              servers_per_nsd=args.servers_per_nsd,
+                              quorum_nodes=args.quorum_nodes,
+                              perfmon_nodes=args.perfmon_nodes,
+                              fill=args.fill, seed=args.seed)
+    state["config"]["latency"] = args.latency
+    state["config"]["chnsd_delay"] = args.chnsd_delay
+    state["config"]["state_delay"] = args.state_delay
+
+    bin_dir = os.path.join(args.dir, BIN_DIR)
+    if not os.path.isdir(bin_dir):
+        os.makedirs(bin_dir)
+    with open(os.path.join(args.dir, STATE_FILE), "w") as state_file:
+        json.dump(state, state_file)
+    write_mmsdrfs(args.dir, state)
+
+    script = os.path.abspath(__file__)
+    for command in SIM_COMMANDS:
+        link = os.path.join(bin_dir, command)
+        if os.path.lexists(link):
+            os.remove(link)
+        os.symlink(script, link)
+
+    print("export SPECTRUMSCALE_GPFS_CMD_PATH={0}".format(
+        os.path.abspath(bin_dir)))
+    print("export SPECTRUMSCALE_MMSDRFS_PATH={0}".format(
+        os.path.abspath(os.path.join(args.dir, MMSDRFS_FILE))))
+    return 0
+
+
+def run(command, argv):
+    state_dir = os.environ.get(
+        "MMSIM_STATE_DIR",
+        os.path.dirname(os.path.dirname(os.path.abspath(sys.argv[0]))))
+
+    handler = globals()[command]
+    try:
+        with SimulatorState(state_dir, command in MUTATIONS) as state:
+            latency = state.get_config("latency")
+            if latency:
+                time.sleep(latency)
+            lines = handler(state, argv)
+    except SimulatorError as e:
+        sys.stderr.write("{0}\n".format(e))
+        return e.rc
+
+    if lines:
+        sys.stdout.write("\n".join(lines) + "\n")
+    return 0
+
+
+def main():
+    command = os.path.basename(sys.argv[0])
+    if command in SIM_COMMANDS:
+        return run(command, sys.argv[1:])
+
+    if len(sys.argv) > 1 and sys.argv[1] == "init":
+        return init(sys.argv[2:])
+    if len(sys.argv) > 1 and sys.argv[1] in SIM_COMMANDS:
+        return run(sys.argv[1], sys.argv[2:])
+
+    sys.stderr.write(__doc__)
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())